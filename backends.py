@@ -0,0 +1,229 @@
+"""Database backends: how connections are opened and how errors are recognised.
+
+Database talks to every backend through the mysql-connector interface
+(conn.cursor(dictionary=..., buffered=...), cursor.execute with %s
+placeholders, column_names, lastrowid, commit/rollback); the SQLite backend
+wraps sqlite3 to provide it, so the same queries run unchanged on both.
+"""
+import os
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+try:
+    import mysql.connector
+    from mysql.connector import errorcode
+except ImportError:  # SQLite-only installs don't need the MySQL driver
+    mysql = None
+
+
+class MySQLBackend:
+    """MySQL server over mysql-connector"""
+
+    name = "mysql"
+    insert_ignore = "INSERT IGNORE"
+
+    def __init__(self, host='localhost', user='root', password='', database='cosmetic_shop'):
+        if mysql is None:
+            raise RuntimeError("The MySQL backend needs mysql-connector-python installed")
+        self.host = host
+        self.user = user
+        self.password = password
+        self.database = database
+
+    def connect(self):
+        """Open a new connection to the database"""
+        return mysql.connector.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database
+        )
+
+    def create_database(self):
+        """Create the database on the MySQL server"""
+        # Connect to MySQL server without specifying a database
+        temp_conn = mysql.connector.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password
+        )
+        temp_cursor = temp_conn.cursor()
+        temp_cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
+        temp_cursor.close()
+        temp_conn.close()
+
+    def is_missing_database(self, error):
+        return getattr(error, "errno", None) == errorcode.ER_BAD_DB_ERROR
+
+    def is_missing_table(self, error):
+        return getattr(error, "errno", None) == errorcode.ER_NO_SUCH_TABLE
+
+    def is_duplicate_object(self, error):
+        """True for an index or column that already exists"""
+        return getattr(error, "errno", None) in (errorcode.ER_DUP_KEYNAME, errorcode.ER_DUP_FIELDNAME)
+
+    def is_deadlock(self, error):
+        return getattr(error, "errno", None) == errorcode.ER_LOCK_DEADLOCK
+
+    def is_lock_timeout(self, error):
+        return getattr(error, "errno", None) == errorcode.ER_LOCK_WAIT_TIMEOUT
+
+
+# Values go in and out of SQLite as the MySQL driver returns them: DECIMAL
+# columns as Decimal and TIMESTAMP columns as datetime
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DECIMAL", lambda value: Decimal(value.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+
+@lru_cache(maxsize=1024)
+def _sqlite_placeholders(operation):
+    return operation.replace("%s", "?")
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteCursor:
+    """sqlite3 cursor with the parts of the mysql-connector cursor interface Database uses"""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        if dictionary:
+            self._cursor.row_factory = _dict_row
+
+    def execute(self, operation, params=None):
+        self._cursor.execute(_sqlite_placeholders(operation), params or ())
+
+    def executemany(self, operation, seq_params):
+        self._cursor.executemany(_sqlite_placeholders(operation), seq_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def column_names(self):
+        return tuple(column[0] for column in self._cursor.description or ())
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 connection with the mysql-connector connection methods Database uses"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, dictionary=False, buffered=False, prepared=False):
+        # SQLite is in-process, so there is no network buffering to choose, and
+        # sqlite3 already keeps each connection's compiled statements cached
+        return SQLiteCursor(self._conn.cursor(), dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteBackend:
+    """Embedded SQLite database file in WAL mode, for single-till shops.
+
+    WAL lets the pooled worker connections read while one of them writes.
+    synchronous=NORMAL is durable across application crashes; after a power
+    cut the last few commits may be lost but the file stays consistent. Use
+    synchronous="FULL" to fsync every commit instead.
+    """
+
+    name = "sqlite"
+    insert_ignore = "INSERT OR IGNORE"
+
+    def __init__(self, path, busy_timeout=5.0, synchronous="NORMAL", cache_size_kb=20000,
+                 mmap_size=256 * 1024 * 1024):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+
+    def connect(self):
+        """Open a new connection to the database file"""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            # Pooled connections are handed between worker threads, one at a time
+            check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        return SQLiteConnection(conn)
+
+    def create_database(self):
+        """Create the directory for the database file; SQLite creates the file itself"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+    def is_missing_database(self, error):
+        return isinstance(error, sqlite3.OperationalError) and "unable to open database" in str(error)
+
+    def is_missing_table(self, error):
+        return isinstance(error, sqlite3.OperationalError) and "no such table" in str(error)
+
+    def is_duplicate_object(self, error):
+        """True for an index or column that already exists"""
+        message = str(error)
+        return isinstance(error, sqlite3.OperationalError) and (
+            "already exists" in message or "duplicate column name" in message
+        )
+
+    def is_deadlock(self, error):
+        # SQLite has no row locks to deadlock on; a blocked writer times out instead
+        return False
+
+    def is_lock_timeout(self, error):
+        """True when another connection held the write lock for longer than busy_timeout"""
+        return isinstance(error, sqlite3.OperationalError) and "database is locked" in str(error)
+
+
+def create_backend(name, host='localhost', user='root', password='', database='cosmetic_shop',
+                   sqlite_path=None):
+    """Return the backend called name ('mysql' or 'sqlite')"""
+    if name == "mysql":
+        return MySQLBackend(host, user, password, database)
+    if name == "sqlite":
+        return SQLiteBackend(sqlite_path or f"{database}.db")
+    raise ValueError(f"Unknown database backend: {name}")
@@ -0,0 +1,91 @@
+import queue
+from tkinter import messagebox
+
+# Only the root window polls; widgets look their queue up through it
+_QUEUE_ATTRIBUTE = "_db_completion_queue"
+
+
+class CompletionQueue:
+    """Delivers finished futures to callbacks on the Tk thread.
+
+    Worker threads must never touch Tk, so done-callbacks only enqueue the
+    future and the root window drains the queue with after().
+    """
+
+    def __init__(self, root, poll_interval=30):
+        self.root = root
+        self.poll_interval = poll_interval
+        self._completed = queue.SimpleQueue()
+        # Latest future per (widget, key), so a slow, superseded load can't overwrite a newer one
+        self._latest = {}
+        self._poll()
+
+    def add(self, future, widget, on_success, on_error=None, key=None):
+        """Call on_success(result) or on_error(exception) on the Tk thread once future is done"""
+        if key is not None:
+            self._latest[(str(widget), key)] = future
+        future.add_done_callback(
+            lambda f: self._completed.put((f, widget, on_success, on_error, key))
+        )
+        return future
+
+    def _poll(self):
+        while True:
+            try:
+                future, widget, on_success, on_error, key = self._completed.get_nowait()
+            except queue.Empty:
+                break
+            self._deliver(future, widget, on_success, on_error, key)
+
+        self.root.after(self.poll_interval, self._poll)
+
+    def _deliver(self, future, widget, on_success, on_error, key):
+        if key is not None:
+            slot = (str(widget), key)
+            if self._latest.get(slot) is not future:
+                return
+            del self._latest[slot]
+
+        # The screen may have been closed while the query was running
+        if not widget.winfo_exists():
+            return
+
+        try:
+            result = future.result()
+        except Exception as e:
+            (on_error or show_database_error)(e)
+            return
+        on_success(result)
+
+
+def completion_queue(widget):
+    """Return the completion queue of the widget's root window, creating it on first use"""
+    root = widget._root()
+    completions = getattr(root, _QUEUE_ATTRIBUTE, None)
+    if completions is None:
+        completions = CompletionQueue(root)
+        setattr(root, _QUEUE_ATTRIBUTE, completions)
+    return completions
+
+
+def run_async(widget, future, on_success, on_error=None, key=None):
+    """Apply a database future's result on the Tk thread.
+
+    Passing a key drops results from earlier requests with the same key on the
+    same widget, e.g. when Filter is clicked again before the last load returned.
+    """
+    return completion_queue(widget).add(future, widget, on_success, on_error, key)
+
+
+def show_loading(tree, message="Loading..."):
+    """Replace the contents of a treeview with a single placeholder row"""
+    tree.delete(*tree.get_children())
+    columns = tree["columns"]
+    values = [""] * len(columns)
+    if values:
+        values[min(1, len(values) - 1)] = message
+    tree.insert("", "end", values=values)
+
+
+def show_database_error(error):
+    messagebox.showerror("Error", f"Database error: {error}")
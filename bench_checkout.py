@@ -0,0 +1,97 @@
+"""Measure per-checkout latency on each database backend.
+
+Run with ``python -m src.bench_checkout [--orders N] [--mysql]``. Each backend
+gets a fresh database with 50 products and one customer, and every checkout
+is a three-item Database.checkout() (order, items and stock update in one
+transaction), timed end to end from the caller's side.
+
+SQLite runs against a temporary file, once with synchronous=NORMAL (the
+default) and once with synchronous=FULL. MySQL is only included with --mysql
+and uses the local server with the application's default credentials and a
+separate ``cosmetic_shop_bench`` database, which is left behind afterwards.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from src.backends import MySQLBackend, SQLiteBackend
+from src.database import Database
+
+PRODUCTS = 50
+ITEMS_PER_ORDER = 3
+WARMUP = 20
+
+
+def seed(db):
+    """Add products and a customer; returns (customer_id, product ids)"""
+    category_id = db.get_category_id("Skincare")
+    product_ids = [
+        db.add_product(f"Bench product {i}", "", Decimal("9.99"), 10 ** 9, category_id)
+        for i in range(PRODUCTS)
+    ]
+    customer_id = db.add_customer("Bench customer", None, "", "")
+    return customer_id, product_ids
+
+
+def run(db, orders):
+    """Return per-checkout latencies in seconds"""
+    customer_id, product_ids = seed(db)
+    latencies = []
+    for n in range(WARMUP + orders):
+        items = [
+            (product_ids[(n * ITEMS_PER_ORDER + i) % PRODUCTS], 1, Decimal("9.99"))
+            for i in range(ITEMS_PER_ORDER)
+        ]
+        started = time.perf_counter()
+        db.checkout(customer_id, items)
+        elapsed = time.perf_counter() - started
+        if n >= WARMUP:
+            latencies.append(elapsed)
+    return latencies
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    ms = [value * 1000 for value in latencies]
+
+    def pct(p):
+        return ms[min(len(ms) - 1, int(len(ms) * p / 100))]
+
+    print(f"{name:<22}{statistics.mean(ms):>9.2f}{pct(50):>9.2f}{pct(95):>9.2f}{pct(99):>9.2f}"
+          f"{len(ms) / sum(latencies):>12.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-checkout latency by database backend")
+    parser.add_argument("--orders", type=int, default=1000, help="timed checkouts per backend")
+    parser.add_argument("--mysql", action="store_true", help="also benchmark the local MySQL server")
+    args = parser.parse_args(argv)
+
+    backends = []
+    tmp_dir = tempfile.mkdtemp(prefix="bench_checkout_")
+    for synchronous in ("NORMAL", "FULL"):
+        path = os.path.join(tmp_dir, f"bench_{synchronous.lower()}.db")
+        backends.append((f"sqlite (sync={synchronous})", SQLiteBackend(path, synchronous=synchronous)))
+    if args.mysql:
+        backends.append(("mysql", MySQLBackend(database="cosmetic_shop_bench")))
+
+    print(f"{args.orders} checkouts of {ITEMS_PER_ORDER} items, latency in ms")
+    print(f"{'backend':<22}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'orders/s':>12}")
+    try:
+        for name, backend in backends:
+            db = Database(backend=backend, database="cosmetic_shop_bench")
+            try:
+                report(name, run(db, args.orders))
+            finally:
+                db.close()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Compare dictionary rows with named-tuple records.
+
+Run with ``python -m src.bench_rows [rows]`` (default 100000). Products rows
+are generated in memory as the tuples a cursor returns, then turned into:
+
+- dict rows plus Product.from_db_row(), as with fetch_all(), and
+- named-tuple records plus Product.from_db_rows(), as with fetch_records().
+
+This measures the Python-side cost of each row mode, which is what differs
+between them; the time MySQL spends sending the rows is the same for both.
+Peak memory is taken with tracemalloc for holding all rows, and again for
+holding all rows plus the model objects built from them.
+"""
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+from src.models import Product, record_type
+
+COLUMNS = ("id", "name", "description", "price", "stock_quantity",
+           "category_id", "category_name", "image_path")
+
+
+def generate_rows(count):
+    """Product rows as a tuple cursor returns them"""
+    return [
+        (i, f"Product {i}", f"Description of product {i}", Decimal("19.99"), i % 200,
+         i % 5 + 1, "Skincare", None)
+        for i in range(1, count + 1)
+    ]
+
+
+def dict_rows(raw):
+    # What a dictionary cursor does for every row
+    return [dict(zip(COLUMNS, row)) for row in raw]
+
+
+def record_rows(raw):
+    record = record_type(COLUMNS)
+    return list(map(record._make, raw))
+
+
+def measure(build):
+    """Return (seconds, peak bytes, result) for one call of build()"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 100000
+    raw = generate_rows(count)
+
+    modes = [
+        ("dict rows", dict_rows, lambda rows: [Product.from_db_row(row) for row in rows]),
+        ("records", record_rows, Product.from_db_rows),
+    ]
+
+    print(f"{count} product rows")
+    print(f"{'mode':<12}{'rows ms':>10}{'rows MB':>10}{'models ms':>12}{'total MB':>11}")
+    for name, build_rows, build_models in modes:
+        rows_time, rows_peak, _ = measure(lambda: build_rows(raw))
+        models_time, total_peak, _ = measure(lambda: build_models(build_rows(raw)))
+        print(f"{name:<12}{rows_time * 1000:>10.1f}{rows_peak / 1e6:>10.1f}"
+              f"{(models_time - rows_time) * 1000:>12.1f}{total_peak / 1e6:>11.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
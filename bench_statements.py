@@ -0,0 +1,105 @@
+"""Measure per-execution latency of the hot-path statements, text vs prepared.
+
+Run with ``python -m src.bench_statements [--iterations N] [--mysql]``. Each
+statement is run N times (after a warm-up) through a Database created with
+prepared_statements=False, which sends the SQL text on every call, and again
+with prepared_statements=True, which prepares it once per connection and then
+only sends the statement ID and parameters over the binary protocol.
+
+By default this runs against a temporary SQLite file, where both modes reuse
+sqlite3's own compiled statement cache and the numbers show the overhead of
+the cache itself. The difference the prepared statements make is on MySQL:
+pass --mysql to use the local server with the application's default
+credentials and a separate ``cosmetic_shop_bench`` database, which is left
+behind afterwards.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from decimal import Decimal
+from src.backends import MySQLBackend, SQLiteBackend
+from src.database import Database
+
+WARMUP = 50
+
+
+def seed(db):
+    """Add a customer, a few products and one order; returns (customer_id, product ids, order_id)"""
+    category_id = db.get_category_id("Skincare")
+    product_ids = [
+        db.add_product(f"Bench product {i}", "", Decimal("9.99"), 10 ** 9, category_id)
+        for i in range(3)
+    ]
+    customer_id = db.add_customer("Bench customer", None, "", "")
+    order_id = db.place_order(customer_id, [(product_id, 1, Decimal("9.99")) for product_id in product_ids])
+    return customer_id, product_ids, order_id
+
+
+def cases(db):
+    """Return (name, callable) pairs, one per hot-path statement"""
+    customer_id, product_ids, order_id = seed(db)
+    items = [(product_id, 1, Decimal("9.99")) for product_id in product_ids]
+    return [
+        ("get_product", lambda: db.get_product(product_ids[0])),
+        ("get_order_details", lambda: db.get_order_details(order_id)),
+        ("update_stock", lambda: db.update_stock(product_ids[0], 10 ** 9)),
+        ("update_order_status", lambda: db.update_order_status(order_id, "Pending")),
+        ("place_order (3 items)", lambda: db.place_order(customer_id, items)),
+    ]
+
+
+def measure(fn, iterations):
+    """Return per-call latencies in milliseconds"""
+    for _ in range(WARMUP):
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run(backend, prepared, iterations):
+    """Return {case name: mean latency in ms}"""
+    # One pooled connection, so every call hits the same statement cache
+    db = Database(backend=backend, database="cosmetic_shop_bench", pool_size=1,
+                  prepared_statements=prepared)
+    try:
+        return {name: statistics.mean(measure(fn, iterations)) for name, fn in cases(db)}
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hot-path statement latency, text vs prepared")
+    parser.add_argument("--iterations", type=int, default=2000, help="timed executions per statement")
+    parser.add_argument("--mysql", action="store_true", help="benchmark the local MySQL server instead of SQLite")
+    args = parser.parse_args(argv)
+
+    tmp_dir = tempfile.mkdtemp(prefix="bench_statements_")
+    try:
+        results = {}
+        for prepared in (False, True):
+            if args.mysql:
+                backend = MySQLBackend(database="cosmetic_shop_bench")
+            else:
+                backend = SQLiteBackend(os.path.join(tmp_dir, f"bench_{prepared}.db"))
+            results[prepared] = run(backend, prepared, args.iterations)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"{'mysql' if args.mysql else 'sqlite'}: {args.iterations} executions each, mean latency in ms")
+    print(f"{'statement':<24}{'text':>9}{'prepared':>10}{'change':>9}")
+    for name, before in results[False].items():
+        after = results[True][name]
+        print(f"{name:<24}{before:>9.3f}{after:>10.3f}{(after - before) / before:>+9.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
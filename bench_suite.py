@@ -0,0 +1,216 @@
+"""Time the Database methods and the SQL behind each screen, headless.
+
+Run with ``python -m src.bench_suite`` plus the database options of
+src.datagen (``--backend sqlite --sqlite-path shop.db`` by default, or
+``--backend mysql --database NAME``). Point it at a database filled by
+``python -m src.datagen``, or pass --generate (with the datagen scale
+options) to fill an empty one first.
+
+Every case runs --warmup times untimed and then --repeat times timed.
+Results are written as JSON lines, to stdout or --output: a "run" record
+describing the backend and table sizes, then one "result" record per case
+with its group, name, row count and min/mean/p50/max latency in ms, so runs
+can be stored and diffed for regression tracking.
+
+The write cases (checkout, stock and status updates) run against the
+benchmark database and add a few orders to it; stock and status updates
+write back the values already there.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from src import datagen, forecast
+
+TABLES = ["categories", "products", "customers", "orders", "order_items"]
+
+# The SQL a screen runs inline, as (name, sql, params from the sample context)
+VIEW_QUERIES = [
+    ("Sales.load_customers", "SELECT id, name FROM customers ORDER BY name", lambda s: None),
+    ("Sales.load_products", '''
+    SELECT id, name, price, stock_quantity
+    FROM products
+    WHERE category_id = %s AND stock_quantity > 0
+    ORDER BY name
+    ''', lambda s: (s["category_id"],)),
+    ("CustomerManagement.on_customer_select", '''
+    SELECT id, name, email, phone, address
+    FROM customers
+    WHERE id = %s
+    ''', lambda s: (s["customer_id"],)),
+]
+
+
+def sample(db):
+    """Pick existing IDs, names and a date range for the cases to use"""
+    # The best-stocked product, so the checkout case doesn't run out
+    product = db.fetch_one(
+        "SELECT id, name, category_id, stock_quantity FROM products ORDER BY stock_quantity DESC, id LIMIT 1"
+    )
+    customer = db.fetch_one("SELECT id, name FROM customers ORDER BY id LIMIT 1")
+    order = db.fetch_one("SELECT id, status FROM orders ORDER BY id DESC LIMIT 1")
+    if not (product and customer and order):
+        raise SystemExit("The database is empty; fill it with src.datagen or pass --generate")
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        "product_id": product["id"],
+        "product_search": product["name"].split()[-1],
+        "category_id": product["category_id"],
+        "stock_quantity": product["stock_quantity"],
+        "customer_id": customer["id"],
+        "customer_search": customer["name"].split()[-1],
+        "order_id": order["id"],
+        "order_status": order["status"],
+        "start": today - timedelta(days=29),
+        "end": today + timedelta(days=1),
+    }
+
+
+def cases(db, s):
+    """Return (group, name, fn) for every case"""
+    items = [(s["product_id"], 1, Decimal("1.00"))]
+    database_cases = [
+        ("get_product", lambda: db.get_product(s["product_id"])),
+        ("get_all_products", lambda: db.get_all_products()),
+        ("get_all_products(category_id)", lambda: db.get_all_products(s["category_id"])),
+        ("iter_all_products", lambda: list(db.iter_all_products())),
+        ("get_products_page", lambda: db.get_products_page()),
+        ("get_products_page(search_term)", lambda: db.get_products_page(search_term=s["product_search"])),
+        ("get_stock_levels", lambda: db.get_stock_levels()),
+        ("get_all_categories", lambda: db.get_all_categories()),
+        ("get_all_customers", lambda: db.get_all_customers()),
+        ("get_customers_page", lambda: db.get_customers_page()),
+        ("get_order_details", lambda: db.get_order_details(s["order_id"])),
+        ("get_all_orders", lambda: db.get_all_orders()),
+        ("get_all_orders(status)", lambda: db.get_all_orders("Pending")),
+        ("iter_all_orders", lambda: list(db.iter_all_orders())),
+        ("get_orders_page", lambda: db.get_orders_page()),
+        ("get_sales_report", lambda: db.get_sales_report(s["start"], s["end"])),
+        ("get_product_sales_report", lambda: db.get_product_sales_report(s["start"], s["end"])),
+        ("get_low_stock_products", lambda: db.get_low_stock_products()),
+        ("low_stock.in_range", lambda: db.low_stock.in_range(None, db.low_stock.threshold)),
+        ("low_stock.load", lambda: db.low_stock.load()),
+        ("get_reorder_suggestions", lambda: db.get_reorder_suggestions()),
+        ("forecast.load_forecast", lambda: forecast.load_forecast(db)),
+        ("place_order", lambda: db.place_order(s["customer_id"], items)),
+        ("update_stock", lambda: db.update_stock(s["product_id"], s["stock_quantity"])),
+        ("update_order_status", lambda: db.update_order_status(s["order_id"], s["order_status"])),
+    ]
+    # Screens that go through a Database method, with the arguments they pass
+    screen_cases = [
+        ("Sales.load_orders", lambda: db.get_orders_page()),
+        ("Sales.load_orders (status filter)", lambda: db.get_orders_page("Completed")),
+        ("CustomerManagement.search_customers", lambda: db.get_customers_page(s["customer_search"])),
+        ("ProductManagement.load_products", lambda: db.get_products_page()),
+        ("Inventory.load_stock_levels", lambda: db.get_stock_levels()),
+        ("Inventory.load_stock_levels (search)",
+         lambda: db.get_stock_levels(s["category_id"], s["product_search"])),
+        ("Inventory.load_low_stock", lambda: db.get_reorder_suggestions(10)),
+        ("Reports.generate_sales_report", lambda: db.get_orders_between(s["start"], s["end"])),
+        ("Reports.generate_product_sales_report", lambda: db.get_product_revenue(s["start"], s["end"])),
+        ("Reports.generate_inventory_report (out of stock)",
+         lambda: db.get_inventory_report(stock_status="Out of Stock")),
+        ("CustomerManagement.delete_customer (order check)",
+         lambda: db.count_customer_orders(s["customer_id"])),
+        ("Reports.generate_inventory_report (low stock)",
+         lambda: db.get_low_stock_products(10, min_stock=1)),
+    ]
+    screen_cases += [
+        (name, lambda sql=sql, params=params: db.fetch_all(sql, params(s)))
+        for name, sql, params in VIEW_QUERIES
+    ]
+    return ([("database", name, fn) for name, fn in database_cases]
+            + [("view", name, fn) for name, fn in screen_cases])
+
+
+def row_count(result):
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and result and isinstance(result[-1], list):
+        # get_order_details: (order, items)
+        return len(result[-1])
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        # Page methods: (rows, next_after)
+        return len(result[0])
+    if isinstance(result, dict):
+        return 1
+    return None
+
+
+def measure(fn, warmup, repeat):
+    """Return a result record for fn, less its group and name"""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    rows = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+        rows = row_count(result)
+    return {
+        "runs": repeat,
+        "rows": rows,
+        "min_ms": round(min(latencies), 3),
+        "mean_ms": round(statistics.mean(latencies), 3),
+        "p50_ms": round(statistics.median(latencies), 3),
+        "max_ms": round(max(latencies), 3),
+    }
+
+
+def table_sizes(db):
+    return {table: db.fetch_one(f"SELECT COUNT(*) AS n FROM {table}")["n"] for table in TABLES}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Database methods and screen queries")
+    datagen.add_database_arguments(parser)
+    datagen.add_scale_arguments(parser)
+    parser.add_argument("--generate", action="store_true", help="fill the database with src.datagen first")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs per case")
+    parser.add_argument("--only", help="run only cases whose name contains this text")
+    parser.add_argument("--output", help="append JSON lines to this file instead of printing them")
+    args = parser.parse_args(argv)
+
+    db = datagen.open_database(args)
+    out = open(args.output, "a") if args.output else sys.stdout
+    try:
+        if args.generate:
+            datagen.generate(db, args.products, args.customers, args.order_lines, args.days, args.seed,
+                             log=lambda message: print(message, file=sys.stderr))
+
+        def emit(record):
+            out.write(json.dumps(record, default=str) + "\n")
+            out.flush()
+
+        emit({
+            "type": "run",
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "backend": db.backend.name,
+            "python": platform.python_version(),
+            "tables": table_sizes(db),
+            "repeat": args.repeat,
+        })
+        for group, name, fn in cases(db, sample(db)):
+            if args.only and args.only not in name:
+                continue
+            record = {"type": "result", "group": group, "name": name}
+            try:
+                record.update(measure(fn, args.warmup, args.repeat))
+            except Exception as e:
+                record["error"] = str(e)
+            emit(record)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection becomes available before the acquire timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of reusable database connections"""
+
+    def __init__(self, factory, max_size=5, max_idle_time=300, acquire_timeout=10,
+                 health_check=None, on_close=None, health_check_idle_time=30):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_idle_time = max_idle_time
+        self.acquire_timeout = acquire_timeout
+        self.health_check = health_check
+        # Connections idle for less than this (seconds) are handed out unchecked;
+        # the check is a server round-trip, too slow to pay on every acquire
+        self.health_check_idle_time = health_check_idle_time
+        # Called with each connection just before the pool closes it
+        self.on_close = on_close
+
+        # Idle connections as (connection, released_at) pairs, most recent last
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "evicted": 0,
+            "discarded": 0,
+            "health_check_failures": 0,
+            "waits": 0,
+            "timeouts": 0
+        }
+
+    def acquire(self, timeout=None):
+        """Check a connection out of the pool, opening a new one if there is room"""
+        if timeout is None:
+            timeout = self.acquire_timeout
+        deadline = time.monotonic() + timeout
+        evicted = []
+
+        try:
+            conn, released_at = self._checkout(timeout, deadline, evicted)
+        finally:
+            # Closed outside the lock, like release() and close() do
+            for stale in evicted:
+                self._close_quietly(stale)
+
+        if conn is not None:
+            if time.monotonic() - released_at < self.health_check_idle_time or self._is_healthy(conn):
+                with self._cond:
+                    self._stats["reused"] += 1
+                return conn
+
+            # Stale connection: drop it and open a replacement in the same slot
+            with self._cond:
+                self._stats["health_check_failures"] += 1
+            self._close_quietly(conn)
+
+        try:
+            conn = self.factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._stats["created"] += 1
+        return conn
+
+    def _checkout(self, timeout, deadline, evicted):
+        """Take an idle connection as (conn, released_at), or reserve a slot as (None, None)"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolExhaustedError("Connection pool is closed")
+
+                evicted.extend(self._evict_idle())
+
+                if self._idle:
+                    # LIFO: the most recently used connection is the least likely to be stale
+                    conn, released_at = self._idle.pop()
+                    self._in_use += 1
+                    return conn, released_at
+
+                if self._size < self.max_size:
+                    # Reserve a slot now, open the connection outside the lock
+                    self._size += 1
+                    self._in_use += 1
+                    return None, None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolExhaustedError(
+                        f"No connection available after {timeout}s (pool size {self.max_size})"
+                    )
+                self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or close it if it should not be reused"""
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                self._stats["discarded"] += 1
+                close_now = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                close_now = False
+            self._cond.notify()
+
+        if close_now:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that acquires a connection and always releases it"""
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            # The connection may be mid-transaction or broken, don't hand it out again
+            discard = not self._is_healthy(conn)
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def stats(self):
+        """Return a snapshot of pool counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle)
+            })
+        return stats
+
+    def close(self):
+        """Close all idle connections; checked-out ones are closed when released"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def _evict_idle(self):
+        """Take out connections idle longer than max_idle_time (lock held); returns them to close"""
+        evicted = []
+        if not self.max_idle_time:
+            return evicted
+
+        cutoff = time.monotonic() - self.max_idle_time
+        # Oldest connections sit at the left end of the deque
+        while self._idle and self._idle[0][1] < cutoff:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._stats["evicted"] += 1
+            evicted.append(conn)
+        return evicted
+
+    def _is_healthy(self, conn):
+        """Run the configured health check, treating any error as unhealthy"""
+        if self.health_check is None:
+            return True
+        try:
+            return bool(self.health_check(conn))
+        except Exception:
+            return False
+
+    def _close_quietly(self, conn):
+        if self.on_close is not None:
+            try:
+                self.on_close(conn)
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -1,6 +1,8 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+from src.background import run_async
 from src.models import Customer
+from src.paging import InfiniteScroll
 from src.utils import validate_email, validate_phone
 
 class CustomerManagement:
@@ -8,6 +10,9 @@ class CustomerManagement:
         self.parent = parent
         self.db = db
         
+        # Search term the customer list is filtered by while it pages
+        self.search_term = None
+        
         # Create main frame
         self.frame = ttk.Frame(parent)
         self.frame.pack(fill=tk.BOTH, expand=True)
@@ -84,6 +89,13 @@ class CustomerManagement:
         self.customer_tree.pack(fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.customer_tree.yview)
         
+        # Customers are loaded a page at a time as the list is scrolled
+        self.customer_pager = InfiniteScroll(
+            self.customer_tree, scrollbar,
+            lambda after: self.db.get_customers_page_async(self.search_term, after),
+            self.insert_customer, key="customers"
+        )
+        
         # Bind select event
         self.customer_tree.bind("<<TreeviewSelect>>", self.on_customer_select)
         
@@ -132,29 +144,25 @@ class CustomerManagement:
         self.address_text.grid(row=3, column=1, sticky="ew", pady=5)
         
         # Save button
-        save_button = ttk.Button(form_frame, text="Save Customer", command=self.save_customer)
-        save_button.grid(row=4, column=0, columnspan=2, pady=10)
+        self.save_button = ttk.Button(form_frame, text="Save Customer", command=self.save_customer)
+        self.save_button.grid(row=4, column=0, columnspan=2, pady=10)
         
         # Configure grid weights
         form_frame.grid_columnconfigure(1, weight=1)
     
     def load_customers(self):
         """Load all customers into the treeview"""
-        # Clear existing items
-        for item in self.customer_tree.get_children():
-            self.customer_tree.delete(item)
-        
-        # Get customers from database
-        customers = self.db.get_all_customers()
-        
-        # Insert customers into treeview
-        for customer in customers:
-            self.customer_tree.insert("", "end", values=(
-                customer['id'],
-                customer['name'],
-                customer['email'] or "",
-                customer['phone'] or ""
-            ))
+        self.search_term = None
+        self.customer_pager.reset()
+    
+    def insert_customer(self, customer):
+        """Add one loaded customer to the treeview"""
+        self.customer_tree.insert("", "end", values=(
+            customer['id'],
+            customer['name'],
+            customer['email'] or "",
+            customer['phone'] or ""
+        ))
     
     def search_customers(self):
         """Search customers based on search term"""
@@ -163,29 +171,9 @@ class CustomerManagement:
             self.load_customers()
             return
         
-        # Clear existing items
-        for item in self.customer_tree.get_children():
-            self.customer_tree.delete(item)
-        
-        # Get all customers and filter
-        self.db.connect()
-        self.db.cursor.execute('''
-        SELECT id, name, email, phone
-        FROM customers
-        WHERE LOWER(name) LIKE %s OR LOWER(email) LIKE %s OR LOWER(phone) LIKE %s
-        ORDER BY name
-        ''', (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%'))
-        customers = self.db.cursor.fetchall()
-        self.db.disconnect()
-        
-        # Insert filtered customers into treeview
-        for customer in customers:
-            self.customer_tree.insert("", "end", values=(
-                customer['id'],
-                customer['name'],
-                customer['email'] or "",
-                customer['phone'] or ""
-            ))
+        # Page through matching customers
+        self.search_term = search_term
+        self.customer_pager.reset()
     
     def reset_search(self):
         """Reset search field and reload all customers"""
@@ -203,15 +191,15 @@ class CustomerManagement:
         customer_id = item['values'][0]
         
         # Load customer details
-        self.db.connect()
-        self.db.cursor.execute('''
+        future = self.db.fetch_one_async('''
         SELECT id, name, email, phone, address
         FROM customers
         WHERE id = %s
         ''', (customer_id,))
-        customer = self.db.cursor.fetchone()
-        self.db.disconnect()
-        
+        run_async(self.customer_tree, future, self.display_customer_details, key="customer_details")
+    
+    def display_customer_details(self, customer):
+        """Fill the customer form with the selected customer"""
         if not customer:
             return
         
@@ -242,28 +230,6 @@ class CustomerManagement:
         phone = self.phone_var.get().strip()
         address = self.address_text.get(1.0, tk.END).strip()
         
-        # Basic validation
-        if not name:
-            messagebox.showerror("Error", "Customer name is required")
-            return
-        
-        if email and not validate_email(email):
-            messagebox.showerror("Error", "Invalid email format")
-            return
-        
-        if phone and not validate_phone(phone):
-            messagebox.showerror("Error", "Invalid phone number format")
-            return
-        
-        # Save
-          def save_customer(self):
-        """Save customer to database"""
-        # Validate form
-        name = self.name_var.get().strip()
-        email = self.email_var.get().strip()
-        phone = self.phone_var.get().strip()
-        address = self.address_text.get(1.0, tk.END).strip()
-        
         # Basic validation
         if not name:
             messagebox.showerror("Error", "Customer name is required")
@@ -280,33 +246,35 @@ class CustomerManagement:
         # Save to database
         customer_id = self.customer_id_var.get()
         
-        try:
-            self.db.connect()
-            if customer_id:  # Update existing customer
-                self.db.cursor.execute('''
-                UPDATE customers
-                SET name = %s, email = %s, phone = %s, address = %s
-                WHERE id = %s
-                ''', (name, email, phone, address, customer_id))
-                messagebox.showinfo("Success", "Customer updated successfully")
-            else:  # Add new customer
-                self.db.cursor.execute('''
-                INSERT INTO customers (name, email, phone, address)
-                VALUES (%s, %s, %s, %s)
-                ''', (name, email, phone, address))
-                messagebox.showinfo("Success", "Customer added successfully")
-            
-            self.db.conn.commit()
-            self.db.disconnect()
-            
-            # Refresh customer list
-            self.load_customers()
-            
-            # Clear form
-            self.add_new_customer()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save customer: {e}")
+        if customer_id:  # Update existing customer
+            future = self.db.execute_async('''
+            UPDATE customers
+            SET name = %s, email = %s, phone = %s, address = %s
+            WHERE id = %s
+            ''', (name, email, phone, address, customer_id))
+            message = "Customer updated successfully"
+        else:  # Add new customer
+            future = self.db.add_customer_async(name, email, phone, address)
+            message = "Customer added successfully"
+        
+        self.save_button.config(state=tk.DISABLED)
+        run_async(self.save_button, future,
+                  lambda _: self.customer_saved(message), self.customer_save_failed)
+    
+    def customer_saved(self, message):
+        """Refresh the list and clear the form after a save"""
+        self.save_button.config(state=tk.NORMAL)
+        messagebox.showinfo("Success", message)
+        
+        # Refresh customer list
+        self.load_customers()
+        
+        # Clear form
+        self.add_new_customer()
+    
+    def customer_save_failed(self, error):
+        self.save_button.config(state=tk.NORMAL)
+        messagebox.showerror("Error", f"Failed to save customer: {error}")
     
     def delete_customer(self):
         """Delete selected customer"""
@@ -321,11 +289,13 @@ class CustomerManagement:
         customer_name = item['values'][1]
         
         # Check if customer has orders
-        self.db.connect()
-        self.db.cursor.execute("SELECT COUNT(*) as count FROM orders WHERE customer_id = %s", (customer_id,))
-        result = self.db.cursor.fetchone()
-        has_orders = result['count'] > 0
-        self.db.disconnect()
+        future = self.db.count_customer_orders_async(customer_id)
+        run_async(self.customer_tree, future,
+                  lambda order_count: self.confirm_delete_customer(customer_id, customer_name, order_count))
+    
+    def confirm_delete_customer(self, customer_id, customer_name, order_count):
+        """Ask for confirmation once the order check has returned, then delete"""
+        has_orders = order_count > 0
         
         if has_orders:
             messagebox.showerror(
@@ -342,14 +312,14 @@ class CustomerManagement:
         )
         
         if confirm:
-            try:
-                self.db.connect()
-                self.db.cursor.execute("DELETE FROM customers WHERE id = %s", (customer_id,))
-                self.db.conn.commit()
-                self.db.disconnect()
-                
-                messagebox.showinfo("Success", "Customer deleted successfully")
-                self.load_customers()
-                self.add_new_customer()  # Clear form
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to delete customer: {e}")
+            run_async(self.customer_tree,
+                      self.db.execute_async("DELETE FROM customers WHERE id = %s", (customer_id,)),
+                      self.customer_deleted, self.customer_delete_failed)
+    
+    def customer_deleted(self, _):
+        messagebox.showinfo("Success", "Customer deleted successfully")
+        self.load_customers()
+        self.add_new_customer()  # Clear form
+    
+    def customer_delete_failed(self, error):
+        messagebox.showerror("Error", f"Failed to delete customer: {error}")
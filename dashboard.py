@@ -1,5 +1,8 @@
+import os
+import queue
 import tkinter as tk
-from tkinter import ttk
+from datetime import datetime
+from tkinter import ttk, messagebox
 from .product_management import ProductManagement
 from .customer_management import CustomerManagement
 from .sales import Sales
@@ -31,6 +34,15 @@ class Dashboard:
         self.main_frame.grid_rowconfigure(1, weight=1)
         self.main_frame.grid_columnconfigure(1, weight=1)
         
+        # Ctrl+Shift+D dumps database query statistics to the reports folder
+        self.root.bind("<Control-Shift-D>", self.dump_query_stats)
+        
+        # Low-stock alerts arrive on database worker threads; the Tk thread polls for them
+        self.low_stock_alerts = queue.SimpleQueue()
+        self.db.low_stock.subscribe(self.low_stock_alerts.put)
+        self.main_frame.bind("<Destroy>", self.on_destroy)
+        self.poll_low_stock_alerts()
+        
         # Show default page (products)
         self.show_products()
     
@@ -48,6 +60,11 @@ class Dashboard:
         user_frame = ttk.Frame(header_frame)
         user_frame.pack(side=tk.RIGHT)
         
+        # Latest low-stock alert
+        self.alert_var = tk.StringVar()
+        alert_label = ttk.Label(user_frame, textvariable=self.alert_var, foreground="#c0392b")
+        alert_label.pack(side=tk.LEFT, padx=10)
+        
         user_label = ttk.Label(user_frame, text=f"Logged in as: {self.user['username']} ({self.user['role']})")
         user_label.pack(side=tk.LEFT, padx=10)
         
@@ -114,3 +131,40 @@ class Dashboard:
         """Show reports page"""
         self.clear_content()
         Reports(self.content_frame, self.db)
+    
+    def poll_low_stock_alerts(self):
+        """Show the products whose stock has just fallen to the low-stock threshold"""
+        products = []
+        while True:
+            try:
+                products.append(self.low_stock_alerts.get_nowait())
+            except queue.Empty:
+                break
+        
+        if products:
+            latest = products[-1]
+            text = f"Low stock: {latest['name']} ({latest['stock_quantity']} left)"
+            if len(products) > 1:
+                text += f" and {len(products) - 1} more"
+            self.alert_var.set(text)
+        
+        self.alert_poll = self.root.after(500, self.poll_low_stock_alerts)
+    
+    def on_destroy(self, event):
+        """Stop listening for alerts when the dashboard is closed (logout)"""
+        if event.widget is not self.main_frame:
+            return
+        self.db.low_stock.unsubscribe(self.low_stock_alerts.put)
+        self.root.after_cancel(self.alert_poll)
+    
+    def dump_query_stats(self, event=None):
+        """Write database query statistics to a JSON file in the reports folder"""
+        reports_dir = os.path.join(os.getcwd(), "reports")
+        os.makedirs(reports_dir, exist_ok=True)
+        path = os.path.join(reports_dir, f"db_stats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        
+        try:
+            self.db.dump_query_stats(path)
+            messagebox.showinfo("Database Statistics", f"Query statistics written to:\n{path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to write query statistics: {e}")
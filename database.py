@@ -1,383 +1,1433 @@
-import mysql.connector
+import csv
+import json
 import os
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import lru_cache
+from src import forecast, migrations
+from src.backends import MySQLBackend, create_backend
+from src.connection_pool import ConnectionPool, PoolExhaustedError
+from src.image_store import STORE_DIRECTORY, ImageStore
+from src.instrumentation import Instrumentation, InstrumentedCursor
+from src.low_stock import LowStockIndex
+from src.models import record_type
+from src.query_builder import Query, compile_cache_stats
+from src.prepared_statements import StatementCache, StatementCacheStats
+from src.order_journal import JournalReplayer, OrderJournal, is_unavailable_error, new_order_ref
+from src.reference_cache import ReferenceCache
+from src.replica import ReplicaRouter
+
+
+@lru_cache(maxsize=64)
+def _order_items_insert(count):
+    """Multi-row INSERT of count order items"""
+    rows = ", ".join(["(%s, %s, %s, %s)"] * count)
+    return f"INSERT INTO order_items (order_id, product_id, quantity, price) VALUES {rows}"
+
+
+def _product_revenue_query(category_filter=""):
+    """Units and revenue per product in completed orders of a date range, plus an optional filter"""
+    return f'''
+    SELECT p.id, p.name, c.name as category_name,
+           SUM(oi.quantity) as total_quantity,
+           SUM(oi.quantity * oi.price) as total_revenue
+    FROM order_items oi
+    JOIN orders o ON oi.order_id = o.id
+    JOIN products p ON oi.product_id = p.id
+    LEFT JOIN categories c ON p.category_id = c.id
+    WHERE o.order_date >= %s AND o.order_date < %s
+    {category_filter}
+    AND o.status = 'Completed'
+    GROUP BY p.id
+    ORDER BY total_revenue DESC
+    '''
+
+
+@lru_cache(maxsize=128)
+def _stock_decrement(count, guarded=True):
+    """UPDATE of count products taking (product_id, quantity) pairs, the product IDs and,
+    when guarded, the pairs again for the stock check
+    """
+    cases = " ".join(["WHEN %s THEN %s"] * count)
+    placeholders = ", ".join(["%s"] * count)
+    sql = (f"UPDATE products SET stock_quantity = stock_quantity - CASE id {cases} END, "
+           f"stock_version = stock_version + 1 WHERE id IN ({placeholders})")
+    if guarded:
+        # Rows without enough stock are left alone, and missing from the affected row count
+        sql += f" AND stock_quantity >= CASE id {cases} END"
+    return sql
+
+
+@lru_cache(maxsize=128)
+def _stock_adjustment(count):
+    """UPDATE adding a delta to each of count products. Takes (product_id, delta) pairs,
+    the product IDs, the pairs again for the non-negative check, and (product_id,
+    expected_version) pairs where a NULL version skips the check
+    """
+    cases = " ".join(["WHEN %s THEN %s"] * count)
+    placeholders = ", ".join(["%s"] * count)
+    return (f"UPDATE products SET stock_quantity = stock_quantity + CASE id {cases} END, "
+            f"stock_version = stock_version + 1 "
+            f"WHERE id IN ({placeholders}) "
+            f"AND stock_quantity + CASE id {cases} END >= 0 "
+            f"AND stock_version = COALESCE(CASE id {cases} END, stock_version)")
+
+
+def _chunks(values, size):
+    """Split a list into consecutive slices of at most size items"""
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def _pad_to_bucket(values):
+    """Repeat the last value up to the next power of two, so IN lists only come in a few lengths"""
+    size = 1 << (len(values) - 1).bit_length()
+    return values + [values[-1]] * (size - len(values))
+
+
+@lru_cache(maxsize=64)
+def _movements_insert(count):
+    """Multi-row INSERT of count inventory movements"""
+    rows = ", ".join(["(%s, %s, %s, %s, %s)"] * count)
+    return f"INSERT INTO inventory_movements (product_id, quantity, reason, order_id, note) VALUES {rows}"
+
+
+class InsufficientStockError(Exception):
+    """Raised when order lines ask for more than is in stock; nothing is written"""
+    
+    def __init__(self, shortages):
+        # {product_id: (requested, available)}
+        self.shortages = shortages
+        super().__init__("Not enough stock: " + ", ".join(
+            f"product {product_id} ({requested} requested, {available} available)"
+            for product_id, (requested, available) in sorted(shortages.items())
+        ))
+
+
+class StockConflictError(Exception):
+    """Raised when a batch of stock adjustments can't all be applied; none were"""
+    
+    def __init__(self, conflicts):
+        # {product_id: (reason, stock, version)}; reason is "changed" (the stock
+        # version moved on since it was read), "insufficient" or "missing"
+        self.conflicts = conflicts
+        super().__init__("Stock adjustment rejected: " + ", ".join(
+            f"product {product_id} ({reason})" for product_id, (reason, _, _) in sorted(conflicts.items())
+        ))
+
+
+class _StockConflict(Exception):
+    """The guarded stock decrement skipped a line; the transaction is rolled back"""
+
 
 class Database:
-    def __init__(self, host='localhost', user='root', password='', database='cosmetic_shop'):
+    def __init__(self, host='localhost', user='root', password='', database='cosmetic_shop',
+                 pool_size=5, pool_max_idle_time=300, pool_acquire_timeout=10,
+                 slow_query_threshold=0.5, slow_query_log=None, reference_cache_ttl=300,
+                 journal_path=None, replica=None, replica_max_lag=30, backend='mysql', sqlite_path=None,
+                 prepared_statements=True, statement_cache_size=64, low_stock_threshold=10,
+                 low_stock_refresh_interval=300, image_directory=STORE_DIRECTORY):
         self.host = host
         self.user = user
         self.password = password
         self.database = database
-        self.conn = None
-        self.cursor = None
-        self.ensure_db_exists()
-        
-    def ensure_db_exists(self):
-        """Ensure database exists and create it if it doesn't"""
-        # Connect to MySQL server without specifying a database
-        temp_conn = mysql.connector.connect(
-            host=self.host,
-            user=self.user,
-            password=self.password
-        )
-        temp_cursor = temp_conn.cursor()
-        
-        # Create database if it doesn't exist
-        temp_cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database}")
-        
-        temp_cursor.close()
-        temp_conn.close()
-        
-        # Now connect to the database and create tables
-        self.connect()
-        self.create_tables()
-        self.disconnect()
-        
-    def connect(self):
-        """Connect to the MySQL database"""
-        self.conn = mysql.connector.connect(
-            host=self.host,
-            user=self.user,
-            password=self.password,
-            database=self.database
+        # 'mysql', 'sqlite' (a local database file, sqlite_path) or a backend object
+        if isinstance(backend, str):
+            backend = create_backend(backend, host, user, password, database, sqlite_path)
+        self.backend = backend
+        # Prepared statements of the hot paths, cached per pooled connection
+        # (prepared_statements=False caches text-protocol cursors instead)
+        self.prepared_statements = prepared_statements
+        self.statement_cache_size = statement_cache_size
+        self.statement_stats = StatementCacheStats()
+        self._statement_caches = {}
+        self.pool = ConnectionPool(
+            self._create_connection,
+            max_size=pool_size,
+            max_idle_time=pool_max_idle_time,
+            acquire_timeout=pool_acquire_timeout,
+            health_check=lambda conn: conn.is_connected(),
+            on_close=self._close_statements
         )
-        self.cursor = self.conn.cursor(dictionary=True)
-        
-    def disconnect(self):
-        """Disconnect from the MySQL database"""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
-            self.cursor = None
-            
-    def create_tables(self):
-        """Create necessary tables if they don't exist"""
-        # Create Categories table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS categories (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(100) NOT NULL UNIQUE,
-            description TEXT
+        # Optional read replica for reporting queries; replica is a dict of
+        # connection settings, any left out are taken from the primary
+        self.replica = None
+        if replica:
+            if self.backend.name != "mysql":
+                raise ValueError("A read replica needs the MySQL backend")
+            settings = dict(host=host, user=user, password=password, database=database)
+            settings.update(replica)
+            self.replica = ReplicaRouter(
+                ConnectionPool(
+                    MySQLBackend(**settings).connect,
+                    max_size=pool_size,
+                    max_idle_time=pool_max_idle_time,
+                    acquire_timeout=pool_acquire_timeout,
+                    health_check=lambda conn: conn.is_connected(),
+                    on_close=self._close_statements
+                ),
+                max_lag=replica_max_lag
+            )
+        self.instrumentation = Instrumentation(
+            slow_query_threshold=slow_query_threshold,
+            slow_query_log=slow_query_log
         )
-        ''')
+        # Categories and other lookup tables, shared by every screen
+        self.reference_cache = ReferenceCache(ttl=reference_cache_ttl)
+        # Sales forecasts, kept apart so a category change doesn't drop them
+        self.forecast_cache = ReferenceCache(ttl=reference_cache_ttl)
+        # Product image files, stored once per distinct content
+        self.images = ImageStore(os.path.abspath(image_directory))
+        # Stock levels ordered by stock, kept current by the stock writes below;
+        # its threshold is the low_stock_threshold setting
+        self.low_stock = LowStockIndex(self._load_stock_index, threshold=low_stock_threshold,
+                                       refresh_interval=low_stock_refresh_interval)
+        # Worker threads for the *_async methods; one per pooled connection
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="db-worker")
+        self.ensure_schema()
         
-        # Create Products table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(100) NOT NULL,
-            description TEXT,
-            price DECIMAL(10, 2) NOT NULL,
-            stock_quantity INT NOT NULL,
-            category_id INT,
-            image_path VARCHAR(255),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-            FOREIGN KEY (category_id) REFERENCES categories (id)
-        )
-        ''')
+        # Checkouts made while MySQL is unreachable are journaled and replayed later
+        self.journal = None
+        self.replayer = None
+        if journal_path:
+            self.journal = OrderJournal(journal_path)
+            self.replayer = JournalReplayer(self, self.journal)
+            self.replayer.start()
         
-        # Create Customers table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS customers (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(100) NOT NULL,
-            email VARCHAR(100) UNIQUE,
-            phone VARCHAR(20),
-            address TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+    def ensure_schema(self):
+        """Apply pending schema migrations, creating the database on first run"""
+        try:
+            migrations.migrate(self)
+        except Exception as e:
+            if not self.backend.is_missing_database(e):
+                raise
+            self.create_database()
+            migrations.migrate(self)
+    
+    def create_database(self):
+        """Create the database (on the MySQL server, or the SQLite file's directory)"""
+        self.backend.create_database()
         
-        # Create Orders table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS orders (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            customer_id INT,
-            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            total_amount DECIMAL(10, 2) NOT NULL,
-            status VARCHAR(20) DEFAULT 'Pending',
-            FOREIGN KEY (customer_id) REFERENCES customers (id)
-        )
-        ''')
+    def _create_connection(self):
+        """Open a new connection to the database (used by the pool)"""
+        return self.backend.connect()
+    
+    def _statement_cache(self, conn):
+        """Return the prepared statement cache of a pooled connection"""
+        cache = self._statement_caches.get(conn)
+        if cache is None:
+            cache = self._statement_caches[conn] = StatementCache(
+                conn, self.statement_stats, self.statement_cache_size, self.prepared_statements
+            )
+        return cache
+    
+    def _close_statements(self, conn):
+        """Drop a connection's prepared statements when the pool closes it"""
+        cache = self._statement_caches.pop(conn, None)
+        if cache is not None:
+            cache.close()
+            self.statement_stats.add("connections_closed")
+    
+    @contextmanager
+    def connection(self, replica=False):
+        """Check a raw connection out of the pool (or the replica's pool) for the duration of the block"""
+        pool = self.replica.pool if replica else self.pool
+        started = time.perf_counter()
+        with pool.connection() as conn:
+            self.instrumentation.record_acquire(time.perf_counter() - started)
+            yield conn
+    
+    @contextmanager
+    def transaction(self, dictionary=True, replica=False):
+        """Yield a dictionary (or, with dictionary=False, tuple) cursor on a pooled connection.
         
-        # Create Order Items table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS order_items (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            order_id INT,
-            product_id INT,
-            quantity INT NOT NULL,
-            price DECIMAL(10, 2) NOT NULL,
-            FOREIGN KEY (order_id) REFERENCES orders (id),
-            FOREIGN KEY (product_id) REFERENCES products (id)
-        )
-        ''')
+        Commits when the block exits normally and rolls back on error. Read-only
+        blocks commit too, so the connection goes back without an open snapshot.
+        """
+        with self.connection(replica) as conn:
+            # Buffered so fetchone() never leaves unread rows on a pooled connection
+            cursor = InstrumentedCursor(conn.cursor(dictionary=dictionary, buffered=True), self.instrumentation,
+                                        self._statement_cache(conn))
+            try:
+                yield cursor
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+            
+            if cursor.wrote and self.replica is not None and not replica:
+                self.replica.note_write(conn)
+    
+    def use_replica(self):
+        """Return True if a replica-eligible read should go to the replica right now"""
+        return self.replica is not None and self.replica.usable()
+    
+    def read(self, fn, replica=False, dictionary=True):
+        """Run fn(cursor) in a read transaction and return its result.
         
-        # Create Users table for authentication
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            username VARCHAR(50) NOT NULL UNIQUE,
-            password VARCHAR(100) NOT NULL,
-            role VARCHAR(20) DEFAULT 'staff',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+        With replica=True the read goes to the read replica when it is usable
+        and has applied this process's last write, and falls back to the
+        primary if it hasn't or can't be reached.
+        """
+        if replica and self.use_replica():
+            try:
+                with self.transaction(dictionary, replica=True) as cursor:
+                    caught_up = self.replica.caught_up(cursor)
+                    if caught_up:
+                        result = fn(cursor)
+                if caught_up:
+                    self.replica.record_read(True)
+                    return result
+            except Exception as e:
+                if not is_unavailable_error(e) and not isinstance(e, PoolExhaustedError):
+                    raise
+                self.replica.mark_down(e)
         
-        # Insert default admin user if not exists
-        self.cursor.execute('''
-        INSERT IGNORE INTO users (username, password, role)
-        VALUES ('admin', 'admin123', 'admin')
-        ''')
+        with self.transaction(dictionary) as cursor:
+            result = fn(cursor)
+        if replica and self.replica is not None:
+            self.replica.record_read(False)
+        return result
+    
+    def fetch_all(self, query, params=None, replica=False):
+        """Run a query and return all rows as dictionaries"""
+        def read(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        return self.read(read, replica)
+    
+    def fetch_one(self, query, params=None, replica=False):
+        """Run a query and return the first row as a dictionary, or None"""
+        def read(cursor):
+            cursor.execute(query, params)
+            return cursor.fetchone()
+        return self.read(read, replica)
+    
+    def fetch_records(self, query, params=None, replica=False):
+        """Run a query and return all rows as named-tuple records.
         
-        # Insert some default categories
-        categories = [
-            ('Skincare', 'Products for skin care and treatment'),
-            ('Makeup', 'Cosmetic products for face and body'),
-            ('Haircare', 'Products for hair care and styling'),
-            ('Fragrances', 'Perfumes and body sprays'),
-            ('Bath & Body', 'Products for bathing and body care')
-        ]
+        Records are built straight from a tuple cursor and share one class per
+        column list, so unlike fetch_all() no per-row dictionary is allocated.
+        Read fields as attributes (row.name) or pass them to a model's from_db_rows().
+        """
+        def read(cursor):
+            cursor.execute(query, params)
+            record = record_type(tuple(cursor.column_names))
+            return list(map(record._make, cursor.fetchall()))
+        return self.read(read, replica, dictionary=False)
+    
+    def execute(self, query, params=None):
+        """Run a write statement in its own transaction and return lastrowid"""
+        with self.transaction() as cursor:
+            cursor.execute(query, params)
+            return cursor.lastrowid
+    
+    @staticmethod
+    def _fetch_prepared(cursor, query, params):
+        """Run a query as a prepared statement and return its rows as dictionaries"""
+        prepared = cursor.execute_prepared(query, params)
+        columns = prepared.column_names
+        return [dict(zip(columns, row)) for row in prepared.fetchall()]
+    
+    def fetch_prepared(self, query, params=(), replica=False):
+        """Like fetch_all(), but as a prepared statement cached on the connection"""
+        return self.read(lambda cursor: self._fetch_prepared(cursor, query, params), replica)
+    
+    def execute_prepared(self, query, params=()):
+        """Like execute(), but as a prepared statement cached on the connection"""
+        with self.transaction() as cursor:
+            return cursor.execute_prepared(query, params).lastrowid
+    
+    def stream(self, query, params=None, batch_size=1000, records=False, replica=False):
+        """Yield the rows of a query as dictionaries, holding at most batch_size in memory.
         
-        for category in categories:
+        Rows are read from an unbuffered cursor in fetchmany() batches, so MySQL
+        sends them as they are consumed. The pooled connection stays checked out
+        until the generator is exhausted or closed; one abandoned mid-result is
+        discarded rather than drained, since it may still have millions of rows
+        pending. With records=True rows are named-tuple records, as from
+        fetch_records(). With replica=True the rows come from the read replica
+        if it is usable and a connection to it can be opened.
+        """
+        pool = self.pool
+        started = time.perf_counter()
+        conn = None
+        if replica and self.use_replica():
             try:
-                self.cursor.execute('''
-                INSERT IGNORE INTO categories (name, description)
-                VALUES (%s, %s)
-                ''', category)
-            except mysql.connector.errors.IntegrityError:
-                # Skip if category already exists
-                pass
+                conn = self.replica.pool.acquire()
+                pool = self.replica.pool
+                check = conn.cursor(buffered=True)
+                try:
+                    caught_up = self.replica.caught_up(check)
+                finally:
+                    check.close()
+                if not caught_up:
+                    # Hasn't applied our last write yet; read it from the primary
+                    conn.commit()
+                    pool.release(conn)
+                    conn, pool = None, self.pool
+            except Exception as e:
+                if conn is not None:
+                    pool.release(conn, discard=True)
+                    conn, pool = None, self.pool
+                if not is_unavailable_error(e) and not isinstance(e, PoolExhaustedError):
+                    raise
+                self.replica.mark_down(e)
+        if conn is None:
+            conn = self.pool.acquire()
+        if replica and self.replica is not None:
+            self.replica.record_read(pool is not self.pool)
+        self.instrumentation.record_acquire(time.perf_counter() - started)
+        finished = False
+        try:
+            cursor = InstrumentedCursor(conn.cursor(dictionary=not records), self.instrumentation)
+            cursor.execute(query, params)
+            record = record_type(tuple(cursor.column_names)) if records else None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                if record is not None:
+                    rows = map(record._make, rows)
+                yield from rows
+            
+            cursor.close()
+            conn.commit()
+            finished = True
+        finally:
+            pool.release(conn, discard=not finished)
+    
+    def export_csv(self, path, query, params=None, headers=None, batch_size=1000, replica=False):
+        """Stream a query's rows straight into a CSV file and return the row count"""
+        count = 0
+        with open(path, "w", newline="") as f:
+            writer = None
+            for row in self.stream(query, params, batch_size, replica=replica):
+                if writer is None:
+                    writer = csv.writer(f)
+                    writer.writerow(headers or list(row.keys()))
+                writer.writerow(row.values())
+                count += 1
+            if writer is None and headers:
+                csv.writer(f).writerow(headers)
+        return count
+    
+    @staticmethod
+    def _seek(query, sort_columns, after=None, limit=100, descending=False):
+        """Turn a listing (a Query) into one page of it with keyset (seek) pagination.
+        
+        Rows are ordered by the two sort_columns (a sort key plus a unique
+        tiebreaker such as id) and the page starts right after the key
+        `after`, so the database seeks straight to it in the index instead of
+        skipping rows as OFFSET would. Returns the query, for fetch_page().
+        """
+        first, second = sort_columns
+        op = "<" if descending else ">"
+        if after is not None:
+            # Spelled out rather than (a, b) > (x, y) so MySQL uses a range scan
+            query.where(f"({first} {op} %s OR ({first} = %s AND {second} {op} %s))",
+                        after[0], after[0], after[1])
+        
+        direction = "DESC" if descending else "ASC"
+        # One extra row tells us whether another page exists
+        return query.order_by(f"{first} {direction}", f"{second} {direction}").limit(limit + 1)
+    
+    def fetch_page(self, query, key_fields, limit=100):
+        """Run a page query built by _seek() and return (rows, next_after).
         
-        self.conn.commit()
+        next_after is the key (the key_fields of the last row) to pass for
+        the following page, or None on the last page.
+        """
+        rows = query.fetch_all(self)
+        if len(rows) <= limit:
+            return rows, None
+        rows = rows[:limit]
+        return rows, tuple(rows[-1][field] for field in key_fields)
+    
+    def pool_stats(self):
+        """Return connection pool statistics"""
+        return self.pool.stats()
+    
+    def query_stats(self):
+        """Return per-statement and per-screen query statistics"""
+        stats = self.instrumentation.snapshot()
+        stats["pool"] = self.pool_stats()
+        stats["reference_cache"] = self.reference_cache.stats()
+        stats["forecast_cache"] = self.forecast_cache.stats()
+        stats["low_stock"] = self.low_stock.stats()
+        stats["compiled_statements"] = compile_cache_stats()
+        stats["prepared_statements"] = dict(
+            self.statement_stats.to_dict(),
+            enabled=self.prepared_statements,
+            cached=sum(len(cache) for cache in list(self._statement_caches.values()))
+        )
+        if self.replica is not None:
+            stats["replica"] = self.replica.stats()
+        return stats
     
+    def dump_query_stats(self, path):
+        """Write query and pool statistics to a JSON file"""
+        with open(path, "w") as f:
+            json.dump(self.query_stats(), f, indent=4, default=str)
+        return path
+    
+    def submit(self, fn, *args, **kwargs):
+        """Run fn on a database worker thread and return a Future"""
+        # Resolve the calling screen here; the worker thread's stack won't show it
+        source = self.instrumentation.calling_screen()
+        return self.executor.submit(self._run_for_source, source, fn, *args, **kwargs)
+    
+    def _run_for_source(self, source, fn, *args, **kwargs):
+        with self.instrumentation.source(source):
+            return fn(*args, **kwargs)
+    
+    def close(self):
+        """Stop the worker threads and close all pooled connections"""
+        if self.replayer is not None:
+            self.replayer.stop()
+        self.executor.shutdown(wait=False)
+        self.pool.close()
+        if self.replica is not None:
+            self.replica.pool.close()
+            
     # Product methods
-    def add_product(self, name, description, price, stock_quantity, category_id, image_path=None):
-        """Add a new product to the database"""
-        self.connect()
-        self.cursor.execute('''
-        INSERT INTO products (name, description, price, stock_quantity, category_id, image_path)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        ''', (name, description, price, stock_quantity, category_id, image_path))
-        product_id = self.cursor.lastrowid
-        self.conn.commit()
-        self.disconnect()
+    def add_product(self, name, description, price, stock_quantity, category_id, image_path=None, image_name=None):
+        """Add a new product to the database; image_name is the image's original file name, for display"""
+        with self.transaction() as cursor:
+            cursor.execute('''
+            INSERT INTO products (name, description, price, stock_quantity, category_id, image_path, image_name)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ''', (name, description, price, stock_quantity, category_id, image_path, image_name))
+            product_id = cursor.lastrowid
+            if stock_quantity:
+                cursor.execute_prepared(_movements_insert(1), (product_id, stock_quantity, "opening", None, None))
+            self._count_image_reference(cursor, image_path, 1)
+            stock = self._read_stock(cursor, [product_id])
+        self.low_stock.update(stock)
         return product_id
     
-    def update_product(self, product_id, name, description, price, stock_quantity, category_id, image_path=None):
-        """Update an existing product"""
-        self.connect()
-        self.cursor.execute('''
-        UPDATE products
-        SET name = %s, description = %s, price = %s, stock_quantity = %s, 
-            category_id = %s, image_path = %s
-        WHERE id = %s
-        ''', (name, description, price, stock_quantity, category_id, image_path, product_id))
-        self.conn.commit()
-        self.disconnect()
+    def update_product(self, product_id, name, description, price, category_id, image_path=None, image_name=None):
+        """Update an existing product's details.
+        
+        Stock is not written here: change it with adjust_stock, against the
+        stock_version read with the product, so sales made meanwhile are kept.
+        """
+        with self.transaction() as cursor:
+            self._replace_image_reference(cursor, product_id, image_path)
+            cursor.execute('''
+            UPDATE products
+            SET name = %s, description = %s, price = %s, category_id = %s, image_path = %s, image_name = %s
+            WHERE id = %s
+            ''', (name, description, price, category_id, image_path, image_name, product_id))
+            stock = self._read_stock(cursor, [product_id])
+        self.low_stock.update(stock)
     
     def delete_product(self, product_id):
         """Delete a product from the database"""
-        self.connect()
-        self.cursor.execute('DELETE FROM products WHERE id = %s', (product_id,))
-        self.conn.commit()
-        self.disconnect()
+        with self.transaction() as cursor:
+            self._replace_image_reference(cursor, product_id, None)
+            cursor.execute('DELETE FROM products WHERE id = %s', (product_id,))
+        self.low_stock.discard(product_id)
+    
+    # Product image methods
+    def import_image(self, source):
+        """Put an image file in the image store and return the path to save on the product.
+        
+        A file whose content is already stored is not copied again.
+        """
+        digest, path, size = self.images.add(source)
+        with self.transaction() as cursor:
+            cursor.execute(f'''
+            {self.backend.insert_ignore} INTO image_blobs (digest, path, size_bytes)
+            VALUES (%s, %s, %s)
+            ''', (digest, path, size))
+            # Unused images are purged after a while; this one was just picked
+            cursor.execute("UPDATE image_blobs SET imported_at = %s WHERE digest = %s", (datetime.now(), digest))
+        return path
+    
+    @staticmethod
+    def _count_image_reference(cursor, image_path, change):
+        # Paths outside the image store have no image_blobs row and are left alone
+        if image_path:
+            cursor.execute("UPDATE image_blobs SET ref_count = ref_count + %s WHERE path = %s", (change, image_path))
+    
+    def _replace_image_reference(self, cursor, product_id, image_path):
+        """Move a product's image reference count from its current image to image_path"""
+        rows = self._fetch_prepared(cursor, "SELECT image_path FROM products WHERE id = %s", (product_id,))
+        current = rows[0]['image_path'] if rows else None
+        if rows and current != image_path:
+            self._count_image_reference(cursor, current, -1)
+            self._count_image_reference(cursor, image_path, 1)
+    
+    def purge_unused_images(self, min_age=timedelta(days=1)):
+        """Delete stored images no product has used since min_age ago; returns the number deleted"""
+        unused = self.fetch_all('''
+        SELECT digest, path FROM image_blobs WHERE ref_count <= 0 AND imported_at < %s
+        ''', (datetime.now() - min_age,))
+        purged = 0
+        for blob in unused:
+            # Re-checked row by row, in case a product has started using it since
+            with self.transaction() as cursor:
+                cursor.execute("DELETE FROM image_blobs WHERE digest = %s AND ref_count <= 0", (blob['digest'],))
+                deleted = cursor.rowcount
+            if deleted:
+                self.images.remove(blob['path'])
+                purged += 1
+        return purged
+    
+    def get_image_digests(self):
+        """Return the digests of every image in the image store"""
+        return {row['digest'] for row in self.fetch_all("SELECT digest FROM image_blobs")}
+    
+    def image_store_stats(self):
+        """Stored image files, the bytes they take and the bytes they would take without sharing"""
+        return self.fetch_one('''
+        SELECT COUNT(*) AS files, COALESCE(SUM(size_bytes), 0) AS stored_bytes,
+               COALESCE(SUM(size_bytes * ref_count), 0) AS referenced_bytes
+        FROM image_blobs
+        ''')
+    
+    def update_stock(self, product_id, stock_quantity, note=None):
+        """Set a product's stock quantity, overwriting whatever it is now.
+        
+        For explicit corrections only; the difference is logged as one.
+        Edits made against stock read earlier go through adjust_stock.
+        """
+        with self.transaction() as cursor:
+            self._record_stock_correction(cursor, product_id, stock_quantity, note)
+            cursor.execute_prepared(
+                "UPDATE products SET stock_quantity = %s, stock_version = stock_version + 1 WHERE id = %s",
+                (stock_quantity, product_id)
+            )
+            stock = self._read_stock(cursor, [product_id])
+        self.low_stock.update(stock)
+    
+    _STOCK_INDEX_SELECT = "SELECT id, name, price, category_id, stock_quantity, stock_version FROM products"
+    
+    def _load_stock_index(self):
+        return self.fetch_all(self._STOCK_INDEX_SELECT)
+    
+    def _read_stock(self, cursor, product_ids):
+        """Read back the rows a stock write changed, for the low-stock index"""
+        rows = []
+        for chunk in _chunks(product_ids, self.STOCK_CHUNK_SIZE):
+            # Padded, so every basket size and stocktake tail shares one of a
+            # few prepared statements instead of crowding out the hot ones
+            chunk = _pad_to_bucket(chunk)
+            placeholders = ", ".join(["%s"] * len(chunk))
+            rows += self._fetch_prepared(cursor, f"{self._STOCK_INDEX_SELECT} WHERE id IN ({placeholders})", chunk)
+        return rows
+    
+    @staticmethod
+    def _record_stock_correction(cursor, product_id, stock_quantity, note):
+        """Append the difference an absolute stock write is about to make to the ledger"""
+        # Runs before the UPDATE, in the same transaction, so it sees the old stock
+        cursor.execute_prepared('''
+        INSERT INTO inventory_movements (product_id, quantity, reason, note)
+        SELECT id, %s - stock_quantity, 'correction', %s FROM products WHERE id = %s AND stock_quantity <> %s
+        ''', (stock_quantity, note, product_id, stock_quantity))
+    
+    def adjust_stock(self, product_id, delta, expected_version=None, note=None):
+        """Add delta (negative to remove) to a product's stock in the database.
+        
+        With expected_version the change is only made if the stock version is
+        still the one read earlier. The change is recorded in the movement
+        ledger with note. Returns the new (stock_quantity, stock_version).
+        """
+        return self._adjust_stock({product_id: (delta, expected_version)}, "adjustment", note,
+                                  read_back=product_id)
+    
+    def adjust_stock_batch(self, adjustments, reason="adjustment", note=None):
+        """Apply many stock adjustments in one statement, all or none.
+        
+        adjustments is a sequence of (product_id, delta, expected_version)
+        tuples, expected_version None to skip the version check; deltas for the
+        same product are added together. Raises StockConflictError naming every
+        adjustment that can't be applied. Returns the number of products changed.
+        """
+        merged = {}
+        for product_id, delta, expected_version in adjustments:
+            total, version = merged.get(product_id, (0, None))
+            merged[product_id] = (total + delta, version if version is not None else expected_version)
+        if not merged:
+            return 0
+        return self._adjust_stock(merged, reason, note)
+    
+    def _adjust_stock(self, adjustments, reason, note, read_back=None):
+        """Run the guarded delta UPDATE for {product_id: (delta, expected_version)} and log it"""
+        product_ids = sorted(adjustments)
+        
+        attempts = 0
+        while True:
+            try:
+                with self.transaction() as cursor:
+                    # Chunked to keep statements to a bounded number of parameters
+                    # (and shapes); still one transaction, so all or none
+                    updated = 0
+                    for chunk in _chunks(product_ids, self.STOCK_CHUNK_SIZE):
+                        deltas = [value for product_id in chunk for value in (product_id, adjustments[product_id][0])]
+                        versions = [value for product_id in chunk for value in (product_id, adjustments[product_id][1])]
+                        count = cursor.execute_prepared(
+                            _stock_adjustment(len(chunk)), deltas + chunk + deltas + versions
+                        ).rowcount
+                        if count != len(chunk):
+                            raise _StockConflict()
+                        updated += count
+                        cursor.execute_prepared(_movements_insert(len(chunk)), [
+                            value for product_id in chunk
+                            for value in (product_id, adjustments[product_id][0], reason, None, note)
+                        ])
+                    stock = self._read_stock(cursor, product_ids)
+            except _StockConflict:
+                pass
+            else:
+                self.low_stock.update(stock)
+                if read_back is None:
+                    return updated
+                row = next(row for row in stock if row['id'] == read_back)
+                return row['stock_quantity'], row['stock_version']
+            
+            # Rolled back; read the rows as they are now to say what failed
+            conflicts = self._stock_conflicts(adjustments)
+            attempts += 1
+            if conflicts or attempts > self.STOCK_CONFLICT_RETRIES:
+                raise StockConflictError(conflicts)
+    
+    def get_stocktake_variances(self, counts):
+        """Compare counted quantities {product_id: counted} with the stock on record.
+        
+        Returns a row per counted product, by product ID, with its system and
+        counted quantities, the variance in units and at the product's price,
+        and the stock_version read; status is 'unknown' for IDs that don't exist.
+        """
+        rows = {row['id']: row for row in self.read(lambda cursor: self._read_stock(cursor, sorted(counts)))}
+        variances = []
+        for product_id in sorted(counts):
+            counted = counts[product_id]
+            row = rows.get(product_id)
+            if row is None:
+                variances.append({
+                    'product_id': product_id, 'name': None, 'system_quantity': None, 'counted_quantity': counted,
+                    'variance': None, 'variance_value': None, 'stock_version': None, 'status': "unknown"
+                })
+                continue
+            variance = counted - row['stock_quantity']
+            variances.append({
+                'product_id': product_id, 'name': row['name'], 'system_quantity': row['stock_quantity'],
+                'counted_quantity': counted, 'variance': variance, 'variance_value': variance * row['price'],
+                'stock_version': row['stock_version'], 'status': "ok"
+            })
+        return variances
+    
+    def apply_stocktake(self, counts, note=None):
+        """Set the stock of every counted product to its count, all or none; returns the variances applied"""
+        attempts = 0
+        while True:
+            variances = self.get_stocktake_variances(counts)
+            # Applied as deltas checked against the versions just read, so a sale
+            # made after the diff was taken is never overwritten
+            adjustments = [
+                (row['product_id'], row['variance'], row['stock_version'])
+                for row in variances if row['status'] == "ok" and row['variance']
+            ]
+            try:
+                self.adjust_stock_batch(adjustments, reason="stocktake", note=note)
+                return variances
+            except StockConflictError:
+                # Stock moved since the diff was read; take it again
+                attempts += 1
+                if attempts > self.STOCK_CONFLICT_RETRIES:
+                    raise
+    
+    def _stock_conflicts(self, adjustments):
+        """Return {product_id: (reason, stock, version)} for adjustments that can't be applied now"""
+        rows = {row['id']: row for row in self.read(lambda cursor: self._read_stock(cursor, sorted(adjustments)))}
+        conflicts = {}
+        for product_id, (delta, expected_version) in adjustments.items():
+            row = rows.get(product_id)
+            if row is None:
+                conflicts[product_id] = ("missing", None, None)
+            elif expected_version is not None and row['stock_version'] != expected_version:
+                conflicts[product_id] = ("changed", row['stock_quantity'], row['stock_version'])
+            elif row['stock_quantity'] + delta < 0:
+                conflicts[product_id] = ("insufficient", row['stock_quantity'], row['stock_version'])
+        return conflicts
+    
+    _PRODUCT_SELECT = '''
+    SELECT p.id, p.name, p.description, p.price, p.stock_quantity, 
+           p.category_id, c.name as category_name, p.image_path, p.image_name
+    FROM products p
+    LEFT JOIN categories c ON p.category_id = c.id
+    '''
+    
+    _PRODUCT_BY_ID_QUERY = _PRODUCT_SELECT + "WHERE p.id = %s"
     
     def get_product(self, product_id):
         """Get a product by ID"""
-        self.connect()
-        self.cursor.execute('''
-        SELECT p.id, p.name, p.description, p.price, p.stock_quantity, 
-               p.category_id, c.name as category_name, p.image_path
-        FROM products p
-        LEFT JOIN categories c ON p.category_id = c.id
-        WHERE p.id = %s
-        ''', (product_id,))
-        product = self.cursor.fetchone()
-        self.disconnect()
-        return product
+        def read(cursor):
+            rows = self._fetch_prepared(cursor, self._PRODUCT_BY_ID_QUERY, (product_id,))
+            return rows[0] if rows else None
+        return self.read(read)
+    
+    @classmethod
+    def _all_products_query(cls, category_id=None):
+        query = Query(cls._PRODUCT_SELECT).order_by("p.name")
+        if category_id:
+            query.where("p.category_id = %s", category_id)
+        return query.compile()
     
     def get_all_products(self, category_id=None):
         """Get all products, optionally filtered by category"""
-        self.connect()
+        return self.fetch_prepared(*self._all_products_query(category_id))
+    
+    def iter_all_products(self, category_id=None, batch_size=1000):
+        """Stream all products, optionally filtered by category"""
+        return self.stream(*self._all_products_query(category_id), batch_size=batch_size)
+    
+    @classmethod
+    def _products_page_query(cls, category_id=None, search_term=None, after=None, limit=100):
+        query = Query(cls._PRODUCT_SELECT)
         if category_id:
-            self.cursor.execute('''
-            SELECT p.id, p.name, p.description, p.price, p.stock_quantity, 
-                   p.category_id, c.name as category_name, p.image_path
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
-            WHERE p.category_id = %s
-            ORDER BY p.name
-            ''', (category_id,))
+            query.where("p.category_id = %s", category_id)
+        if search_term:
+            query.where("p.name LIKE %s", f'%{search_term}%')
+        return cls._seek(query, ("p.name", "p.id"), after, limit)
+    
+    def get_products_page(self, category_id=None, search_term=None, after=None, limit=100):
+        """Get one page of products ordered by name, optionally filtered by category and name"""
+        return self.fetch_page(self._products_page_query(category_id, search_term, after, limit),
+                               ("name", "id"), limit)
+    
+    _STOCK_LEVEL_SELECT = '''
+    SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
+    FROM products p
+    LEFT JOIN categories c ON p.category_id = c.id
+    '''
+    
+    @classmethod
+    def _stock_levels_query(cls, category_id=None, search_term=None):
+        query = Query(cls._STOCK_LEVEL_SELECT).order_by("p.name")
+        if category_id:
+            query.where("p.category_id = %s", category_id)
+        if search_term:
+            query.where("p.name LIKE %s", f'%{search_term}%')
+        return query
+    
+    def get_stock_levels(self, category_id=None, search_term=None):
+        """Get every product's stock level ordered by name, optionally filtered by category and name"""
+        return self._stock_levels_query(category_id, search_term).fetch_all(self)
+    
+    @classmethod
+    def _inventory_report_query(cls, category_id=None, stock_status="All"):
+        query = Query(cls._STOCK_LEVEL_SELECT).order_by("p.name")
+        if category_id:
+            query.where("p.category_id = %s", category_id)
+        if stock_status == "In Stock":
+            query.where("p.stock_quantity > 0")
+        elif stock_status == "Out of Stock":
+            query.where("p.stock_quantity = 0")
+        return query
+    
+    def get_inventory_report(self, category_id=None, stock_status="All"):
+        """Get stock levels for the inventory report; stock_status is 'All', 'In Stock' or 'Out of Stock'"""
+        return self._inventory_report_query(category_id, stock_status).fetch_all(self, replica=True)
+    
+    # Stock ledger methods
+    def take_stock_snapshot(self):
+        """Copy every product's stock into a new snapshot; returns its ID"""
+        with self.transaction() as cursor:
+            cursor.execute("INSERT INTO stock_snapshots (last_movement_id) VALUES (0)")
+            snapshot_id = cursor.lastrowid
+            # Reading products inside the transaction waits for stock writers in
+            # flight, so the snapshot and the movement ID below agree
+            cursor.execute('''
+            INSERT INTO stock_snapshot_items (snapshot_id, product_id, stock_quantity)
+            SELECT %s, id, stock_quantity FROM products
+            ''', (snapshot_id,))
+            cursor.execute('''
+            UPDATE stock_snapshots
+            SET last_movement_id = (SELECT COALESCE(MAX(id), 0) FROM inventory_movements)
+            WHERE id = %s
+            ''', (snapshot_id,))
+        return snapshot_id
+    
+    def ensure_stock_snapshot(self, max_age=timedelta(days=1)):
+        """Take a snapshot unless the latest is younger than max_age; returns the new ID or None"""
+        latest = self.fetch_one("SELECT MAX(taken_at) AS taken_at FROM stock_snapshots")
+        taken_at = latest['taken_at'] if latest else None
+        if isinstance(taken_at, str):
+            taken_at = datetime.fromisoformat(taken_at)
+        if taken_at is not None and datetime.now() - taken_at < max_age:
+            return None
+        return self.take_stock_snapshot()
+    
+    def stock_as_of(self, when, product_id=None):
+        """Stock at the moment when, as {product_id: stock}, or one product's stock.
+        
+        Starts from whichever is nearer to when, the last snapshot before it or
+        the current stock, and replays only the movements in between.
+        """
+        snapshot = self.fetch_one('''
+        SELECT id, taken_at, last_movement_id FROM stock_snapshots
+        WHERE taken_at <= %s ORDER BY taken_at DESC, id DESC LIMIT 1
+        ''', (when,))
+        if snapshot is not None:
+            taken_at = snapshot['taken_at']
+            if isinstance(taken_at, str):
+                taken_at = datetime.fromisoformat(taken_at)
+            forward = when - taken_at < datetime.now() - when
+        else:
+            forward = False
+        
+        product_filter = "AND product_id = %s" if product_id is not None else ""
+        product_params = (product_id,) if product_id is not None else ()
+        if forward:
+            # Snapshot plus the movements logged after it, up to when
+            rows = self.fetch_all(f'''
+            SELECT product_id, SUM(quantity) AS stock_quantity FROM (
+                SELECT product_id, stock_quantity AS quantity FROM stock_snapshot_items
+                WHERE snapshot_id = %s {product_filter}
+                UNION ALL
+                SELECT product_id, quantity FROM inventory_movements
+                WHERE id > %s AND created_at <= %s {product_filter}
+            ) AS ledger
+            GROUP BY product_id
+            ''', (snapshot['id'], *product_params, snapshot['last_movement_id'], when, *product_params))
         else:
-            self.cursor.execute('''
-            SELECT p.id, p.name, p.description, p.price, p.stock_quantity, 
-                   p.category_id, c.name as category_name, p.image_path
+            # Current stock less the movements logged since when
+            rows = self.fetch_all(f'''
+            SELECT p.id AS product_id, p.stock_quantity - COALESCE(SUM(m.quantity), 0) AS stock_quantity
             FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
-            ORDER BY p.name
-            ''')
-        products = self.cursor.fetchall()
-        self.disconnect()
-        return products
+            LEFT JOIN inventory_movements m ON m.product_id = p.id AND m.created_at > %s
+            WHERE 1 = 1 {product_filter.replace("product_id", "p.id")}
+            GROUP BY p.id, p.stock_quantity
+            ''', (when, *product_params))
+        
+        stock = {row['product_id']: int(row['stock_quantity']) for row in rows}
+        if product_id is not None:
+            return stock.get(product_id, 0)
+        return stock
+    
+    def check_stock_ledger(self):
+        """Return products whose stock differs from the sum of their movements"""
+        return self.fetch_all('''
+        SELECT p.id, p.name, p.stock_quantity, COALESCE(SUM(m.quantity), 0) AS ledger_quantity
+        FROM products p
+        LEFT JOIN inventory_movements m ON m.product_id = p.id
+        GROUP BY p.id, p.name, p.stock_quantity
+        HAVING p.stock_quantity <> COALESCE(SUM(m.quantity), 0)
+        ORDER BY p.id
+        ''')
     
     # Category methods
+    def _load_categories(self):
+        rows = self.fetch_all('SELECT id, name, description FROM categories ORDER BY name')
+        return {
+            "rows": rows,
+            "ids": {row['name']: row['id'] for row in rows},
+            "names": {row['id']: row['name'] for row in rows}
+        }
+    
+    def _categories(self):
+        return self.reference_cache.get("categories", self._load_categories)
+    
     def get_all_categories(self):
-        """Get all product categories"""
-        self.connect()
-        self.cursor.execute('SELECT id, name, description FROM categories ORDER BY name')
-        categories = self.cursor.fetchall()
-        self.disconnect()
-        return categories
+        """Get all product categories (cached)"""
+        return list(self._categories()["rows"])
+    
+    def get_category_ids(self):
+        """Get a name -> id map of all categories, in name order (cached)"""
+        return dict(self._categories()["ids"])
+    
+    def get_category_id(self, name):
+        """Get the id of the category with the given name, or None (cached)"""
+        return self._categories()["ids"].get(name)
+    
+    def get_category_name(self, category_id):
+        """Get the name of the category with the given id, or None (cached)"""
+        return self._categories()["names"].get(category_id)
+    
+    def add_category(self, name, description=None):
+        """Add a new category"""
+        category_id = self.execute(
+            "INSERT INTO categories (name, description) VALUES (%s, %s)", (name, description)
+        )
+        self.reference_cache.invalidate("categories")
+        return category_id
+    
+    def update_category(self, category_id, name, description=None):
+        """Rename or re-describe a category"""
+        self.execute(
+            "UPDATE categories SET name = %s, description = %s WHERE id = %s",
+            (name, description, category_id)
+        )
+        self.reference_cache.invalidate("categories")
+    
+    def delete_category(self, category_id):
+        """Delete a category"""
+        self.execute("DELETE FROM categories WHERE id = %s", (category_id,))
+        self.reference_cache.invalidate("categories")
+    
+    def invalidate_reference_data(self, name=None):
+        """Forget cached reference data, e.g. after editing categories outside this Database"""
+        self.reference_cache.invalidate(name)
     
     # Customer methods
     def add_customer(self, name, email, phone, address):
         """Add a new customer"""
-        self.connect()
-        self.cursor.execute('''
+        return self.execute('''
         INSERT INTO customers (name, email, phone, address)
         VALUES (%s, %s, %s, %s)
         ''', (name, email, phone, address))
-        customer_id = self.cursor.lastrowid
-        self.conn.commit()
-        self.disconnect()
-        return customer_id
+    
+    @classmethod
+    def _customers_page_query(cls, search_term=None, after=None, limit=100):
+        query = Query("SELECT id, name, email, phone FROM customers")
+        if search_term:
+            pattern = f'%{search_term.lower()}%'
+            query.where_any(["LOWER(name) LIKE %s", "LOWER(email) LIKE %s", "LOWER(phone) LIKE %s"],
+                            pattern, pattern, pattern)
+        return cls._seek(query, ("name", "id"), after, limit)
+    
+    def get_customers_page(self, search_term=None, after=None, limit=100):
+        """Get one page of customers ordered by name, optionally filtered by name, email or phone"""
+        return self.fetch_page(self._customers_page_query(search_term, after, limit), ("name", "id"), limit)
+    
+    _CUSTOMER_ORDER_COUNT_QUERY = "SELECT COUNT(*) as count FROM orders WHERE customer_id = %s"
+    
+    def count_customer_orders(self, customer_id):
+        """Return how many orders a customer has placed"""
+        return self.fetch_one(self._CUSTOMER_ORDER_COUNT_QUERY, (customer_id,))['count']
     
     def get_all_customers(self):
         """Get all customers"""
-        self.connect()
-        self.cursor.execute('SELECT id, name, email, phone, address FROM customers ORDER BY name')
-        customers = self.cursor.fetchall()
-        self.disconnect()
-        return customers
+        return self.fetch_all('SELECT id, name, email, phone, address FROM customers ORDER BY name')
     
     # Order methods
-    def create_order(self, customer_id, total_amount, status='Pending'):
-        """Create a new order"""
-        self.connect()
-        self.cursor.execute('''
-        INSERT INTO orders (customer_id, total_amount, status)
-        VALUES (%s, %s, %s)
-        ''', (customer_id, total_amount, status))
-        order_id = self.cursor.lastrowid
-        self.conn.commit()
-        self.disconnect()
+    # Times an order or stock adjustment is retried when its guarded UPDATE
+    # skipped a row but nothing was wrong by the time the row was re-read
+    STOCK_CONFLICT_RETRIES = 3
+    # Products per statement in batch stock writes
+    STOCK_CHUNK_SIZE = 500
+    
+    def place_order(self, customer_id, items, status='Pending', client_ref=None, order_date=None,
+                    check_stock=True):
+        """Create an order with all its items and update stock in one transaction.
+        
+        items is a sequence of (product_id, quantity, price) tuples. Returns the new order ID.
+        If an order with the same client_ref already exists its ID is returned
+        instead, so a checkout can safely be retried.
+        
+        Stock is taken with one guarded UPDATE for all lines, which only
+        decrements products that still have enough; if any line falls short
+        nothing is written and InsufficientStockError names the lines. Row
+        locks are held only for this transaction. check_stock=False skips the
+        guard, for sales that already happened (journal replay).
+        """
+        if not items:
+            raise ValueError("An order needs at least one item")
+        
+        # Net quantity per product, in ID order so concurrent checkouts lock rows consistently
+        quantities = {}
+        for product_id, quantity, _ in items:
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        
+        attempts = 0
+        while True:
+            try:
+                return self._write_order(customer_id, items, status, client_ref, order_date, quantities,
+                                         check_stock)
+            except _StockConflict:
+                pass
+            
+            # Read current stock without locks to name the short lines; if another
+            # till has put stock back in the meantime, try the order again
+            shortages = self._stock_shortages(quantities)
+            attempts += 1
+            if shortages or attempts > self.STOCK_CONFLICT_RETRIES:
+                raise InsufficientStockError(shortages)
+    
+    def _write_order(self, customer_id, items, status, client_ref, order_date, quantities, check_stock):
+        total_amount = sum(quantity * price for _, quantity, price in items)
+        product_ids = sorted(quantities)
+        
+        # Every statement is prepared once per connection; the item INSERT and
+        # stock UPDATE have one shape per item count, so those are cached too
+        with self.transaction() as cursor:
+            if client_ref:
+                existing = self._fetch_prepared(cursor, "SELECT id FROM orders WHERE client_ref = %s",
+                                                (client_ref,))
+                if existing:
+                    return existing[0]['id']
+            
+            # Stock first, in one statement for every line, so a short order is
+            # rejected before anything else is written
+            pairs = [value for product_id in product_ids for value in (product_id, quantities[product_id])]
+            params = pairs + product_ids + (pairs if check_stock else [])
+            updated = cursor.execute_prepared(_stock_decrement(len(product_ids), check_stock), params).rowcount
+            if check_stock and updated != len(product_ids):
+                raise _StockConflict()
+            
+            if order_date is None:
+                # Stamped by the database's column default
+                prepared = cursor.execute_prepared('''
+                INSERT INTO orders (customer_id, total_amount, status, client_ref)
+                VALUES (%s, %s, %s, %s)
+                ''', (customer_id, total_amount, status, client_ref))
+            else:
+                prepared = cursor.execute_prepared('''
+                INSERT INTO orders (customer_id, total_amount, status, client_ref, order_date)
+                VALUES (%s, %s, %s, %s, %s)
+                ''', (customer_id, total_amount, status, client_ref, order_date))
+            order_id = prepared.lastrowid
+            
+            # A single multi-row INSERT
+            cursor.execute_prepared(
+                _order_items_insert(len(items)),
+                [value for product_id, quantity, price in items for value in (order_id, product_id, quantity, price)]
+            )
+            
+            # And one for the ledger, a movement per product
+            cursor.execute_prepared(_movements_insert(len(product_ids)), [
+                value for product_id in product_ids
+                for value in (product_id, -quantities[product_id], "sale", order_id, None)
+            ])
+            stock = self._read_stock(cursor, product_ids)
+        
+        # After the commit, so alerts only fire for sales that happened
+        self.low_stock.update(stock)
         return order_id
     
-    def add_order_item(self, order_id, product_id, quantity, price):
-        """Add an item to an order"""
-        self.connect()
-        self.cursor.execute('''
-        INSERT INTO order_items (order_id, product_id, quantity, price)
-        VALUES (%s, %s, %s, %s)
-        ''', (order_id, product_id, quantity, price))
-        self.conn.commit()
+    def _stock_shortages(self, quantities):
+        """Return {product_id: (requested, available)} for products without enough stock"""
+        product_ids = sorted(quantities)
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        stock = {
+            row['id']: row['stock_quantity']
+            for row in self.fetch_all(f"SELECT id, stock_quantity FROM products WHERE id IN ({placeholders})",
+                                      product_ids)
+        }
+        # A product that no longer exists has nothing available
+        return {
+            product_id: (quantity, stock.get(product_id, 0))
+            for product_id, quantity in quantities.items()
+            if stock.get(product_id, 0) < quantity
+        }
+    
+    def checkout(self, customer_id, items, status='Pending'):
+        """Place an order, journaling it for later replay if MySQL is unreachable.
         
-        # Update product stock
-        self.cursor.execute('''
-        UPDATE products
-        SET stock_quantity = stock_quantity - %s
-        WHERE id = %s
-        ''', (quantity, product_id))
-        self.conn.commit()
-        self.disconnect()
+        Returns the new order ID, or None when the order was journaled instead.
+        Errors other than connection failures are raised as usual.
+        """
+        client_ref = new_order_ref()
+        try:
+            return self.place_order(customer_id, items, status, client_ref=client_ref)
+        except Exception as e:
+            if self.journal is None or not is_unavailable_error(e):
+                raise
+        
+        # The first attempt may have committed before the connection dropped;
+        # replay finds it by client_ref rather than inserting it twice
+        self.journal.append_order(client_ref, customer_id, items, status, datetime.now())
+        self.replayer.wake()
+        return None
+    
+    def pending_journal_orders(self):
+        """Return checkouts still waiting in the offline journal"""
+        return self.journal.pending() if self.journal else []
+    
+    _ORDER_SELECT = '''
+    SELECT o.id, o.customer_id, c.name as customer_name, o.order_date, o.total_amount, o.status
+    FROM orders o
+    LEFT JOIN customers c ON o.customer_id = c.id
+    '''
+    
+    _ORDER_BY_ID_QUERY = _ORDER_SELECT + "WHERE o.id = %s"
+    
+    _ORDER_ITEMS_QUERY = '''
+    SELECT oi.id, oi.product_id, p.name as product_name, oi.quantity, oi.price
+    FROM order_items oi
+    LEFT JOIN products p ON oi.product_id = p.id
+    WHERE oi.order_id = %s
+    '''
     
     def get_order_details(self, order_id):
         """Get details of an order"""
-        self.connect()
-        self.cursor.execute('''
-        SELECT o.id, o.customer_id, c.name as customer_name, o.order_date, o.total_amount, o.status
-        FROM orders o
-        LEFT JOIN customers c ON o.customer_id = c.id
-        WHERE o.id = %s
-        ''', (order_id,))
-        order = self.cursor.fetchone()
-        
-        self.cursor.execute('''
-        SELECT oi.id, oi.product_id, p.name as product_name, oi.quantity, oi.price
-        FROM order_items oi
-        LEFT JOIN products p ON oi.product_id = p.id
-        WHERE oi.order_id = %s
-        ''', (order_id,))
-        order_items = self.cursor.fetchall()
-        
-        self.disconnect()
-        return order, order_items
+        with self.transaction() as cursor:
+            orders = self._fetch_prepared(cursor, self._ORDER_BY_ID_QUERY, (order_id,))
+            order_items = self._fetch_prepared(cursor, self._ORDER_ITEMS_QUERY, (order_id,))
+        
+        return (orders[0] if orders else None), order_items
+    
+    @classmethod
+    def _all_orders_query(cls, status=None):
+        query = Query(cls._ORDER_SELECT).order_by("o.order_date DESC")
+        if status:
+            query.where("o.status = %s", status)
+        return query.compile()
     
     def get_all_orders(self, status=None):
         """Get all orders, optionally filtered by status"""
-        self.connect()
+        return self.fetch_prepared(*self._all_orders_query(status))
+    
+    def iter_all_orders(self, status=None, batch_size=1000):
+        """Stream all orders, optionally filtered by status"""
+        return self.stream(*self._all_orders_query(status), batch_size=batch_size)
+    
+    @classmethod
+    def _orders_page_query(cls, status=None, after=None, limit=100):
+        query = Query(cls._ORDER_SELECT)
         if status:
-            self.cursor.execute('''
-            SELECT o.id, o.customer_id, c.name as customer_name, o.order_date, o.total_amount, o.status
-            FROM orders o
-            LEFT JOIN customers c ON o.customer_id = c.id
-            WHERE o.status = %s
-            ORDER BY o.order_date DESC
-            ''', (status,))
-        else:
-            self.cursor.execute('''
-            SELECT o.id, o.customer_id, c.name as customer_name, o.order_date, o.total_amount, o.status
-            FROM orders o
-            LEFT JOIN customers c ON o.customer_id = c.id
-            ORDER BY o.order_date DESC
-            ''')
-        orders = self.cursor.fetchall()
-        self.disconnect()
-        return orders
+            query.where("o.status = %s", status)
+        return cls._seek(query, ("o.order_date", "o.id"), after, limit, descending=True)
+    
+    def get_orders_page(self, status=None, after=None, limit=100):
+        """Get one page of orders, newest first, optionally filtered by status"""
+        return self.fetch_page(self._orders_page_query(status, after, limit), ("order_date", "id"), limit)
     
     def update_order_status(self, order_id, status):
         """Update the status of an order"""
-        self.connect()
-        self.cursor.execute('''
+        self.execute_prepared('''
         UPDATE orders
         SET status = %s
         WHERE id = %s
         ''', (status, order_id))
-        self.conn.commit()
-        self.disconnect()
     
     # Reporting methods
+    _SALES_REPORT_QUERY = '''
+    SELECT o.id, o.order_date, c.name as customer_name, o.total_amount, o.status
+    FROM orders o
+    LEFT JOIN customers c ON o.customer_id = c.id
+    WHERE o.order_date BETWEEN %s AND %s
+    ORDER BY o.order_date
+    '''
+    
+    _PRODUCT_SALES_REPORT_QUERY = '''
+    SELECT p.id, p.name, SUM(oi.quantity) as total_quantity, SUM(oi.quantity * oi.price) as total_sales
+    FROM order_items oi
+    JOIN products p ON oi.product_id = p.id
+    JOIN orders o ON oi.order_id = o.id
+    WHERE o.order_date BETWEEN %s AND %s
+    GROUP BY p.id, p.name
+    ORDER BY total_sales DESC
+    '''
+    
+    # Half-open date ranges (end_date excluded), so the order_date index is usable
+    _ORDERS_BETWEEN_QUERY = '''
+    SELECT o.id, o.order_date, o.total_amount, o.status, c.name as customer_name
+    FROM orders o
+    LEFT JOIN customers c ON o.customer_id = c.id
+    WHERE o.order_date >= %s AND o.order_date < %s
+    ORDER BY o.order_date DESC
+    '''
+    
+    _PRODUCT_REVENUE_QUERY = _product_revenue_query()
+    _PRODUCT_REVENUE_BY_CATEGORY_QUERY = _product_revenue_query("AND p.category_id = %s")
+    
     def get_sales_report(self, start_date, end_date):
         """Get sales report between two dates"""
-        self.connect()
-        self.cursor.execute('''
-        SELECT o.id, o.order_date, c.name as customer_name, o.total_amount, o.status
-        FROM orders o
-        LEFT JOIN customers c ON o.customer_id = c.id
-        WHERE o.order_date BETWEEN %s AND %s
-        ORDER BY o.order_date
-        ''', (start_date, end_date))
-        sales = self.cursor.fetchall()
-        self.disconnect()
-        return sales
+        return self.fetch_all(self._SALES_REPORT_QUERY, (start_date, end_date), replica=True)
+    
+    def iter_sales_report(self, start_date, end_date, batch_size=1000):
+        """Stream the sales report between two dates"""
+        return self.stream(self._SALES_REPORT_QUERY, (start_date, end_date), batch_size=batch_size,
+                           replica=True)
     
     def get_product_sales_report(self, start_date, end_date):
         """Get product sales report between two dates"""
-        self.connect()
-        self.cursor.execute('''
-        SELECT p.id, p.name, SUM(oi.quantity) as total_quantity, SUM(oi.quantity * oi.price) as total_sales
-        FROM order_items oi
-        JOIN products p ON oi.product_id = p.id
-        JOIN orders o ON oi.order_id = o.id
-        WHERE o.order_date BETWEEN %s AND %s
-        GROUP BY p.id, p.name
-        ORDER BY total_sales DESC
-        ''', (start_date, end_date))
-        product_sales = self.cursor.fetchall()
-        self.disconnect()
-        return product_sales
-    
-    def get_low_stock_products(self, threshold=10):
-        """Get products with stock below threshold"""
-        self.connect()
-        self.cursor.execute('''
-        SELECT id, name, stock_quantity
-        FROM products
-        WHERE stock_quantity < %s
-        ORDER BY stock_quantity
-        ''', (threshold,))
-        low_stock = self.cursor.fetchall()
-        self.disconnect()
-        return low_stock
+        return self.fetch_all(self._PRODUCT_SALES_REPORT_QUERY, (start_date, end_date), replica=True)
+    
+    def iter_product_sales_report(self, start_date, end_date, batch_size=1000):
+        """Stream the product sales report between two dates"""
+        return self.stream(self._PRODUCT_SALES_REPORT_QUERY, (start_date, end_date), batch_size=batch_size,
+                           replica=True)
+    
+    def get_orders_between(self, start_date, end_date):
+        """Get orders placed from start_date up to (not including) end_date, newest first"""
+        return self.fetch_all(self._ORDERS_BETWEEN_QUERY, (start_date, end_date), replica=True)
+    
+    def get_product_revenue(self, start_date, end_date, category_id=None):
+        """Get units sold and revenue per product in completed orders from start_date up to end_date"""
+        if category_id:
+            return self.fetch_all(self._PRODUCT_REVENUE_BY_CATEGORY_QUERY, (start_date, end_date, category_id),
+                                  replica=True)
+        return self.fetch_all(self._PRODUCT_REVENUE_QUERY, (start_date, end_date), replica=True)
+    
+    def get_low_stock_products(self, threshold=None, min_stock=None, category_id=None):
+        """Get products with stock at or below threshold (the low-stock setting by default), lowest first.
+        
+        Served from the low-stock index, so the cost is in the products
+        returned rather than the size of the catalogue.
+        """
+        if threshold is None:
+            threshold = self.low_stock.threshold
+        products = self.low_stock.in_range(min_stock, threshold)
+        if category_id:
+            products = [product for product in products if product['category_id'] == category_id]
+        for product in products:
+            product['category_name'] = self.get_category_name(product['category_id'])
+        products.sort(key=lambda product: (product['stock_quantity'], product['name']))
+        return products
+    
+    def get_stock_forecast(self):
+        """Per-product sales rates from the recent order history (cached), or None without NumPy"""
+        if not forecast.available():
+            return None
+        return self.forecast_cache.get("stock_forecast", lambda: forecast.load_forecast(self))
+    
+    def get_reorder_suggestions(self, threshold=None):
+        """Low-stock products plus any forecast to need reordering, soonest stock-out first.
+        
+        Each row adds days_left, reorder_point and suggested_quantity, which
+        are None when NumPy is not installed.
+        """
+        if threshold is None:
+            threshold = self.low_stock.threshold
+        stock_forecast = self.get_stock_forecast()
+        if stock_forecast is None:
+            products = self.get_low_stock_products(threshold)
+            for product in products:
+                product.update(days_left=None, reorder_point=None, suggested_quantity=None)
+            return products
+        
+        # Current stock of the whole catalogue from the low-stock index
+        products = self.low_stock.in_range()
+        projection = stock_forecast.project(
+            [product['id'] for product in products], [product['stock_quantity'] for product in products]
+        )
+        stock = forecast.np.array([product['stock_quantity'] for product in products])
+        selected = forecast.np.flatnonzero((stock <= threshold) | (projection["suggested_quantity"] > 0))
+        
+        suggestions = []
+        for i in selected:
+            product = products[i]
+            days_left = projection["days_left"][i]
+            product.update(
+                category_name=self.get_category_name(product['category_id']),
+                days_left=None if forecast.np.isinf(days_left) else float(days_left),
+                reorder_point=int(projection["reorder_point"][i]),
+                suggested_quantity=int(projection["suggested_quantity"][i])
+            )
+            suggestions.append(product)
+        suggestions.sort(key=lambda product: (product['days_left'] is None, product['days_left'] or 0,
+                                              product['stock_quantity'], product['name']))
+        return suggestions
+    
+    # Async variants: same arguments, run on a worker thread, return a Future
+    def fetch_all_async(self, query, params=None, replica=False):
+        return self.submit(self.fetch_all, query, params, replica)
+    
+    def fetch_prepared_async(self, query, params=(), replica=False):
+        return self.submit(self.fetch_prepared, query, params, replica)
+    
+    def fetch_records_async(self, query, params=None, replica=False):
+        return self.submit(self.fetch_records, query, params, replica)
+    
+    def fetch_one_async(self, query, params=None, replica=False):
+        return self.submit(self.fetch_one, query, params, replica)
+    
+    def execute_async(self, query, params=None):
+        return self.submit(self.execute, query, params)
+    
+    def export_csv_async(self, path, query, params=None, headers=None, batch_size=1000, replica=False):
+        return self.submit(self.export_csv, path, query, params, headers, batch_size, replica)
+    
+    def import_image_async(self, source):
+        return self.submit(self.import_image, source)
+    
+    def add_product_async(self, *args, **kwargs):
+        return self.submit(self.add_product, *args, **kwargs)
+    
+    def update_product_async(self, *args, **kwargs):
+        return self.submit(self.update_product, *args, **kwargs)
+    
+    def delete_product_async(self, product_id):
+        return self.submit(self.delete_product, product_id)
+    
+    def update_stock_async(self, product_id, stock_quantity, note=None):
+        return self.submit(self.update_stock, product_id, stock_quantity, note)
+    
+    def adjust_stock_async(self, product_id, delta, expected_version=None, note=None):
+        return self.submit(self.adjust_stock, product_id, delta, expected_version, note)
+    
+    def adjust_stock_batch_async(self, adjustments, reason="adjustment", note=None):
+        return self.submit(self.adjust_stock_batch, adjustments, reason, note)
+    
+    def stock_as_of_async(self, when, product_id=None):
+        return self.submit(self.stock_as_of, when, product_id)
+    
+    def get_product_async(self, product_id):
+        return self.submit(self.get_product, product_id)
+    
+    def get_all_products_async(self, category_id=None):
+        return self.submit(self.get_all_products, category_id)
+    
+    def get_products_page_async(self, category_id=None, search_term=None, after=None, limit=100):
+        return self.submit(self.get_products_page, category_id, search_term, after, limit)
+    
+    def apply_stocktake_async(self, counts, note=None):
+        return self.submit(self.apply_stocktake, counts, note)
+    
+    def get_stock_levels_async(self, category_id=None, search_term=None):
+        return self.submit(self.get_stock_levels, category_id, search_term)
+    
+    def get_all_categories_async(self):
+        return self.submit(self.get_all_categories)
+    
+    def get_category_ids_async(self):
+        return self.submit(self.get_category_ids)
+    
+    def add_customer_async(self, name, email, phone, address):
+        return self.submit(self.add_customer, name, email, phone, address)
+    
+    def get_customers_page_async(self, search_term=None, after=None, limit=100):
+        return self.submit(self.get_customers_page, search_term, after, limit)
+    
+    def get_all_customers_async(self):
+        return self.submit(self.get_all_customers)
+    
+    def place_order_async(self, customer_id, items, status='Pending'):
+        return self.submit(self.place_order, customer_id, items, status)
+    
+    def checkout_async(self, customer_id, items, status='Pending'):
+        return self.submit(self.checkout, customer_id, items, status)
+    
+    def get_order_details_async(self, order_id):
+        return self.submit(self.get_order_details, order_id)
+    
+    def get_all_orders_async(self, status=None):
+        return self.submit(self.get_all_orders, status)
+    
+    def get_orders_page_async(self, status=None, after=None, limit=100):
+        return self.submit(self.get_orders_page, status, after, limit)
+    
+    def update_order_status_async(self, order_id, status):
+        return self.submit(self.update_order_status, order_id, status)
+    
+    def get_inventory_report_async(self, category_id=None, stock_status="All"):
+        return self.submit(self.get_inventory_report, category_id, stock_status)
+    
+    def count_customer_orders_async(self, customer_id):
+        return self.submit(self.count_customer_orders, customer_id)
+    
+    def get_orders_between_async(self, start_date, end_date):
+        return self.submit(self.get_orders_between, start_date, end_date)
+    
+    def get_product_revenue_async(self, start_date, end_date, category_id=None):
+        return self.submit(self.get_product_revenue, start_date, end_date, category_id)
+    
+    def get_sales_report_async(self, start_date, end_date):
+        return self.submit(self.get_sales_report, start_date, end_date)
+    
+    def get_product_sales_report_async(self, start_date, end_date):
+        return self.submit(self.get_product_sales_report, start_date, end_date)
+    
+    def get_low_stock_products_async(self, threshold=None, min_stock=None, category_id=None):
+        return self.submit(self.get_low_stock_products, threshold, min_stock, category_id)
+    
+    def get_reorder_suggestions_async(self, threshold=None):
+        return self.submit(self.get_reorder_suggestions, threshold)
@@ -0,0 +1,292 @@
+"""Fill the database with a reproducible synthetic shop.
+
+Run with ``python -m src.datagen [--products N] [--customers N]
+[--order-lines N] [--days N] [--seed N]`` plus the database options
+(``--backend sqlite --sqlite-path shop.db``, or ``--backend mysql
+--database NAME``). The schema comes from the normal migrations, and rows
+are appended after any already there, so the generator can be pointed at an
+empty benchmark database or run again to grow one.
+
+The distributions are chosen to look like a real shop rather than uniform
+noise:
+
+- products are spread unevenly over categories, with log-normal prices;
+- product and customer popularity follow Zipf-like power laws, so a few
+  bestsellers and regulars account for much of the traffic;
+- basket sizes are geometric (most orders have one to three lines);
+- order dates cover the last --days days with a growth trend, busier
+  weekends and a daytime peak; 90% of orders are Completed.
+
+The same seed and scale always produce the same rows.
+"""
+import argparse
+import itertools
+import math
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from src.database import Database
+
+BATCH_SIZE = 5000
+
+# Share of the product range in each default category
+CATEGORY_WEIGHTS = {
+    "Skincare": 0.30,
+    "Makeup": 0.30,
+    "Haircare": 0.15,
+    "Fragrances": 0.10,
+    "Bath & Body": 0.15,
+}
+
+PRODUCT_TYPES = {
+    "Skincare": ["Cleanser", "Toner", "Serum", "Moisturiser", "Eye Cream", "Face Mask", "Sunscreen SPF 50"],
+    "Makeup": ["Foundation", "Concealer", "Mascara", "Lipstick", "Eyeliner", "Blush", "Eyeshadow Palette"],
+    "Haircare": ["Shampoo", "Conditioner", "Hair Oil", "Styling Gel", "Hair Mask", "Dry Shampoo"],
+    "Fragrances": ["Eau de Parfum", "Eau de Toilette", "Body Mist", "Cologne"],
+    "Bath & Body": ["Body Lotion", "Shower Gel", "Bath Salts", "Body Scrub", "Hand Cream"],
+}
+
+BRANDS = ["Lumiere", "Velvet Rose", "Aura", "Nordic Glow", "Pure Botanics", "Maison Iris",
+          "Silk & Stone", "Oceanic", "Golden Hour", "Bloom Lab", "Terra", "Opaline"]
+
+VARIANTS = ["Classic", "Hydrating", "Matte", "Radiance", "Sensitive", "Night", "Travel Size",
+            "Vitamin C", "Rose", "Charcoal", "Aloe", "Intense"]
+
+FIRST_NAMES = ["Olivia", "Emma", "Amelia", "Ava", "Sophia", "Mia", "Isla", "Grace", "Noah", "Liam",
+               "Oliver", "Lucas", "Aisha", "Priya", "Yuki", "Chen", "Fatima", "Mateo", "Elena", "Zara"]
+
+LAST_NAMES = ["Smith", "Jones", "Taylor", "Brown", "Williams", "Wilson", "Patel", "Khan", "Nguyen",
+              "Garcia", "Martin", "Rossi", "Kim", "Müller", "Silva", "Cohen", "Novak", "Okafor"]
+
+STREETS = ["High Street", "Station Road", "Church Lane", "Park Avenue", "Mill Road", "King Street"]
+
+STATUSES = ["Completed", "Pending", "Cancelled"]
+STATUS_WEIGHTS = [0.90, 0.06, 0.04]
+
+# Relative order volume by weekday (Monday first) and by hour of the day
+WEEKDAY_WEIGHTS = [0.85, 0.85, 0.9, 0.95, 1.15, 1.4, 1.1]
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 0, 0.2, 0.5, 0.9, 1.1, 1.2,
+                1.4, 1.3, 1.1, 1.0, 1.1, 1.3, 1.2, 0.9, 0.6, 0.3, 0.1, 0]
+
+MEAN_BASKET_SIZE = 2.4
+MAX_BASKET_SIZE = 20
+
+
+def zipf_cum_weights(count, exponent, rng):
+    """Cumulative Zipf weights for count items, with the ranks shuffled over the items"""
+    weights = [1 / (rank ** exponent) for rank in range(1, count + 1)]
+    rng.shuffle(weights)
+    return list(itertools.accumulate(weights))
+
+
+def basket_size(rng):
+    """Geometric number of lines with mean MEAN_BASKET_SIZE, capped at MAX_BASKET_SIZE"""
+    p = 1 / MEAN_BASKET_SIZE
+    size = 1 + int(math.log(1 - rng.random()) / math.log(1 - p))
+    return min(size, MAX_BASKET_SIZE)
+
+
+def next_id(db, table):
+    row = db.fetch_one(f"SELECT MAX(id) AS max_id FROM {table}")
+    return (row['max_id'] or 0) + 1
+
+
+def insert_batches(db, sql, rows):
+    """Insert rows (any iterable) BATCH_SIZE at a time, one transaction per batch"""
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = list(itertools.islice(rows, BATCH_SIZE))
+        if not batch:
+            return total
+        with db.transaction(dictionary=False) as cursor:
+            cursor.executemany(sql, batch)
+        total += len(batch)
+
+
+def generate_products(db, count, rng):
+    """Insert count products; returns [(id, price)]"""
+    category_ids = db.get_category_ids()
+    names = [name for name in CATEGORY_WEIGHTS if name in category_ids]
+    weights = [CATEGORY_WEIGHTS[name] for name in names]
+    first_id = next_id(db, "products")
+
+    products = []
+    rows = []
+    for product_id in range(first_id, first_id + count):
+        category = rng.choices(names, weights)[0]
+        product_type = rng.choice(PRODUCT_TYPES[category])
+        name = f"{rng.choice(BRANDS)} {rng.choice(VARIANTS)} {product_type}"
+        # Median price around 18, with a long tail of premium products
+        price = Decimal(min(max(rng.lognormvariate(math.log(18), 0.6), 1.5), 500)).quantize(Decimal("0.01"))
+        stock = int(rng.expovariate(1 / 60))
+        rows.append((product_id, name, f"{name} from the {category.lower()} range", price, stock,
+                     category_ids[category]))
+        products.append((product_id, price))
+
+    insert_batches(db, '''
+    INSERT INTO products (id, name, description, price, stock_quantity, category_id)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ''', rows)
+    # Open the stock ledger with the starting stock, as add_product does
+    db.execute('''
+    INSERT INTO inventory_movements (product_id, quantity, reason)
+    SELECT id, stock_quantity, 'opening' FROM products WHERE id >= %s AND stock_quantity <> 0
+    ''', (first_id,))
+    return products
+
+
+def generate_customers(db, count, rng):
+    """Insert count customers; returns their IDs"""
+    first_id = next_id(db, "customers")
+
+    def rows():
+        for customer_id in range(first_id, first_id + count):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            # A fifth of customers never gave an email address
+            email = f"{first.lower()}.{last.lower()}{customer_id}@example.com" if rng.random() < 0.8 else None
+            phone = f"07{rng.randrange(10 ** 9):09d}"
+            address = f"{rng.randrange(1, 200)} {rng.choice(STREETS)}"
+            yield customer_id, f"{first} {last}", email, phone, address
+
+    insert_batches(db, '''
+    INSERT INTO customers (id, name, email, phone, address)
+    VALUES (%s, %s, %s, %s, %s)
+    ''', rows())
+    return list(range(first_id, first_id + count))
+
+
+def order_dates(order_count, days, rng):
+    """Yield order_count timestamps in ascending order over the days days before today"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=days)
+    # Volume grows by about half over the period
+    day_weights = [
+        (1 + 0.5 * day / max(days - 1, 1)) * WEEKDAY_WEIGHTS[(start + timedelta(days=day)).weekday()]
+        for day in range(days)
+    ]
+    scale = order_count / sum(day_weights)
+    hours = range(24)
+
+    carry = 0.0
+    for day, weight in enumerate(day_weights):
+        carry += weight * scale
+        count = int(carry)
+        carry -= count
+        day_start = start + timedelta(days=day)
+        seconds = sorted(
+            hour * 3600 + rng.randrange(3600) for hour in rng.choices(hours, HOUR_WEIGHTS, k=count)
+        )
+        for offset in seconds:
+            yield day_start + timedelta(seconds=offset)
+
+
+def generate_orders(db, order_lines, days, products, customer_ids, rng):
+    """Insert orders until order_lines order items exist; returns (orders, lines)"""
+    product_cum_weights = zipf_cum_weights(len(products), 1.0, rng)
+    customer_cum_weights = zipf_cum_weights(len(customer_ids), 0.6, rng)
+    order_id = next_id(db, "orders")
+    item_id = next_id(db, "order_items")
+
+    # A few more orders than needed on average, so the date range is filled
+    # even when the baskets come out small; generation stops at order_lines
+    expected_orders = int(order_lines / MEAN_BASKET_SIZE * 1.05) + 1
+    dates = order_dates(expected_orders, days, rng)
+
+    orders = lines = 0
+    while lines < order_lines:
+        order_batch = []
+        item_batch = []
+        for order_date in itertools.islice(dates, BATCH_SIZE):
+            size = min(basket_size(rng), order_lines - lines)
+            basket = rng.choices(products, cum_weights=product_cum_weights, k=size)
+            total = Decimal(0)
+            for product_id, price in basket:
+                quantity = 1 if rng.random() < 0.85 else rng.randint(2, 4)
+                total += quantity * price
+                item_batch.append((item_id, order_id, product_id, quantity, price))
+                item_id += 1
+            customer_id = rng.choices(customer_ids, cum_weights=customer_cum_weights)[0]
+            status = rng.choices(STATUSES, STATUS_WEIGHTS)[0]
+            order_batch.append((order_id, customer_id, order_date, total, status))
+            order_id += 1
+            lines += size
+            if lines >= order_lines:
+                break
+        if not order_batch:
+            break
+
+        with db.transaction(dictionary=False) as cursor:
+            cursor.executemany('''
+            INSERT INTO orders (id, customer_id, order_date, total_amount, status)
+            VALUES (%s, %s, %s, %s, %s)
+            ''', order_batch)
+        insert_batches(db, '''
+        INSERT INTO order_items (id, order_id, product_id, quantity, price)
+        VALUES (%s, %s, %s, %s, %s)
+        ''', item_batch)
+        orders += len(order_batch)
+
+    return orders, lines
+
+
+def generate(db, products=50000, customers=500000, order_lines=10000000, days=365, seed=42, log=None):
+    """Fill db at the given scale; returns a dict of row counts per table"""
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+
+    started = time.perf_counter()
+    product_rows = generate_products(db, products, rng)
+    log(f"{products} products in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    customer_ids = generate_customers(db, customers, rng)
+    log(f"{customers} customers in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    orders, lines = generate_orders(db, order_lines, days, product_rows, customer_ids, rng)
+    log(f"{orders} orders with {lines} lines in {time.perf_counter() - started:.1f}s")
+
+    return {"products": products, "customers": customers, "orders": orders, "order_items": lines}
+
+
+def add_database_arguments(parser):
+    parser.add_argument("--backend", choices=["sqlite", "mysql"], default="sqlite")
+    parser.add_argument("--sqlite-path", default="cosmetic_shop_bench.db", help="database file for --backend sqlite")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="")
+    parser.add_argument("--database", default="cosmetic_shop_bench", help="MySQL database for --backend mysql")
+
+
+def open_database(args, **kwargs):
+    return Database(args.host, args.user, args.password, args.database,
+                    backend=args.backend, sqlite_path=args.sqlite_path, **kwargs)
+
+
+def add_scale_arguments(parser):
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--customers", type=int, default=500000)
+    parser.add_argument("--order-lines", type=int, default=10000000)
+    parser.add_argument("--days", type=int, default=365, help="spread orders over this many days")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fill a database with synthetic shop data")
+    add_database_arguments(parser)
+    add_scale_arguments(parser)
+    args = parser.parse_args(argv)
+
+    db = open_database(args)
+    try:
+        generate(db, args.products, args.customers, args.order_lines, args.days, args.seed, log=print)
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Sales velocity, stock-out and reorder forecasts for the whole catalogue.
+
+Daily unit sales per product over the last HISTORY_DAYS days are read in one
+grouped query and laid out as a products x days NumPy matrix, so the moving
+averages and the projections below are a handful of vectorised operations
+whatever the size of the catalogue:
+
+- velocity: the mean of the short (last SHORT_WINDOW days) and long (the
+  whole history) moving averages of daily sales, so a product picking up
+  is noticed within a week without one busy day swinging the forecast;
+- reorder point: expected sales over the supplier lead time plus a safety
+  stock of service_z standard deviations of daily sales over that time;
+- days until stock-out: stock divided by velocity;
+- suggested quantity: for products at or below their reorder point, enough
+  to get back to the reorder point plus cover_days of sales.
+
+NumPy is optional; without it available() is False and the Inventory
+low-stock tab lists products by threshold alone.
+"""
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:  # Forecasts are optional; the low-stock list works without them
+    np = None
+
+HISTORY_DAYS = 56
+SHORT_WINDOW = 7
+LEAD_TIME_DAYS = 7
+COVER_DAYS = 14
+SERVICE_Z = 1.65
+
+
+def available():
+    return np is not None
+
+
+def _as_date(value):
+    # DATE() comes back as a date from MySQL and as 'YYYY-MM-DD' text from SQLite
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class StockForecast:
+    """Per-product sales rates, as arrays aligned on the sorted product_ids"""
+
+    def __init__(self, product_ids, daily_sales, short_window=SHORT_WINDOW):
+        self.product_ids = product_ids
+        self.history_days = daily_sales.shape[1]
+        self.ma_long = daily_sales.mean(axis=1)
+        self.ma_short = daily_sales[:, -short_window:].mean(axis=1)
+        self.velocity = (self.ma_short + self.ma_long) / 2
+        self.deviation = daily_sales.std(axis=1)
+
+    def project(self, product_ids, stock, lead_time_days=LEAD_TIME_DAYS, cover_days=COVER_DAYS,
+                service_z=SERVICE_Z):
+        """Forecast for the given products and their current stock; returns a dict of arrays"""
+        product_ids = np.asarray(product_ids, dtype=np.int64)
+        stock = np.asarray(stock, dtype=np.float64)
+
+        # Products with no sales history (new, or not in the catalogue when
+        # the forecast was loaded) get a velocity of zero
+        velocity = np.zeros(len(product_ids))
+        deviation = np.zeros(len(product_ids))
+        if len(self.product_ids):
+            index = np.minimum(np.searchsorted(self.product_ids, product_ids), len(self.product_ids) - 1)
+            known = self.product_ids[index] == product_ids
+            velocity[known] = self.velocity[index[known]]
+            deviation[known] = self.deviation[index[known]]
+
+        reorder_point = np.ceil(velocity * lead_time_days + service_z * deviation * np.sqrt(lead_time_days))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            days_left = np.where(velocity > 0, stock / velocity, np.inf)
+        target = np.ceil(reorder_point + velocity * cover_days)
+        suggested = np.where(stock <= reorder_point, np.maximum(target - stock, 0), 0)
+        return {
+            "velocity": velocity,
+            "days_left": days_left,
+            "reorder_point": reorder_point.astype(np.int64),
+            "suggested_quantity": suggested.astype(np.int64),
+        }
+
+
+def load_forecast(db, history_days=HISTORY_DAYS, short_window=SHORT_WINDOW, today=None):
+    """Read daily sales for every product and return a StockForecast"""
+    today = today or date.today()
+    start = today - timedelta(days=history_days - 1)
+
+    def read(cursor):
+        # Tuple rows: the columns are pulled apart below, no per-row dictionaries
+        cursor.execute("SELECT id FROM products ORDER BY id")
+        products = cursor.fetchall()
+        cursor.execute('''
+        SELECT oi.product_id, DATE(o.order_date) AS day, SUM(oi.quantity) AS quantity
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id
+        WHERE o.order_date >= %s AND o.order_date < %s AND o.status <> 'Cancelled'
+        GROUP BY oi.product_id, DATE(o.order_date)
+        ''', (start, today + timedelta(days=1)))
+        return products, cursor.fetchall()
+
+    products, sales = db.read(read, replica=True, dictionary=False)
+    product_ids = np.fromiter((row[0] for row in products), dtype=np.int64, count=len(products))
+
+    daily_sales = np.zeros(len(product_ids) * history_days, dtype=np.float64)
+    if sales and len(product_ids):
+        sale_products, days, quantities = zip(*sales)
+        day_index = {day: (_as_date(day) - start).days for day in set(days)}
+        sale_products = np.fromiter(sale_products, dtype=np.int64, count=len(sales))
+        days = np.fromiter((day_index[day] for day in days), dtype=np.int64, count=len(sales))
+        quantities = np.fromiter(quantities, dtype=np.float64, count=len(sales))
+
+        # Drop sales of products deleted since
+        rows = np.minimum(np.searchsorted(product_ids, sale_products), len(product_ids) - 1)
+        keep = (product_ids[rows] == sale_products) & (days >= 0) & (days < history_days)
+        daily_sales = np.bincount(rows[keep] * history_days + days[keep], weights=quantities[keep],
+                                  minlength=len(product_ids) * history_days)
+
+    return StockForecast(product_ids, daily_sales.reshape(len(product_ids), history_days), short_window)
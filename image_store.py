@@ -0,0 +1,152 @@
+"""Content-addressed store for product images.
+
+Every image is kept once per distinct content, under images/store, named by
+the SHA-256 of its bytes: importing the same vendor photo for 200 shade
+variants stores one file that 200 products point at. The image_blobs table
+records each stored file with the number of products using it; Database
+keeps those counts in step with products.image_path and purges files no
+product has used for a while.
+
+Files are written under a temporary name and renamed into place, so a
+stored path always holds the whole image. A stored file never changes, so
+its name is its hash: the thumbnail cache reads the digest from the name
+instead of hashing the file again.
+"""
+import hashlib
+import os
+import shutil
+import threading
+
+# Where browse_image used to copy every chosen file, renaming on collisions
+LEGACY_DIRECTORY = os.path.join("images", "product_images")
+# Default store directory, relative to the working directory Database is created in
+STORE_DIRECTORY = os.path.join("images", "store")
+
+_HEX = frozenset("0123456789abcdef")
+
+
+def file_digest(path):
+    """Return (SHA-256 hex digest, size in bytes) of a file"""
+    sha = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+            size += len(block)
+    return sha.hexdigest(), size
+
+
+def stored_digest(path):
+    """The digest a store file is named by (<digest[:2]>/<digest>.<ext>), or None for other paths"""
+    folder, name = os.path.split(path)
+    digest = os.path.splitext(name)[0]
+    if len(digest) == 64 and os.path.basename(folder) == digest[:2] and _HEX.issuperset(digest):
+        return digest
+    return None
+
+
+def write_atomically(path, write):
+    """Create path by calling write(tmp_path) and renaming the result into place.
+
+    A reader never sees half a file, and concurrent writers of the same
+    content (each on its own temporary name) just replace one another.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class ImageStore:
+    """Image files named by the SHA-256 of their content"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def find(self, digest):
+        """Return the stored path for digest, or None"""
+        folder = os.path.join(self.directory, digest[:2])
+        if not os.path.isdir(folder):
+            return None
+        for name in os.listdir(folder):
+            if name.startswith(digest) and not name.endswith(".tmp"):
+                return os.path.join(folder, name)
+        return None
+
+    def add(self, source):
+        """Store a copy of source unless its content is already stored; returns (digest, path, size)"""
+        digest, size = file_digest(source)
+        path = self.find(digest)
+        if path is None:
+            extension = os.path.splitext(source)[1].lower()
+            path = os.path.join(self.directory, digest[:2], digest + extension)
+            write_atomically(path, lambda tmp_path: shutil.copyfile(source, tmp_path))
+        return digest, path, size
+
+    def remove(self, path):
+        """Delete a stored file, if it is one of ours"""
+        if self.owns(path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def owns(self, path):
+        return _inside(path, self.directory)
+
+
+def _inside(path, directory):
+    path = os.path.abspath(path)
+    directory = os.path.abspath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+
+def dedupe_product_images(db, store=None):
+    """Move every product's image into the store, once per distinct content.
+
+    Data step of migration 6. Products are repointed at the stored copy,
+    keeping the old file name as image_name for display, the reference
+    counts are rebuilt from products, and only then are the old copies in
+    images/product_images deleted; files elsewhere are left alone.
+    Safe to run again after an interruption. Returns (images, distinct files).
+    """
+    store = store or db.images
+    legacy_directory = os.path.join(os.getcwd(), LEGACY_DIRECTORY)
+    rows = db.fetch_all('''
+    SELECT DISTINCT image_path FROM products WHERE image_path IS NOT NULL AND image_path <> ''
+    ''')
+
+    blobs = {}
+    moved = {}
+    for row in rows:
+        path = row['image_path']
+        if not os.path.isfile(path):
+            # A missing file keeps its path; the product shows no image as before
+            continue
+        digest, blob_path, size = store.add(path)
+        blobs[digest] = (blob_path, size)
+        if blob_path != path:
+            moved[path] = blob_path
+
+    with db.transaction() as cursor:
+        for digest, (blob_path, size) in blobs.items():
+            cursor.execute(f'''
+            {db.backend.insert_ignore} INTO image_blobs (digest, path, size_bytes)
+            VALUES (%s, %s, %s)
+            ''', (digest, blob_path, size))
+        if moved:
+            cursor.executemany('''
+            UPDATE products SET image_path = %s, image_name = COALESCE(image_name, %s) WHERE image_path = %s
+            ''', [(new_path, os.path.basename(old_path), old_path) for old_path, new_path in moved.items()])
+        cursor.execute('''
+        UPDATE image_blobs
+        SET ref_count = (SELECT COUNT(*) FROM products WHERE products.image_path = image_blobs.path)
+        ''')
+
+    for old_path in moved:
+        if _inside(old_path, legacy_directory):
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    return len(rows), len(blobs)
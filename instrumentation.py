@@ -0,0 +1,264 @@
+import logging
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Histogram bucket upper bounds in milliseconds; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Modules whose frames are skipped when working out which screen issued a query:
+# the whole data layer, so a new module under it belongs in this list too
+_INTERNAL_MODULES = {
+    __name__, "src.database", "src.connection_pool", "src.backends", "src.reference_cache",
+    "src.query_builder", "src.prepared_statements", "src.replica", "src.migrations", "src.order_journal",
+    "src.low_stock", "src.forecast", "src.stocktake", "src.image_store", "contextlib",
+}
+
+slow_query_logger = logging.getLogger("src.slow_queries")
+
+# Statements that never change data; anything else marks the cursor as having written
+_READ_STATEMENT = re.compile(r"\s*(SELECT|SHOW|EXPLAIN|DESCRIBE|WITH)\b", re.IGNORECASE)
+
+
+def normalize_sql(sql):
+    """Collapse whitespace so the same statement always maps to the same key"""
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def _bucket_labels():
+    labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS]
+    labels.append(f">{LATENCY_BUCKETS_MS[-1]}ms")
+    return labels
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with count, total and max"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        ms = seconds * 1000
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """Approximate percentile in ms (upper bound of the bucket it falls in)"""
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                if i < len(LATENCY_BUCKETS_MS):
+                    return float(LATENCY_BUCKETS_MS[i])
+                break
+        return self.max * 1000
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "avg_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+            "buckets": dict(zip(_bucket_labels(), self.buckets))
+        }
+
+
+class StatementStats:
+    """Latency and row counts for one normalized statement"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.rows = 0
+        self.sources = {}
+
+    def to_dict(self):
+        data = self.latency.to_dict()
+        data["rows"] = self.rows
+        data["sources"] = dict(self.sources)
+        return data
+
+
+class Instrumentation:
+    """Collects query latency, row counts and connection-acquire times for a Database"""
+
+    def __init__(self, slow_query_threshold=0.5, slow_query_log=None, enabled=True):
+        self.slow_query_threshold = slow_query_threshold
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+        if slow_query_log and not any(
+            getattr(handler, "baseFilename", None) == slow_query_log
+            for handler in slow_query_logger.handlers
+        ):
+            handler = logging.FileHandler(slow_query_log)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            slow_query_logger.addHandler(handler)
+            slow_query_logger.setLevel(logging.WARNING)
+
+    def reset(self):
+        """Clear all collected statistics"""
+        with self._lock:
+            self._statements = {}
+            self._sources = {}
+            self._acquire = LatencyHistogram()
+            self._started_at = datetime.now()
+
+    @contextmanager
+    def source(self, name):
+        """Attribute queries run in this block (on this thread) to name"""
+        previous = getattr(self._local, "source", None)
+        self._local.source = name
+        try:
+            yield
+        finally:
+            self._local.source = previous
+
+    def calling_screen(self):
+        """Return the source queries from the current call site are attributed to"""
+        return getattr(self._local, "source", None) or _calling_screen()
+
+    def record_acquire(self, seconds):
+        """Record how long it took to check a connection out of the pool"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._acquire.add(seconds)
+
+    def record_query(self, sql, seconds, rows, source=None):
+        """Record one executed statement"""
+        if not self.enabled:
+            return
+
+        key = normalize_sql(sql)
+        source = source or self.calling_screen()
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = StatementStats()
+            stats.latency.add(seconds)
+            if rows and rows > 0:
+                stats.rows += rows
+            stats.sources[source] = stats.sources.get(source, 0) + 1
+
+            source_stats = self._sources.get(source)
+            if source_stats is None:
+                source_stats = self._sources[source] = LatencyHistogram()
+            source_stats.add(seconds)
+
+        if self.slow_query_threshold is not None and seconds >= self.slow_query_threshold:
+            slow_query_logger.warning(
+                "%.1fms rows=%s source=%s sql=%s", seconds * 1000, rows, source, key
+            )
+
+    def snapshot(self):
+        """Return all statistics as plain dictionaries, busiest first"""
+        with self._lock:
+            statements = sorted(
+                self._statements.items(), key=lambda item: item[1].latency.total, reverse=True
+            )
+            sources = sorted(
+                self._sources.items(), key=lambda item: item[1].total, reverse=True
+            )
+            return {
+                "since": self._started_at.isoformat(timespec="seconds"),
+                "slow_query_threshold_ms": (
+                    self.slow_query_threshold * 1000 if self.slow_query_threshold is not None else None
+                ),
+                "connection_acquire": self._acquire.to_dict(),
+                "sources": {name: hist.to_dict() for name, hist in sources},
+                "statements": [dict(sql=sql, **stats.to_dict()) for sql, stats in statements]
+            }
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times execute/executemany and reports to Instrumentation.
+
+    Also notes in `wrote` whether any statement run on it could change data,
+    and runs prepared statements from its connection's StatementCache.
+    """
+
+    def __init__(self, cursor, instrumentation, statements=None):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+        self._statements = statements
+        self.wrote = False
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        if not self.wrote and not _READ_STATEMENT.match(operation):
+            self.wrote = True
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            self._instrumentation.record_query(
+                operation, time.perf_counter() - started, self._cursor.rowcount
+            )
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self.wrote = True
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            self._instrumentation.record_query(
+                operation, time.perf_counter() - started, self._cursor.rowcount
+            )
+
+    def execute_prepared(self, operation, params=()):
+        """Run operation as a prepared statement on the same connection; returns its cursor.
+
+        The returned cursor yields tuples (use column_names) and must have its
+        rows fetched before the next statement is run.
+        """
+        if not self.wrote and not _READ_STATEMENT.match(operation):
+            self.wrote = True
+        operation, cursor = self._statements.get(operation)
+        started = time.perf_counter()
+        try:
+            cursor.execute(operation, params)
+        except Exception:
+            self._statements.discard(operation)
+            raise
+        finally:
+            self._instrumentation.record_query(operation, time.perf_counter() - started, cursor.rowcount)
+        return cursor
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _calling_screen():
+    """Name the first caller outside the database layer, e.g. 'Sales.load_orders'"""
+    frame = sys._getframe()
+    while frame is not None and frame.f_globals.get("__name__") in _INTERNAL_MODULES:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+
+    owner = frame.f_locals.get("self")
+    if owner is not None:
+        return f"{type(owner).__name__}.{frame.f_code.co_name}"
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
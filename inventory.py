@@ -1,11 +1,17 @@
+import os
 import tkinter as tk
-from tkinter import ttk, messagebox
+from datetime import datetime
+from tkinter import ttk, messagebox, filedialog
+from src import stocktake
+from src.background import run_async, show_loading
+from src.database import StockConflictError
 from src.utils import format_currency
 
 class Inventory:
     def __init__(self, parent, db):
         self.parent = parent
         self.db = db
+        self.categories = {}
         
         # Create main frame
         self.frame = ttk.Frame(parent)
@@ -182,15 +188,27 @@ class Inventory:
         self.reason_text.grid(row=5, column=1, sticky="ew", pady=5)
         
         # Apply button
-        apply_button = ttk.Button(adjustment_details_frame, text="Apply Adjustment", 
-                                 command=self.apply_stock_adjustment)
-        apply_button.grid(row=6, column=0, columnspan=2, pady=10)
+        self.apply_button = ttk.Button(adjustment_details_frame, text="Apply Adjustment", 
+                                      command=self.apply_stock_adjustment)
+        self.apply_button.grid(row=6, column=0, columnspan=2, pady=10)
+        
+        # Stocktake: a whole count at once, from a CSV
+        stocktake_frame = ttk.LabelFrame(adjustment_frame, text="Stocktake", padding=10)
+        stocktake_frame.pack(fill=tk.X)
+        
+        ttk.Button(stocktake_frame, text="Export Count Sheet...",
+                   command=self.export_count_sheet).pack(side=tk.LEFT, padx=(0, 10))
+        self.stocktake_button = ttk.Button(stocktake_frame, text="Import Stocktake...",
+                                           command=self.import_stocktake)
+        self.stocktake_button.pack(side=tk.LEFT)
         
         # Configure grid weights
         adjustment_details_frame.grid_columnconfigure(1, weight=1)
         
         # Initialize
         self.selected_product_id = None
+        # Stock version of each product in the adjustment list, as loaded
+        self.stock_versions = {}
         self.load_products_for_adjustment()
     
     def create_low_stock_tab(self):
@@ -204,7 +222,7 @@ class Inventory:
         
         # Threshold
         ttk.Label(threshold_frame, text="Low Stock Threshold:").pack(side=tk.LEFT, padx=(0, 5))
-        self.threshold_var = tk.StringVar(value="10")
+        self.threshold_var = tk.StringVar(value=str(self.db.low_stock.threshold))
         threshold_entry = ttk.Entry(threshold_frame, textvariable=self.threshold_var, width=10)
         threshold_entry.pack(side=tk.LEFT, padx=(0, 10))
         
@@ -221,7 +239,7 @@ class Inventory:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Treeview for low stock
-        columns = ("id", "name", "category", "stock", "threshold")
+        columns = ("id", "name", "category", "stock", "threshold", "days_left", "reorder")
         self.low_stock_tree = ttk.Treeview(list_frame, columns=columns, show="headings", 
                                           yscrollcommand=scrollbar.set)
         
@@ -231,12 +249,16 @@ class Inventory:
         self.low_stock_tree.heading("category", text="Category")
         self.low_stock_tree.heading("stock", text="Current Stock")
         self.low_stock_tree.heading("threshold", text="Threshold")
+        self.low_stock_tree.heading("days_left", text="Days Left")
+        self.low_stock_tree.heading("reorder", text="Suggested Order")
         
         self.low_stock_tree.column("id", width=50)
         self.low_stock_tree.column("name", width=200)
         self.low_stock_tree.column("category", width=100)
         self.low_stock_tree.column("stock", width=100)
         self.low_stock_tree.column("threshold", width=80)
+        self.low_stock_tree.column("days_left", width=80)
+        self.low_stock_tree.column("reorder", width=110)
         
         self.low_stock_tree.pack(fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.low_stock_tree.yview)
@@ -246,64 +268,33 @@ class Inventory:
     
     def load_categories(self):
         """Load categories for combobox"""
-        self.db.connect()
-        self.db.cursor.execute("SELECT id, name FROM categories ORDER BY name")
-        categories = self.db.cursor.fetchall()
-        self.db.disconnect()
-        
-        self.categories = {c['name']: c['id'] for c in categories}
+        run_async(self.category_combobox,
+                  self.db.get_category_ids_async(), self.display_categories, key="categories")
+    
+    def display_categories(self, categories):
+        """Fill the category combobox"""
+        self.categories = categories
         category_names = [""] + list(self.categories.keys())
         self.category_combobox['values'] = category_names
     
     def load_stock_levels(self):
         """Load stock levels into the treeview"""
-        # Clear existing items
-        for item in self.stock_tree.get_children():
-            self.stock_tree.delete(item)
-        
         # Get filter values
         search_term = self.search_var.get().strip()
         category = self.category_var.get()
         
         # Get products from database
-        self.db.connect()
-        
-        if category and category in self.categories:
-            category_id = self.categories[category]
-            if search_term:
-                self.db.cursor.execute('''
-                SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
-                FROM products p
-                LEFT JOIN categories c ON p.category_id = c.id
-                WHERE p.category_id = %s AND p.name LIKE %s
-                ORDER BY p.name
-                ''', (category_id, f'%{search_term}%'))
-            else:
-                self.db.cursor.execute('''
-                SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
-                FROM products p
-                LEFT JOIN categories c ON p.category_id = c.id
-                WHERE p.category_id = %s
-                ORDER BY p.name
-                ''', (category_id,))
-        elif search_term:
-            self.db.cursor.execute('''
-            SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
-            WHERE p.name LIKE %s
-            ORDER BY p.name
-            ''', (f'%{search_term}%',))
-        else:
-            self.db.cursor.execute('''
-            SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
-            ORDER BY p.name
-            ''')
+        category_id = self.categories.get(category) if category else None
+        future = self.db.get_stock_levels_async(category_id, search_term)
         
-        products = self.db.cursor.fetchall()
-        self.db.disconnect()
+        show_loading(self.stock_tree)
+        run_async(self.stock_tree, future, self.display_stock_levels, key="stock_levels")
+    
+    def display_stock_levels(self, products):
+        """Show loaded stock levels in the treeview"""
+        # Clear existing items
+        for item in self.stock_tree.get_children():
+            self.stock_tree.delete(item)
         
         # Insert products into treeview
         for product in products:
@@ -323,23 +314,26 @@ class Inventory:
     
     def load_products_for_adjustment(self):
         """Load products for stock adjustment"""
-        # Clear existing items
-        for item in self.product_tree.get_children():
-            self.product_tree.delete(item)
-        
         # Get products from database
-        self.db.connect()
-        self.db.cursor.execute('''
-        SELECT p.id, p.name, p.stock_quantity, c.name as category_name
+        future = self.db.fetch_all_async('''
+        SELECT p.id, p.name, p.stock_quantity, p.stock_version, c.name as category_name
         FROM products p
         LEFT JOIN categories c ON p.category_id = c.id
         ORDER BY p.name
         ''')
-        products = self.db.cursor.fetchall()
-        self.db.disconnect()
+        show_loading(self.product_tree)
+        run_async(self.product_tree, future, self.display_products_for_adjustment, key="adjustment_products")
+    
+    def display_products_for_adjustment(self, products):
+        """Show products available for stock adjustment"""
+        # Clear existing items
+        for item in self.product_tree.get_children():
+            self.product_tree.delete(item)
         
         # Insert products into treeview
+        self.stock_versions = {}
         for product in products:
+            self.stock_versions[product['id']] = product['stock_version']
             self.product_tree.insert("", "end", values=(
                 product['id'],
                 product['name'],
@@ -354,30 +348,16 @@ class Inventory:
             self.load_products_for_adjustment()
             return
         
-        # Clear existing items
-        for item in self.product_tree.get_children():
-            self.product_tree.delete(item)
-        
         # Search products
-        self.db.connect()
-        self.db.cursor.execute('''
-        SELECT p.id, p.name, p.stock_quantity, c.name as category_name
+        future = self.db.fetch_all_async('''
+        SELECT p.id, p.name, p.stock_quantity, p.stock_version, c.name as category_name
         FROM products p
         LEFT JOIN categories c ON p.category_id = c.id
         WHERE p.name LIKE %s
         ORDER BY p.name
         ''', (f'%{search_term}%',))
-        products = self.db.cursor.fetchall()
-        self.db.disconnect()
-        
-        # Insert products into treeview
-        for product in products:
-            self.product_tree.insert("", "end", values=(
-                product['id'],
-                product['name'],
-                product['category_name'] or "Uncategorized",
-                product['stock_quantity']
-            ))
+        show_loading(self.product_tree)
+        run_async(self.product_tree, future, self.display_products_for_adjustment, key="adjustment_products")
     
     def on_product_select_for_adjustment(self, event):
         """Handle product selection for stock adjustment"""
@@ -420,54 +400,126 @@ class Inventory:
             messagebox.showerror("Error", "Please provide a reason for the adjustment")
             return
         
-        # Get current stock
-        current_stock = int(self.current_stock_var.get())
+        # Applied as a delta in the database, so sales made since the list was
+        # loaded are kept; the version check catches any change to the product's stock
+        delta = quantity if adjustment_type == "Add" else -quantity
+        self.submit_stock_adjustment(delta, self.stock_versions.get(self.selected_product_id), reason)
+    
+    def submit_stock_adjustment(self, delta, expected_version, reason):
+        """Send the adjustment to the database, which logs it with the reason in the stock ledger"""
+        future = self.db.adjust_stock_async(self.selected_product_id, delta, expected_version, note=reason[:255])
+        self.apply_button.config(state=tk.DISABLED)
+        run_async(self.apply_button, future,
+                  lambda result: self.stock_adjusted(result[0]),
+                  lambda error: self.stock_adjustment_failed(error, delta, reason))
+    
+    def stock_adjusted(self, new_stock):
+        """Clear the adjustment form and refresh the lists after a successful adjustment"""
+        self.apply_button.config(state=tk.NORMAL)
+        
+        messagebox.showinfo("Success", f"Stock adjusted successfully. New stock: {new_stock}")
+        
+        # Clear form
+        self.selected_product_id = None
+        self.selected_product_var.set("")
+        self.current_stock_var.set("")
+        self.adjustment_quantity_var.set("")
+        self.reason_text.delete(1.0, tk.END)
+        
+        # Reload products
+        self.load_products_for_adjustment()
+        self.load_stock_levels()
+        self.load_low_stock()
+    
+    def stock_adjustment_failed(self, error, delta, reason):
+        """Re-enable the adjustment form after a failed update"""
+        self.apply_button.config(state=tk.NORMAL)
+        conflict = error.conflicts.get(self.selected_product_id) if isinstance(error, StockConflictError) else None
+        if conflict is None:
+            messagebox.showerror("Error", f"Failed to adjust stock: {error}")
+            return
+        
+        conflict_reason, stock, _ = conflict
+        if conflict_reason == "changed":
+            # Stock moved (a sale, another adjustment) since the list was loaded
+            self.current_stock_var.set(str(stock))
+            if messagebox.askyesno(
+                "Stock Changed",
+                f"The stock of this product has changed to {stock} since it was loaded. "
+                f"Apply the adjustment of {delta:+d} to the current stock?"
+            ):
+                self.submit_stock_adjustment(delta, None, reason)
+        elif conflict_reason == "insufficient":
+            self.current_stock_var.set(str(stock))
+            messagebox.showerror("Error", f"Cannot remove {-delta} units. Only {stock} in stock.")
+        else:
+            messagebox.showerror("Error", "The product no longer exists")
+        self.load_products_for_adjustment()
+    
+    def export_count_sheet(self):
+        """Save a blank count sheet listing every product"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+            initialfile=f"count_sheet_{datetime.now().strftime('%Y%m%d')}.csv"
+        )
+        if not file_path:
+            return
         
-        # Calculate new stock
-        if adjustment_type == "Add":
-            new_stock = current_stock + quantity
-        else:  # Remove
-            if quantity > current_stock:
-                messagebox.showerror("Error", f"Cannot remove {quantity} units. Only {current_stock} in stock.")
-                return
-            new_stock = current_stock - quantity
+        run_async(self.stocktake_button, self.db.export_csv_async(file_path, stocktake.COUNT_SHEET_QUERY),
+                  lambda count: messagebox.showinfo("Success", f"Count sheet with {count} products saved"))
+    
+    def import_stocktake(self):
+        """Compare a counted-quantities CSV with the stock on record, then apply it once confirmed"""
+        file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not file_path:
+            return
         
-        # Update stock
-        try:
-            self.db.connect()
-            self.db.cursor.execute('''
-            UPDATE products
-            SET stock_quantity = %s
-            WHERE id = %s
-            ''', (new_stock, self.selected_product_id))
-            self.db.conn.commit()
-            
-            # Log the adjustment (in a real app, you might want to store this in a table)
-            messagebox.showinfo("Success", f"Stock adjusted successfully. New stock: {new_stock}")
-            
-            # Clear form
-            self.selected_product_id = None
-            self.selected_product_var.set("")
-            self.current_stock_var.set("")
-            self.adjustment_quantity_var.set("")
-            self.reason_text.delete(1.0, tk.END)
-            
-            # Reload products
-            self.load_products_for_adjustment()
-            self.load_stock_levels()
-            self.load_low_stock()
-            
-            self.db.disconnect()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to adjust stock: {e}")
+        self.stocktake_button.config(state=tk.DISABLED)
+        future = self.db.submit(stocktake.import_stocktake, self.db, file_path, dry_run=True)
+        run_async(self.stocktake_button, future,
+                  lambda summary: self.confirm_stocktake(file_path, summary),
+                  self.stocktake_failed)
+    
+    def confirm_stocktake(self, file_path, summary):
+        """Show the variance totals and apply the stocktake if the user agrees"""
+        message = (f"{summary['counted']} products counted, {summary['changed']} differ from the stock on record:\n"
+                   f"{summary['units_over']} units over, {summary['units_short']} units short "
+                   f"({format_currency(summary['variance_value'])}).")
+        if summary['unknown_products']:
+            message += f"\n{summary['unknown_products']} product IDs were not found and will be skipped."
+        if summary['errors']:
+            message += f"\n{len(summary['errors'])} rows could not be read and will be skipped."
+        if not summary['changed'] or not messagebox.askyesno("Apply Stocktake", message + "\n\nApply the corrections?"):
+            self.stocktake_button.config(state=tk.NORMAL)
+            if not summary['changed']:
+                messagebox.showinfo("Stocktake", message)
+            return
+        
+        reports_dir = os.path.join(os.getcwd(), "reports")
+        os.makedirs(reports_dir, exist_ok=True)
+        report_path = os.path.join(reports_dir, f"stocktake_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        future = self.db.submit(stocktake.import_stocktake, self.db, file_path, report_path,
+                                note=os.path.basename(file_path))
+        run_async(self.stocktake_button, future,
+                  lambda result: self.stocktake_applied(result, report_path),
+                  self.stocktake_failed)
+    
+    def stocktake_applied(self, summary, report_path):
+        """Report the applied stocktake and refresh the lists"""
+        self.stocktake_button.config(state=tk.NORMAL)
+        messagebox.showinfo("Success", f"Stock corrected for {summary['changed']} products.\n"
+                                       f"Variance report written to:\n{report_path}")
+        self.load_products_for_adjustment()
+        self.load_stock_levels()
+        self.load_low_stock()
+    
+    def stocktake_failed(self, error):
+        self.stocktake_button.config(state=tk.NORMAL)
+        messagebox.showerror("Error", f"Stocktake failed: {error}")
     
     def load_low_stock(self):
         """Load low stock products"""
-        # Clear existing items
-        for item in self.low_stock_tree.get_children():
-            self.low_stock_tree.delete(item)
-        
         # Get threshold
         try:
             threshold = int(self.threshold_var.get())
@@ -477,17 +529,17 @@ class Inventory:
             messagebox.showerror("Error", "Invalid threshold")
             return
         
-        # Get low stock products
-        self.db.connect()
-        self.db.cursor.execute('''
-        SELECT p.id, p.name, p.stock_quantity, c.name as category_name
-        FROM products p
-        LEFT JOIN categories c ON p.category_id = c.id
-        WHERE p.stock_quantity <= %s
-        ORDER BY p.stock_quantity, p.name
-        ''', (threshold,))
-        products = self.db.cursor.fetchall()
-        self.db.disconnect()
+        # Low stock products, plus any the sales forecast says need reordering
+        future = self.db.get_reorder_suggestions_async(threshold)
+        show_loading(self.low_stock_tree)
+        run_async(self.low_stock_tree, future,
+                  lambda products: self.display_low_stock(products, threshold), key="low_stock")
+    
+    def display_low_stock(self, products, threshold):
+        """Show loaded low stock products in the treeview"""
+        # Clear existing items
+        for item in self.low_stock_tree.get_children():
+            self.low_stock_tree.delete(item)
         
         # Insert products into treeview
         for product in products:
@@ -496,5 +548,7 @@ class Inventory:
                 product['name'],
                 product['category_name'] or "Uncategorized",
                 product['stock_quantity'],
-                threshold
+                threshold,
+                "" if product['days_left'] is None else f"{product['days_left']:.0f}",
+                product['suggested_quantity'] or ""
             ))
@@ -0,0 +1,252 @@
+"""Simulate several POS terminals checking out against one database.
+
+Run with ``python -m src.loadsim [--terminals N] [--duration SECONDS]
+[--processes]`` plus the database options of src.datagen. Each terminal
+has its own Database (as each till runs its own copy of the application)
+and places orders back to back through Database.checkout(), the call behind
+Sales.complete_order. Terminals are threads, or separate processes with
+--processes, which takes the GIL out of the picture.
+
+Before the run a set of --hot-products products with only --stock units
+each is created, plus cold products with plenty of stock. Every order line
+picks a hot product with probability --hot-ratio, so the tills compete for
+the same rows. At the end the simulator reports:
+
+- throughput and checkout latency (p50, p95, p99, max), and how many
+  checkouts were turned away for lack of stock;
+- deadlocks and lock wait timeouts, counted from checkout errors, and on
+  MySQL the InnoDB row lock waits during the run;
+- overselling: units sold beyond the stock a hot product started with, and
+  products whose final stock does not match their starting stock minus the
+  units sold (lost updates).
+
+The products and orders it creates are left in the database; point it at a
+benchmark database rather than the shop's own.
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import statistics
+import sys
+import threading
+import time
+from decimal import Decimal
+from src import datagen
+from src.database import InsufficientStockError
+
+COLD_PRODUCTS = 50
+COLD_STOCK = 10 ** 9
+PRICE = Decimal("9.99")
+
+
+def setup(db, hot_products, stock):
+    """Create the contended products and a customer per terminal; returns (hot ids, cold ids)"""
+    category_id = db.get_category_id("Skincare")
+    run_id = int(time.time())
+    hot = [
+        db.add_product(f"Load test {run_id} hot {i}", "", PRICE, stock, category_id)
+        for i in range(hot_products)
+    ]
+    cold = [
+        db.add_product(f"Load test {run_id} cold {i}", "", PRICE, COLD_STOCK, category_id)
+        for i in range(COLD_PRODUCTS)
+    ]
+    return hot, cold
+
+
+def run_terminal(terminal, db_args, hot, cold, hot_ratio, duration, max_orders, seed):
+    """Place orders until duration has passed; returns a result dict (picklable)"""
+    rng = random.Random(seed + terminal)
+    db = datagen.open_database(db_args, pool_size=1)
+    result = {"latencies": [], "out_of_stock": 0, "deadlocks": 0, "lock_timeouts": 0, "errors": 0,
+              "error_samples": []}
+    try:
+        customer_id = db.add_customer(f"Till {terminal}", None, "", "")
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline and len(result["latencies"]) < max_orders:
+            items = [
+                (rng.choice(hot) if rng.random() < hot_ratio else rng.choice(cold), rng.randint(1, 2), PRICE)
+                for _ in range(rng.randint(1, 3))
+            ]
+            started = time.perf_counter()
+            try:
+                db.checkout(customer_id, items)
+            except InsufficientStockError:
+                result["out_of_stock"] += 1
+                continue
+            except Exception as e:
+                if db.backend.is_deadlock(e):
+                    result["deadlocks"] += 1
+                elif db.backend.is_lock_timeout(e):
+                    result["lock_timeouts"] += 1
+                else:
+                    result["errors"] += 1
+                    if len(result["error_samples"]) < 5:
+                        result["error_samples"].append(str(e))
+                continue
+            result["latencies"].append(time.perf_counter() - started)
+    finally:
+        db.close()
+    return result
+
+
+def _run_in_process(args):
+    return run_terminal(*args)
+
+
+def innodb_lock_status(db):
+    """Return InnoDB row lock counters on MySQL, or None on other backends"""
+    if db.backend.name != "mysql":
+        return None
+    rows = db.fetch_all('''
+    SHOW GLOBAL STATUS
+    WHERE Variable_name IN ('Innodb_row_lock_waits', 'Innodb_row_lock_time', 'Innodb_deadlocks')
+    ''')
+    return {row['Variable_name']: int(row['Value']) for row in rows}
+
+
+def stock_check(db, products, initial):
+    """Compare each product's stock with the units sold; returns (oversold units, oversold products, lost updates)"""
+    placeholders = ", ".join(["%s"] * len(products))
+    sold = {
+        row['product_id']: int(row['sold'])
+        for row in db.fetch_all(f'''
+        SELECT product_id, SUM(quantity) AS sold
+        FROM order_items
+        WHERE product_id IN ({placeholders})
+        GROUP BY product_id
+        ''', products)
+    }
+    stock = {
+        row['id']: row['stock_quantity']
+        for row in db.fetch_all(f"SELECT id, stock_quantity FROM products WHERE id IN ({placeholders})", products)
+    }
+    oversold_units = sum(max(0, sold.get(product_id, 0) - initial) for product_id in products)
+    oversold_products = sum(1 for product_id in products if sold.get(product_id, 0) > initial)
+    lost_updates = sum(1 for product_id in products if stock[product_id] != initial - sold.get(product_id, 0))
+    return oversold_units, oversold_products, lost_updates
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+def simulate(db_args, terminals=8, duration=30, max_orders=None, hot_products=5, stock=200,
+             hot_ratio=0.5, processes=False, seed=42):
+    """Run the simulation and return a summary dict"""
+    db = datagen.open_database(db_args, pool_size=1)
+    try:
+        hot, cold = setup(db, hot_products, stock)
+        lock_status_before = innodb_lock_status(db)
+
+        jobs = [
+            (terminal, db_args, hot, cold, hot_ratio, duration, max_orders or float("inf"), seed)
+            for terminal in range(terminals)
+        ]
+        started = time.perf_counter()
+        if processes:
+            with multiprocessing.Pool(terminals) as pool:
+                results = pool.map(_run_in_process, jobs)
+        else:
+            results = [None] * terminals
+
+            def work(index):
+                results[index] = run_terminal(*jobs[index])
+
+            threads = [threading.Thread(target=work, args=(i,)) for i in range(terminals)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - started
+
+        lock_status_after = innodb_lock_status(db)
+        oversold_units, oversold_products, lost_updates = stock_check(db, hot, stock)
+    finally:
+        db.close()
+
+    latencies = sorted(latency * 1000 for result in results for latency in result["latencies"])
+    summary = {
+        "backend": db.backend.name,
+        "terminals": terminals,
+        "mode": "processes" if processes else "threads",
+        "seconds": round(elapsed, 2),
+        "orders": len(latencies),
+        "orders_per_second": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 2) if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+        },
+        "out_of_stock": sum(result["out_of_stock"] for result in results),
+        "deadlocks": sum(result["deadlocks"] for result in results),
+        "lock_timeouts": sum(result["lock_timeouts"] for result in results),
+        "other_errors": sum(result["errors"] for result in results),
+        "error_samples": [sample for result in results for sample in result["error_samples"]][:5],
+        "hot_products": hot_products,
+        "starting_stock": stock,
+        "oversold_units": oversold_units,
+        "oversold_products": oversold_products,
+        "lost_updates": lost_updates,
+    }
+    for key in ("p50", "p95", "p99", "max"):
+        if summary["latency_ms"][key] is not None:
+            summary["latency_ms"][key] = round(summary["latency_ms"][key], 2)
+    if lock_status_before is not None:
+        summary["innodb"] = {
+            name: lock_status_after[name] - lock_status_before[name] for name in lock_status_before
+        }
+    return summary
+
+
+def print_summary(summary):
+    latency = summary["latency_ms"]
+    print(f"{summary['terminals']} terminals ({summary['mode']}) on {summary['backend']}, "
+          f"{summary['seconds']}s")
+    print(f"  checkouts        {summary['orders']} ({summary['orders_per_second']}/s)")
+    print(f"  latency ms       p50 {latency['p50']}  p95 {latency['p95']}  p99 {latency['p99']}  "
+          f"max {latency['max']}")
+    print(f"  out of stock     {summary['out_of_stock']} checkouts rejected")
+    print(f"  deadlocks        {summary['deadlocks']}")
+    print(f"  lock timeouts    {summary['lock_timeouts']}")
+    if "innodb" in summary:
+        print(f"  row lock waits   {summary['innodb'].get('Innodb_row_lock_waits')} "
+              f"({summary['innodb'].get('Innodb_row_lock_time')} ms waiting)")
+    print(f"  other errors     {summary['other_errors']}")
+    for sample in summary["error_samples"]:
+        print(f"    {sample}")
+    print(f"  oversold         {summary['oversold_units']} units over {summary['oversold_products']} "
+          f"of {summary['hot_products']} hot products (starting stock {summary['starting_stock']})")
+    print(f"  lost updates     {summary['lost_updates']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent POS checkout load simulator")
+    datagen.add_database_arguments(parser)
+    parser.add_argument("--terminals", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds to run")
+    parser.add_argument("--orders", type=int, help="stop each terminal after this many checkouts")
+    parser.add_argument("--hot-products", type=int, default=5)
+    parser.add_argument("--stock", type=int, default=200, help="starting stock of each hot product")
+    parser.add_argument("--hot-ratio", type=float, default=0.5, help="chance an order line is a hot product")
+    parser.add_argument("--processes", action="store_true", help="run terminals as processes, not threads")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    summary = simulate(args, args.terminals, args.duration, args.orders, args.hot_products, args.stock,
+                       args.hot_ratio, args.processes, args.seed)
+    if args.json:
+        print(json.dumps(summary))
+    else:
+        print_summary(summary)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import bisect
+import threading
+import time
+
+
+class LowStockIndex:
+    """In-process index of product stock levels, ordered by stock.
+
+    Loaded once by loader(), which returns every product as a row with id,
+    name, price, category_id, stock_quantity and stock_version, and then kept
+    current by the Database's stock writes through update(). Listing the
+    products at or below a level is a bisect plus the rows returned, instead
+    of a scan of products.
+
+    Each row keeps its stock_version and update() ignores rows older than the
+    one held, so writes from concurrent threads and a reload can arrive in
+    any order. Changes made by other processes (another till) are picked up
+    when a read finds the index older than refresh_interval seconds.
+
+    Listeners are called with a copy of the row whenever an update takes a
+    product's stock from above threshold to at or below it.
+    """
+
+    def __init__(self, loader, threshold=10, refresh_interval=300):
+        self.loader = loader
+        self.threshold = threshold
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        # {product_id: row}, None until the first load
+        self._products = None
+        # (stock_quantity, product_id) for every product, ascending
+        self._order = []
+        self._loaded_at = None
+        self._listeners = []
+        self.loads = 0
+        self.updates = 0
+        self.alerts = 0
+
+    def load(self):
+        """Read every product's stock from the database, replacing the index"""
+        with self._lock:
+            self._load()
+
+    def in_range(self, low=None, high=None):
+        """Rows with low <= stock_quantity <= high (either bound may be None), lowest stock first"""
+        with self._lock:
+            if self._products is None or self._stale():
+                self._load()
+            start = 0 if low is None else bisect.bisect_left(self._order, (low,))
+            end = len(self._order) if high is None else bisect.bisect_left(self._order, (high + 1,))
+            return [dict(self._products[product_id]) for _, product_id in self._order[start:end]]
+
+    def update(self, rows):
+        """Apply product rows read back after a stock write; fires alerts for threshold crossings"""
+        crossed = []
+        with self._lock:
+            if self._products is None:
+                # Nothing to keep current yet; the first read loads fresh rows
+                return
+            threshold = self.threshold
+            for row in rows:
+                current = self._products.get(row['id'])
+                if current is not None:
+                    if row['stock_version'] < current['stock_version']:
+                        continue
+                    self._remove(current)
+                    if current['stock_quantity'] > threshold >= row['stock_quantity']:
+                        crossed.append(dict(row))
+                self._insert(dict(row))
+            self.updates += 1
+            self.alerts += len(crossed)
+            listeners = list(self._listeners)
+
+        # Outside the lock, so a listener can read the index
+        for row in crossed:
+            for listener in listeners:
+                try:
+                    listener(row)
+                except Exception:
+                    pass
+
+    def discard(self, product_id):
+        """Drop a deleted product"""
+        with self._lock:
+            if self._products is not None and product_id in self._products:
+                self._remove(self._products[product_id])
+
+    def subscribe(self, listener):
+        """Call listener(row) on every threshold crossing, on the writing thread"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def stats(self):
+        """Return counters and the current size of the index"""
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "products": None if self._products is None else len(self._products),
+                "low": None if self._products is None else bisect.bisect_left(self._order, (self.threshold + 1,)),
+                "loads": self.loads,
+                "updates": self.updates,
+                "alerts": self.alerts,
+            }
+
+    def _load(self):
+        # Loaded under the lock so concurrent readers wait for one scan instead of each running it
+        rows = self.loader()
+        self._products = {row['id']: dict(row) for row in rows}
+        self._order = sorted((row['stock_quantity'], row['id']) for row in self._products.values())
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+
+    def _stale(self):
+        return bool(self.refresh_interval) and time.monotonic() - self._loaded_at > self.refresh_interval
+
+    def _insert(self, row):
+        self._products[row['id']] = row
+        bisect.insort(self._order, (row['stock_quantity'], row['id']))
+
+    def _remove(self, row):
+        del self._products[row['id']]
+        entry = (row['stock_quantity'], row['id'])
+        index = bisect.bisect_left(self._order, entry)
+        if index < len(self._order) and self._order[index] == entry:
+            del self._order[index]
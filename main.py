@@ -1,10 +1,15 @@
+import json
 import os
 import tkinter as tk
 from tkinter import ttk, messagebox
 from ttkthemes import ThemedTk
+from src import thumbnails
 from src.database import Database
 from src.ui.dashboard import Dashboard
 
+# How often to check whether the daily stock snapshot is due
+SNAPSHOT_CHECK_INTERVAL_MS = 60 * 60 * 1000
+
 class CosmeticShopApp:
     def __init__(self, root):
         self.root = root
@@ -22,13 +27,25 @@ class CosmeticShopApp:
         self.style.configure("TButton", font=("Arial", 10))
         self.style.configure("Heading.TLabel", font=("Arial", 16, "bold"))
         
-        # Initialize database
+        # Initialize database; "database_backend" in settings.json switches
+        # between a MySQL server ("mysql") and a local SQLite file ("sqlite")
+        settings = self.load_settings()
         self.db = Database(
             host='localhost',
             user='root',
             password='',  # Replace with your MySQL password
-            database='cosmetic_shop'
+            database='cosmetic_shop',
+            journal_path=os.path.join(os.getcwd(), "data", "order_journal.jsonl"),
+            backend=settings.get("database_backend", "mysql"),
+            sqlite_path=settings.get("sqlite_path") or os.path.join(os.getcwd(), "data", "cosmetic_shop.db"),
+            low_stock_threshold=settings.get("low_stock_threshold", 10)
         )
+        # Load the low-stock index in the background, before the first sale needs it
+        self.db.submit(self.db.low_stock.load)
+        # A daily stock snapshot keeps "stock as of" lookups to a short replay of the ledger
+        self.schedule_stock_snapshot()
+        # Remove stored product images nothing has used for a day, and their thumbnails
+        self.db.submit(self.clean_up_images)
         
         # Create necessary directories
         self.create_directories()
@@ -36,11 +53,33 @@ class CosmeticShopApp:
         # Start with login screen
         self.show_login()
     
+    def load_settings(self):
+        """Read settings.json from the project folder, if there is one"""
+        settings_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "settings.json")
+        if not os.path.exists(settings_path):
+            return {}
+        with open(settings_path, 'r') as f:
+            return json.load(f)
+    
+    def schedule_stock_snapshot(self):
+        """Take the daily stock snapshot if it is due, and check again in an hour.
+        
+        Runs for as long as the window is open, so a till left running for
+        days still takes one a day, not only at startup.
+        """
+        self.db.submit(self.db.ensure_stock_snapshot)
+        self.root.after(SNAPSHOT_CHECK_INTERVAL_MS, self.schedule_stock_snapshot)
+    
+    def clean_up_images(self):
+        """Purge unused stored images, then thumbnails of images no longer stored (worker thread)"""
+        self.db.purge_unused_images()
+        thumbnails.thumbnail_store().prune(self.db.get_image_digests())
+    
     def create_directories(self):
         """Create necessary directories for the application"""
         directories = [
             os.path.join(os.getcwd(), "images"),
-            os.path.join(os.getcwd(), "images", "product_images"),
+            os.path.join(os.getcwd(), "images", "store"),
             os.path.join(os.getcwd(), "reports")
         ]
         
@@ -88,13 +127,10 @@ class CosmeticShopApp:
         """Handle login process"""
         # For simplicity, we're using a direct comparison
         # In a real application, you should use proper password hashing
-        self.db.connect()
-        self.db.cursor.execute(
+        user = self.db.fetch_one(
             "SELECT * FROM users WHERE username = %s AND password = %s",
             (username, password)
         )
-        user = self.db.cursor.fetchone()
-        self.db.disconnect()
         
         if user:
             self.current_user = user
@@ -0,0 +1,395 @@
+from src import image_store
+
+
+class Migration:
+    """A numbered schema change made of one or more SQL statements.
+
+    Each statement is either a SQL string or a (sql, params) tuple. Where
+    SQLite needs different DDL, sqlite gives its statements instead. data is
+    an optional data step, called with the Database once the statements have
+    committed, for changes SQL alone can't make (such as moving files); it
+    must be safe to run again, as it is if the migration is interrupted.
+    """
+
+    def __init__(self, version, description, statements, sqlite=None, data=None):
+        self.version = version
+        self.description = description
+        self.statements = statements
+        self.sqlite_statements = sqlite
+        self.data = data
+
+    def statements_for(self, backend):
+        if backend.name == "sqlite" and self.sqlite_statements is not None:
+            return self.sqlite_statements
+        return self.statements
+
+    def apply(self, cursor, backend):
+        for statement in self.statements_for(backend):
+            try:
+                if isinstance(statement, tuple):
+                    cursor.execute(*statement)
+                else:
+                    cursor.execute(statement)
+            except Exception as e:
+                # MySQL has no CREATE INDEX / ADD COLUMN IF NOT EXISTS; an index or column
+                # left behind by an interrupted run must not stop the migration from being re-applied
+                if not backend.is_duplicate_object(e):
+                    raise
+
+
+# Migration 1 is idempotent so databases created before versioning was
+# introduced can be adopted by simply running it against them.
+MIGRATIONS = [
+    Migration(1, "Initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL UNIQUE,
+            description TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS products (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            price DECIMAL(10, 2) NOT NULL,
+            stock_quantity INT NOT NULL,
+            category_id INT,
+            image_path VARCHAR(255),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (category_id) REFERENCES categories (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS customers (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) UNIQUE,
+            phone VARCHAR(20),
+            address TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            customer_id INT,
+            order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            total_amount DECIMAL(10, 2) NOT NULL,
+            status VARCHAR(20) DEFAULT 'Pending',
+            FOREIGN KEY (customer_id) REFERENCES customers (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            order_id INT,
+            product_id INT,
+            quantity INT NOT NULL,
+            price DECIMAL(10, 2) NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders (id),
+            FOREIGN KEY (product_id) REFERENCES products (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) NOT NULL UNIQUE,
+            password VARCHAR(100) NOT NULL,
+            role VARCHAR(20) DEFAULT 'staff',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Default admin user
+        '''
+        INSERT IGNORE INTO users (username, password, role)
+        VALUES ('admin', 'admin123', 'admin')
+        ''',
+        # Default categories
+        ('''
+        INSERT IGNORE INTO categories (name, description)
+        VALUES (%s, %s), (%s, %s), (%s, %s), (%s, %s), (%s, %s)
+        ''', (
+            'Skincare', 'Products for skin care and treatment',
+            'Makeup', 'Cosmetic products for face and body',
+            'Haircare', 'Products for hair care and styling',
+            'Fragrances', 'Perfumes and body sprays',
+            'Bath & Body', 'Products for bathing and body care'
+        ))
+    ], sqlite=[
+        '''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL UNIQUE,
+            description TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            price DECIMAL(10, 2) NOT NULL,
+            stock_quantity INT NOT NULL,
+            category_id INT REFERENCES categories (id),
+            image_path VARCHAR(255),
+            created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+            updated_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+        )
+        ''',
+        # Stands in for MySQL's ON UPDATE CURRENT_TIMESTAMP
+        '''
+        CREATE TRIGGER IF NOT EXISTS products_updated_at
+        AFTER UPDATE ON products
+        FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+        BEGIN
+            UPDATE products SET updated_at = datetime('now', 'localtime') WHERE id = NEW.id;
+        END
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) UNIQUE,
+            phone VARCHAR(20),
+            address TEXT,
+            created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            customer_id INT REFERENCES customers (id),
+            order_date TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+            total_amount DECIMAL(10, 2) NOT NULL,
+            status VARCHAR(20) DEFAULT 'Pending'
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INT REFERENCES orders (id),
+            product_id INT REFERENCES products (id),
+            quantity INT NOT NULL,
+            price DECIMAL(10, 2) NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username VARCHAR(50) NOT NULL UNIQUE,
+            password VARCHAR(100) NOT NULL,
+            role VARCHAR(20) DEFAULT 'staff',
+            created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+        )
+        ''',
+        '''
+        INSERT OR IGNORE INTO users (username, password, role)
+        VALUES ('admin', 'admin123', 'admin')
+        ''',
+        ('''
+        INSERT OR IGNORE INTO categories (name, description)
+        VALUES (%s, %s), (%s, %s), (%s, %s), (%s, %s), (%s, %s)
+        ''', (
+            'Skincare', 'Products for skin care and treatment',
+            'Makeup', 'Cosmetic products for face and body',
+            'Haircare', 'Products for hair care and styling',
+            'Fragrances', 'Perfumes and body sprays',
+            'Bath & Body', 'Products for bathing and body care'
+        ))
+    ]),
+    Migration(2, "Secondary indexes for hot queries", [
+        # Order listings, sales reports and status filters
+        "CREATE INDEX idx_orders_order_date ON orders (order_date)",
+        "CREATE INDEX idx_orders_status_date ON orders (status, order_date)",
+        # Order details and product sales aggregation read order_items from the index alone
+        "CREATE INDEX idx_order_items_order_covering ON order_items (order_id, product_id, quantity, price)",
+        # Name-sorted product listings, with and without a category filter
+        "CREATE INDEX idx_products_name ON products (name)",
+        "CREATE INDEX idx_products_category_name ON products (category_id, name)",
+        # Low stock / out of stock filters, ordered by stock then name
+        "CREATE INDEX idx_products_stock_name ON products (stock_quantity, name)",
+        # Name-sorted customer listings
+        "CREATE INDEX idx_customers_name ON customers (name)"
+    ]),
+    Migration(3, "Client references for idempotent order replay", [
+        # Set by the checkout that created the order, so a replayed order can be recognised
+        "ALTER TABLE orders ADD COLUMN client_ref VARCHAR(32) NULL",
+        "CREATE UNIQUE INDEX uq_orders_client_ref ON orders (client_ref)"
+    ]),
+    Migration(4, "Stock version for optimistic stock adjustments", [
+        # Bumped by every stock change, so an adjustment can check nothing changed since it was read
+        "ALTER TABLE products ADD COLUMN stock_version INT NOT NULL DEFAULT 0"
+    ]),
+    Migration(5, "Inventory movement ledger and stock snapshots", [
+        # Every stock change, signed; no foreign key, the history outlives deleted products
+        '''
+        CREATE TABLE IF NOT EXISTS inventory_movements (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            product_id INT NOT NULL,
+            quantity INT NOT NULL,
+            reason VARCHAR(20) NOT NULL,
+            order_id INT NULL,
+            note VARCHAR(255) NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_movements_product_created (product_id, created_at),
+            INDEX idx_movements_created (created_at)
+        )
+        ''',
+        # Every product's stock as of the last movement at the time the snapshot was taken
+        '''
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            taken_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_movement_id BIGINT NOT NULL,
+            INDEX idx_stock_snapshots_taken_at (taken_at)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stock_snapshot_items (
+            snapshot_id INT NOT NULL,
+            product_id INT NOT NULL,
+            stock_quantity INT NOT NULL,
+            PRIMARY KEY (snapshot_id, product_id)
+        )
+        ''',
+        # The ledger starts from the stock products have today; products that
+        # already have movements are skipped, so running this again adds nothing
+        '''
+        INSERT INTO inventory_movements (product_id, quantity, reason)
+        SELECT id, stock_quantity, 'opening' FROM products
+        WHERE stock_quantity <> 0
+          AND NOT EXISTS (SELECT 1 FROM inventory_movements m WHERE m.product_id = products.id)
+        '''
+    ], sqlite=[
+        '''
+        CREATE TABLE IF NOT EXISTS inventory_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INT NOT NULL,
+            quantity INT NOT NULL,
+            reason VARCHAR(20) NOT NULL,
+            order_id INT NULL,
+            note VARCHAR(255) NULL,
+            created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_movements_product_created ON inventory_movements (product_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_movements_created ON inventory_movements (created_at)",
+        '''
+        CREATE TABLE IF NOT EXISTS stock_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            taken_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+            last_movement_id INT NOT NULL
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_stock_snapshots_taken_at ON stock_snapshots (taken_at)",
+        '''
+        CREATE TABLE IF NOT EXISTS stock_snapshot_items (
+            snapshot_id INT NOT NULL,
+            product_id INT NOT NULL,
+            stock_quantity INT NOT NULL,
+            PRIMARY KEY (snapshot_id, product_id)
+        )
+        ''',
+        '''
+        INSERT INTO inventory_movements (product_id, quantity, reason)
+        SELECT id, stock_quantity, 'opening' FROM products
+        WHERE stock_quantity <> 0
+          AND NOT EXISTS (SELECT 1 FROM inventory_movements m WHERE m.product_id = products.id)
+        '''
+    ]),
+    Migration(6, "Content-addressed product image store", [
+        # One row per stored image file, with the number of products using it
+        '''
+        CREATE TABLE IF NOT EXISTS image_blobs (
+            digest CHAR(64) PRIMARY KEY,
+            path VARCHAR(255) NOT NULL,
+            size_bytes BIGINT NOT NULL,
+            ref_count INT NOT NULL DEFAULT 0,
+            imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE INDEX idx_image_blobs_path (path)
+        )
+        ''',
+        # The name the image file had when it was picked, for display
+        "ALTER TABLE products ADD COLUMN image_name VARCHAR(255) NULL"
+    ], sqlite=[
+        '''
+        CREATE TABLE IF NOT EXISTS image_blobs (
+            digest CHAR(64) PRIMARY KEY,
+            path VARCHAR(255) NOT NULL,
+            size_bytes BIGINT NOT NULL,
+            ref_count INT NOT NULL DEFAULT 0,
+            imported_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+        )
+        ''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_image_blobs_path ON image_blobs (path)",
+        "ALTER TABLE products ADD COLUMN image_name VARCHAR(255) NULL"
+    ], data=image_store.dedupe_product_images),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(cursor, backend):
+    """Return the highest applied migration version, or 0 for an unversioned database"""
+    try:
+        cursor.execute("SELECT MAX(version) AS version FROM schema_migrations")
+    except Exception as e:
+        if backend.is_missing_table(e):
+            return 0
+        raise
+    row = cursor.fetchone()
+    return row['version'] or 0
+
+
+def pending_migrations(version):
+    """Return migrations newer than version, in order"""
+    return sorted((m for m in MIGRATIONS if m.version > version), key=lambda m: m.version)
+
+
+def migrate(db):
+    """Apply pending migrations and return the versions that were applied.
+
+    On an up-to-date database this is a single query. MySQL commits DDL
+    implicitly, so each migration is recorded as soon as it has run and a
+    failed run resumes from the first unrecorded migration.
+    """
+    with db.transaction() as cursor:
+        version = current_version(cursor, db.backend)
+
+    pending = pending_migrations(version)
+    if not pending:
+        return []
+
+    with db.transaction() as cursor:
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+    applied = []
+    for migration in pending:
+        with db.transaction() as cursor:
+            migration.apply(cursor, db.backend)
+            if migration.data is None:
+                _record(cursor, db, migration)
+        if migration.data is not None:
+            # Only recorded once the data step has finished, so it is re-run if interrupted
+            migration.data(db)
+            with db.transaction() as cursor:
+                _record(cursor, db, migration)
+        applied.append(migration.version)
+
+    return applied
+
+
+def _record(cursor, db, migration):
+    cursor.execute(f'''
+    {db.backend.insert_ignore} INTO schema_migrations (version, description)
+    VALUES (%s, %s)
+    ''', (migration.version, migration.description))
@@ -1,6 +1,50 @@
+from collections import namedtuple
+from functools import lru_cache
+from operator import itemgetter
+
+@lru_cache(maxsize=256)
+def record_type(columns):
+    """Return the named-tuple class for a result with these column names.
+    
+    Cached, so every row of a query (and every run of it) shares one class
+    instead of carrying its own dictionary of keys.
+    """
+    return namedtuple("Record", columns, rename=True)
+
+def _row_getter(row, fields, defaults):
+    """Return a function reading fields from rows shaped like row (a record or a dict)"""
+    if hasattr(row, "_fields"):
+        positions = {name: i for i, name in enumerate(row._fields)}
+        if all(field in positions for field in fields):
+            return itemgetter(*(positions[field] for field in fields))
+        # Optional columns the query didn't select fall back to their defaults
+        indexes = [positions.get(field) for field in fields]
+        return lambda r: tuple(
+            r[i] if i is not None else defaults[field] for field, i in zip(fields, indexes)
+        )
+    return lambda r: tuple(
+        r[field] if field not in defaults else r.get(field, defaults[field]) for field in fields
+    )
+
+def _from_rows(cls, rows, fields, defaults):
+    """Build cls(*values) for every row, resolving column positions once for the whole batch"""
+    objects = []
+    getter = None
+    for row in rows:
+        if getter is None:
+            getter = _row_getter(row, fields, defaults)
+        objects.append(cls(*getter(row)))
+    return objects
+
 class Product:
+    # Column order of the constructor, and defaults for columns a query may leave out
+    _FIELDS = ("id", "name", "description", "price", "stock_quantity", "category_id", "category_name", "image_path",
+               "image_name")
+    _DEFAULTS = {"category_name": "", "image_name": None}
+    __slots__ = _FIELDS
+    
     def __init__(self, id=None, name="", description="", price=0.0, stock_quantity=0, 
-                 category_id=None, category_name="", image_path=None):
+                 category_id=None, category_name="", image_path=None, image_name=None):
         self.id = id
         self.name = name
         self.description = description
@@ -9,6 +53,8 @@ class Product:
         self.category_id = category_id
         self.category_name = category_name
         self.image_path = image_path
+        # The image's original file name, for display; image_path is its store file
+        self.image_name = image_name
     
     @classmethod
     def from_db_row(cls, row):
@@ -22,10 +68,21 @@ class Product:
             stock_quantity=row['stock_quantity'],
             category_id=row['category_id'],
             category_name=row.get('category_name', ''),
-            image_path=row['image_path']
+            image_path=row['image_path'],
+            image_name=row.get('image_name')
         )
+    
+    @classmethod
+    def from_db_rows(cls, rows):
+        """Build products from dictionary rows or Database.fetch_records records"""
+        return _from_rows(cls, rows, cls._FIELDS, cls._DEFAULTS)
 
 class Category:
+    # Column order of the constructor, and defaults for columns a query may leave out
+    _FIELDS = ("id", "name", "description")
+    _DEFAULTS = {}
+    __slots__ = _FIELDS
+    
     def __init__(self, id=None, name="", description=""):
         self.id = id
         self.name = name
@@ -40,8 +97,18 @@ class Category:
             name=row['name'],
             description=row['description']
         )
+    
+    @classmethod
+    def from_db_rows(cls, rows):
+        """Build categories from dictionary rows or Database.fetch_records records"""
+        return _from_rows(cls, rows, cls._FIELDS, cls._DEFAULTS)
 
 class Customer:
+    # Column order of the constructor, and defaults for columns a query may leave out
+    _FIELDS = ("id", "name", "email", "phone", "address")
+    _DEFAULTS = {}
+    __slots__ = _FIELDS
+    
     def __init__(self, id=None, name="", email="", phone="", address=""):
         self.id = id
         self.name = name
@@ -60,8 +127,18 @@ class Customer:
             phone=row['phone'],
             address=row['address']
         )
+    
+    @classmethod
+    def from_db_rows(cls, rows):
+        """Build customers from dictionary rows or Database.fetch_records records"""
+        return _from_rows(cls, rows, cls._FIELDS, cls._DEFAULTS)
 
 class Order:
+    # Column order of the constructor, and defaults for columns a query may leave out
+    _FIELDS = ("id", "customer_id", "customer_name", "order_date", "total_amount", "status")
+    _DEFAULTS = {"customer_name": ""}
+    __slots__ = _FIELDS + ("items",)
+    
     def __init__(self, id=None, customer_id=None, customer_name="", 
                  order_date=None, total_amount=0.0, status="Pending", items=None):
         self.id = id
@@ -85,8 +162,18 @@ class Order:
             status=row['status'],
             items=items or []
         )
+    
+    @classmethod
+    def from_db_rows(cls, rows):
+        """Build orders from dictionary rows or Database.fetch_records records"""
+        return _from_rows(cls, rows, cls._FIELDS, cls._DEFAULTS)
 
 class OrderItem:
+    # Column order of the constructor, and defaults for columns a query may leave out
+    _FIELDS = ("id", "order_id", "product_id", "product_name", "quantity", "price")
+    _DEFAULTS = {"order_id": None, "product_name": ""}
+    __slots__ = _FIELDS
+    
     def __init__(self, id=None, order_id=None, product_id=None, 
                  product_name="", quantity=0, price=0.0):
         self.id = id
@@ -108,8 +195,15 @@ class OrderItem:
             quantity=row['quantity'],
             price=row['price']
         )
+    
+    @classmethod
+    def from_db_rows(cls, rows):
+        """Build order items from dictionary rows or Database.fetch_records records"""
+        return _from_rows(cls, rows, cls._FIELDS, cls._DEFAULTS)
 
 class User:
+    __slots__ = ("id", "username", "password", "role")
+    
     def __init__(self, id=None, username="", password="", role="staff"):
         self.id = id
         self.username = username
@@ -0,0 +1,224 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+# MySQL client error codes (CR_*) are all in this range: connection refused,
+# server gone away, lost connection during query, and so on
+_CLIENT_ERRORS = range(2000, 3000)
+# Server-side errors that also mean "try again later"
+_UNAVAILABLE_SERVER_ERRORS = {
+    1040,  # ER_CON_COUNT_ERROR: too many connections
+    1053,  # ER_SERVER_SHUTDOWN
+}
+# ER_LOCK_WAIT_TIMEOUT is not one of them: the server is up and the rows are
+# busy, and a journaled order would be replayed without the stock check
+LOCK_WAIT_TIMEOUT = 1205
+
+
+def is_unavailable_error(error):
+    """Return True if error means MySQL could not be reached, rather than that the order is invalid"""
+    errno = getattr(error, "errno", None)
+    return errno in _CLIENT_ERRORS or errno in _UNAVAILABLE_SERVER_ERRORS
+
+
+def new_order_ref():
+    """Return a client-side reference that identifies one checkout across retries"""
+    return uuid.uuid4().hex
+
+
+class OrderJournal:
+    """Append-only, fsync'd file of checkouts waiting to be written to MySQL.
+
+    Each line is a JSON record: an "order" record holds everything needed to
+    place the order, and a later "done" or "failed" record with the same ref
+    closes it. Records are only ever appended, so a crash can at worst leave
+    a torn last line, which is ignored on reading. Once every order is closed
+    the file is compacted back to just the failed ones.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def append_order(self, ref, customer_id, items, status, order_date=None):
+        """Durably record a checkout; returns once it is on disk"""
+        self._append([self._encode_order({
+            "type": "order",
+            "ref": ref,
+            "customer_id": customer_id,
+            "items": items,
+            "status": status,
+            "order_date": order_date or datetime.now()
+        })])
+
+    def mark_done(self, results):
+        """Close replayed orders; results is a list of (ref, order_id)"""
+        self._append([{"type": "done", "ref": ref, "order_id": order_id} for ref, order_id in results])
+
+    def mark_failed(self, ref, error):
+        """Close an order MySQL rejected, keeping it in the file for manual review"""
+        self._append([{"type": "failed", "ref": ref, "error": str(error)}])
+
+    def pending(self):
+        """Return the orders that have not been closed yet, oldest first"""
+        with self._lock:
+            orders, closed = self._read()
+        return [order for ref, order in orders.items() if ref not in closed]
+
+    def compact(self):
+        """Rewrite the file without replayed orders once nothing is pending"""
+        with self._lock:
+            orders, closed = self._read()
+            if any(ref not in closed for ref in orders):
+                return False
+            if not any(record["type"] == "done" for record in closed.values()):
+                return False
+
+            # Failed orders stay, together with their order records
+            keep = []
+            for ref, record in closed.items():
+                if record["type"] == "failed":
+                    if ref in orders:
+                        keep.append(self._encode_order(orders[ref]))
+                    keep.append(record)
+
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for record in keep:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            return True
+
+    @staticmethod
+    def _encode_order(order):
+        return dict(
+            order,
+            items=[[product_id, quantity, str(price)] for product_id, quantity, price in order["items"]],
+            order_date=order["order_date"].isoformat()
+        )
+
+    def _append(self, records):
+        if not records:
+            return
+        data = "".join(json.dumps(record) + "\n" for record in records).encode()
+        with self._lock:
+            with open(self.path, "ab+") as f:
+                # Start on a fresh line if a crash left a torn record at the end
+                if f.tell():
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        data = b"\n" + data
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _read(self):
+        orders = {}
+        closed = {}
+        if not os.path.exists(self.path):
+            return orders, closed
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write from a crash mid-append; its order was never acknowledged
+                    continue
+                if record["type"] == "order":
+                    record["items"] = [
+                        (product_id, quantity, Decimal(price))
+                        for product_id, quantity, price in record["items"]
+                    ]
+                    record["order_date"] = datetime.fromisoformat(record["order_date"])
+                    orders[record["ref"]] = record
+                else:
+                    closed[record["ref"]] = record
+        return orders, closed
+
+
+class JournalReplayer:
+    """Background thread that drains an OrderJournal into the database.
+
+    Every interval seconds (or straight away after wake()) it places up to
+    batch_size pending orders, marks them done with a single fsync, and keeps
+    going while orders remain. Replay is idempotent: orders are placed with
+    their journal ref as client_ref, so one already committed before a crash
+    or lost connection is found instead of inserted again.
+    """
+
+    def __init__(self, db, journal, interval=15, batch_size=50):
+        self.db = db
+        self.journal = journal
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="order-journal-replayer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self):
+        """Try to replay now instead of at the next interval"""
+        self._wake.set()
+
+    def replay_pending(self):
+        """Replay pending orders in batches; returns how many were written"""
+        replayed = 0
+        pending = self.journal.pending()
+        while pending and not self._stopped.is_set():
+            batch, pending = pending[:self.batch_size], pending[self.batch_size:]
+            done = []
+            try:
+                for order in batch:
+                    try:
+                        order_id = self.db.place_order(
+                            order["customer_id"], order["items"], order["status"],
+                            client_ref=order["ref"], order_date=order["order_date"],
+                            # The goods were handed over while offline, the sale stands
+                            check_stock=False
+                        )
+                    except Exception as e:
+                        if is_unavailable_error(e):
+                            raise
+                        logger.error("Journaled order %s was rejected: %s", order["ref"], e)
+                        self.journal.mark_failed(order["ref"], e)
+                        continue
+                    done.append((order["ref"], order_id))
+            finally:
+                self.journal.mark_done(done)
+                replayed += len(done)
+
+        self.journal.compact()
+        return replayed
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                replayed = self.replay_pending()
+                if replayed:
+                    logger.info("Replayed %s journaled orders", replayed)
+            except Exception as e:
+                # Still offline; keep the orders and try again later
+                logger.warning("Order journal replay postponed: %s", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
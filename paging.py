@@ -0,0 +1,68 @@
+from src.background import run_async, show_database_error, show_loading
+
+
+class InfiniteScroll:
+    """Fills a treeview page by page as the user scrolls towards the bottom.
+
+    fetch_page(after) must return a future resolving to (rows, next_after), as
+    the Database *_page_async methods do; insert_row(row) adds one row to the
+    tree. The tree's yscrollcommand is taken over to watch the scroll position
+    and forwarded to the scrollbar.
+    """
+
+    def __init__(self, tree, scrollbar, fetch_page, insert_row, key, threshold=0.9):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page
+        self.insert_row = insert_row
+        self.key = key
+        self.threshold = threshold
+        self.after = None
+        self.exhausted = True
+        self.loading = False
+        self.tree.configure(yscrollcommand=self.on_scroll)
+
+    def reset(self):
+        """Clear the tree and load the first page"""
+        self.after = None
+        self.exhausted = False
+        self.loading = False
+        show_loading(self.tree)
+        self.load_next()
+
+    def load_next(self):
+        """Fetch the page after the last loaded row, unless one is in flight or none is left"""
+        if self.loading or self.exhausted:
+            return
+        self.loading = True
+        # A reset() while a page is loading supersedes it through the shared key
+        run_async(self.tree, self.fetch_page(self.after), self.append_page, self.load_failed,
+                  key=self.key)
+
+    def append_page(self, page):
+        rows, next_after = page
+        if self.after is None:
+            # First page replaces the loading placeholder
+            self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.insert_row(row)
+
+        self.after = next_after
+        self.exhausted = next_after is None
+        self.loading = False
+
+        # Keep going until the rows overflow the visible area, or scrolling would never start
+        self.tree.update_idletasks()
+        if self.tree.yview()[1] >= 1.0:
+            self.load_next()
+
+    def load_failed(self, error):
+        self.loading = False
+        # Stop paging; the next reset() retries from the top
+        self.exhausted = True
+        show_database_error(error)
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if float(last) >= self.threshold:
+            self.load_next()
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+
+
+class StatementCacheStats:
+    """Hit, miss and eviction counts shared by the statement caches of one pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"hits": 0, "misses": 0, "evictions": 0, "connections_closed": 0}
+
+    def add(self, name, count=1):
+        with self._lock:
+            self._counts[name] += count
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class StatementCache:
+    """Server-side prepared statements of one connection, least recently used evicted first.
+
+    Each statement text gets its own prepared cursor, which MySQL prepares on
+    first execution and afterwards runs over the binary protocol by statement
+    ID, without parsing the SQL again. The statements live as long as the
+    connection, across transactions, so Database drops the cache when the pool
+    closes or recycles the connection. With prepared=False plain text-protocol
+    cursors are cached instead, which gives the same behaviour for comparison.
+    """
+
+    def __init__(self, conn, stats, max_size=64, prepared=True):
+        self.conn = conn
+        self.stats = stats
+        self.max_size = max_size
+        self.prepared = prepared
+        # statement text -> (text, cursor); the cursor only reuses its
+        # statement when given the very string it was prepared with
+        self._cursors = OrderedDict()
+
+    def get(self, sql):
+        """Return (sql, cursor) for a statement, preparing a cursor for it if needed"""
+        entry = self._cursors.get(sql)
+        if entry is not None:
+            self._cursors.move_to_end(sql)
+            self.stats.add("hits")
+            return entry
+
+        self.stats.add("misses")
+        if self.prepared:
+            cursor = self.conn.cursor(prepared=True)
+        else:
+            cursor = self.conn.cursor(buffered=True)
+        entry = self._cursors[sql] = (sql, cursor)
+        if len(self._cursors) > self.max_size:
+            # Closing the cursor deallocates its statement on the server
+            _, (_, oldest) = self._cursors.popitem(last=False)
+            self._close_quietly(oldest)
+            self.stats.add("evictions")
+        return entry
+
+    def discard(self, sql):
+        """Forget a statement whose cursor failed, so the next call prepares it afresh"""
+        entry = self._cursors.pop(sql, None)
+        if entry is not None:
+            self._close_quietly(entry[1])
+
+    def close(self):
+        """Close every cached cursor; called before the connection itself is closed"""
+        cursors = [cursor for _, cursor in self._cursors.values()]
+        self._cursors.clear()
+        for cursor in cursors:
+            self._close_quietly(cursor)
+
+    def __len__(self):
+        return len(self._cursors)
+
+    @staticmethod
+    def _close_quietly(cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
@@ -1,15 +1,23 @@
 import os
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from PIL import Image, ImageTk
+from src import thumbnails
 from src.models import Product, Category
-from src.utils import load_image, format_currency
+from src.database import StockConflictError
+from src.background import run_async
+from src.paging import InfiniteScroll
+from src.utils import format_currency
 
 class ProductManagement:
     def __init__(self, parent, db):
         self.parent = parent
         self.db = db
         
+        # (search term, category name) the product list is filtered by while it pages
+        self.product_filters = ("", "")
+        # (stock_quantity, stock_version) of the product in the form, None for a new one
+        self.loaded_stock = None
+        
         # Create main frame
         self.frame = ttk.Frame(parent)
         self.frame.pack(fill=tk.BOTH, expand=True)
@@ -97,6 +105,13 @@ class ProductManagement:
         self.product_tree.pack(fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.product_tree.yview)
         
+        # Products are loaded a page at a time as the list is scrolled
+        self.product_pager = InfiniteScroll(
+            self.product_tree, scrollbar,
+            lambda after: self.db.submit(self.fetch_products_page, self.product_filters, after),
+            self.insert_product, key="products"
+        )
+        
         # Bind select event
         self.product_tree.bind("<<TreeviewSelect>>", self.on_product_select)
         
@@ -156,6 +171,8 @@ class ProductManagement:
         image_frame.grid(row=5, column=1, sticky="ew", pady=5)
         
         self.image_path_var = tk.StringVar()
+        # Stored files are named by their hash; this is the name the file was picked under
+        self.image_name_var = tk.StringVar()
         self.image_label = ttk.Label(image_frame, text="No image selected")
         self.image_label.pack(side=tk.LEFT)
         
@@ -167,91 +184,46 @@ class ProductManagement:
         self.image_preview.grid(row=6, column=0, columnspan=2, pady=10)
         
         # Save button
-        save_button = ttk.Button(form_frame, text="Save Product", command=self.save_product)
-        save_button.grid(row=7, column=0, columnspan=2, pady=10)
+        self.save_button = ttk.Button(form_frame, text="Save Product", command=self.save_product)
+        self.save_button.grid(row=7, column=0, columnspan=2, pady=10)
         
         # Configure grid weights
         form_frame.grid_columnconfigure(1, weight=1)
     
     def load_products(self):
         """Load products into the treeview"""
-        # Clear existing items
-        for item in self.product_tree.get_children():
-            self.product_tree.delete(item)
-        
         # Get filter values
-        search_term = self.search_var.get()
-        category_filter = self.category_filter_var.get()
-        
-        # Get products from database
-        self.db.connect()
-        
-        if category_filter:
-            # Get category ID
-            self.db.cursor.execute("SELECT id FROM categories WHERE name = %s", (category_filter,))
-            category_id = self.db.cursor.fetchone()
-            
-            if category_id:
-                category_id = category_id['id']
-                if search_term:
-                    self.db.cursor.execute('''
-                    SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
-                    FROM products p
-                    LEFT JOIN categories c ON p.category_id = c.id
-                    WHERE p.category_id = %s AND p.name LIKE %s
-                    ORDER BY p.name
-                    ''', (category_id, f'%{search_term}%'))
-                else:
-                    self.db.cursor.execute('''
-                    SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
-                    FROM products p
-                    LEFT JOIN categories c ON p.category_id = c.id
-                    WHERE p.category_id = %s
-                    ORDER BY p.name
-                    ''', (category_id,))
-            else:
-                self.db.cursor.execute('''
-                SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
-                FROM products p
-                LEFT JOIN categories c ON p.category_id = c.id
-                ORDER BY p.name
-                ''')
-        elif search_term:
-            self.db.cursor.execute('''
-            SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
-            WHERE p.name LIKE %s
-            ORDER BY p.name
-            ''', (f'%{search_term}%',))
-        else:
-            self.db.cursor.execute('''
-            SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
-            FROM products p
-            LEFT JOIN categories c ON p.category_id = c.id
-            ORDER BY p.name
-            ''')
-        
-        products = self.db.cursor.fetchall()
-        self.db.disconnect()
-        
-        # Insert products into treeview
-        for product in products:
-            self.product_tree.insert("", "end", values=(
-                product['id'],
-                product['name'],
-                product['category_name'] or "Uncategorized",
-                format_currency(product['price']),
-                product['stock_quantity']
-            ))
+        self.product_filters = (self.search_var.get(), self.category_filter_var.get())
+        
+        # Get the first page of products from database
+        self.product_pager.reset()
+    
+    def fetch_products_page(self, filters, after):
+        """Query one page of products matching the filters (runs on a database worker thread)"""
+        search_term, category_filter = filters
+        
+        # Get category ID
+        category_id = self.db.get_category_id(category_filter) if category_filter else None
+        
+        return self.db.get_products_page(category_id, search_term or None, after)
+    
+    def insert_product(self, product):
+        """Add one loaded product to the treeview"""
+        self.product_tree.insert("", "end", values=(
+            product['id'],
+            product['name'],
+            product['category_name'] or "Uncategorized",
+            format_currency(product['price']),
+            product['stock_quantity']
+        ))
     
     def load_categories(self):
         """Load categories for comboboxes"""
-        self.db.connect()
-        self.db.cursor.execute("SELECT name FROM categories ORDER BY name")
-        categories = self.db.cursor.fetchall()
-        self.db.disconnect()
-        
+        run_async(self.category_combobox,
+                  self.db.get_all_categories_async(), self.display_categories, key="categories")
+    
+    def display_categories(self, categories):
+        """Fill the category comboboxes"""
         category_names = [""] + [category['name'] for category in categories]
         self.category_combobox['values'] = category_names
         self.category_filter['values'] = category_names
@@ -273,16 +245,16 @@ class ProductManagement:
         product_id = item['values'][0]
         
         # Load product details
-        self.db.connect()
-        self.db.cursor.execute('''
+        future = self.db.fetch_one_async('''
         SELECT p.*, c.name as category_name
         FROM products p
         LEFT JOIN categories c ON p.category_id = c.id
         WHERE p.id = %s
         ''', (product_id,))
-        product = self.db.cursor.fetchone()
-        self.db.disconnect()
-        
+        run_async(self.product_tree, future, self.display_product_details, key="product_details")
+    
+    def display_product_details(self, product):
+        """Fill the product form with the selected product"""
         if not product:
             return
         
@@ -292,6 +264,8 @@ class ProductManagement:
         self.category_var.set(product['category_name'] or "")
         self.price_var.set(product['price'])
         self.stock_var.set(product['stock_quantity'])
+        # Stock edits are saved as a change from this, checked against its version
+        self.loaded_stock = (product['stock_quantity'], product['stock_version'])
         
         # Update description
         self.description_text.delete(1.0, tk.END)
@@ -300,8 +274,9 @@ class ProductManagement:
         
         # Update image
         self.image_path_var.set(product['image_path'] or "")
+        self.image_name_var.set(product['image_name'] or "")
         if product['image_path'] and os.path.exists(product['image_path']):
-            self.image_label.config(text=os.path.basename(product['image_path']))
+            self.image_label.config(text=product['image_name'] or os.path.basename(product['image_path']))
             self.display_image(product['image_path'])
         else:
             self.image_label.config(text="No image selected")
@@ -314,8 +289,10 @@ class ProductManagement:
         self.category_var.set("")
         self.price_var.set("")
         self.stock_var.set("")
+        self.loaded_stock = None
         self.description_text.delete(1.0, tk.END)
         self.image_path_var.set("")
+        self.image_name_var.set("")
         self.image_label.config(text="No image selected")
         self.image_preview.config(image=None, text="No image")
     
@@ -325,41 +302,58 @@ class ProductManagement:
         image_path = filedialog.askopenfilename(filetypes=filetypes)
         
         if image_path:
-            # Create product_images directory if it doesn't exist
-            images_dir = os.path.join(os.getcwd(), "images", "product_images")
-            os.makedirs(images_dir, exist_ok=True)
-            
-            # Copy image to product_images directory
-            filename = os.path.basename(image_path)
-            new_path = os.path.join(images_dir, filename)
-            
-            # If file already exists, add a timestamp to make it unique
-            if os.path.exists(new_path) and image_path != new_path:
-                import time
-                name, ext = os.path.splitext(filename)
-                filename = f"{name}_{int(time.time())}{ext}"
-                new_path = os.path.join(images_dir, filename)
-            
-            # Only copy if it's not already in the right location
-            if image_path != new_path:
-                import shutil
-                shutil.copy2(image_path, new_path)
-            
-            self.image_path_var.set(new_path)
-            self.image_label.config(text=filename)
-            self.display_image(new_path)
+            self.image_label.config(text=os.path.basename(image_path))
+            self.image_preview.config(image="", text="Loading...")
+            future = self.db.submit(self.import_image, image_path)
+            run_async(self.image_preview, future,
+                      lambda stored_path: self.image_imported(stored_path, os.path.basename(image_path)),
+                      self.image_failed, key="image")
+    
+    def import_image(self, image_path):
+        """Store the chosen file and render its thumbnails (runs on a database worker thread)"""
+        # The same picture chosen for many products is stored once
+        stored_path = self.db.import_image(image_path)
+        thumbnails.thumbnail_store().prepare(stored_path)
+        return stored_path
+    
+    def image_imported(self, stored_path, image_name):
+        self.image_path_var.set(stored_path)
+        self.image_name_var.set(image_name)
+        self.display_image(stored_path)
     
     def display_image(self, image_path):
         """Display image in the preview label"""
         try:
-            img = Image.open(image_path)
-            img = img.resize((150, 150), Image.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
-            self.image_preview.config(image=photo, text="")
-            self.image_preview.image = photo  # Keep a reference
+            photo = thumbnails.photo_cache().cached(image_path, thumbnails.PREVIEW_SIZE)
+        except OSError as e:
+            self.image_failed(e)
+            return
+        if photo is not None:
+            self.show_preview(photo)
+            return
+        
+        # Hash and (the first time) resize the full-size file on a worker thread
+        self.image_preview.config(image="", text="Loading...")
+        future = self.db.submit(thumbnails.thumbnail_store().render, image_path, thumbnails.PREVIEW_SIZE)
+        run_async(self.image_preview, future, lambda path: self.thumbnail_ready(image_path, path),
+                  self.image_failed, key="image")
+    
+    def thumbnail_ready(self, image_path, thumbnail_path):
+        """Show a rendered thumbnail, unless another product has been selected meanwhile"""
+        if self.image_path_var.get() != image_path:
+            return
+        try:
+            self.show_preview(thumbnails.photo_cache().load(thumbnail_path, thumbnails.PREVIEW_SIZE))
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to load image: {e}")
-            self.image_preview.config(image=None, text="Failed to load image")
+            self.image_failed(e)
+    
+    def show_preview(self, photo):
+        self.image_preview.config(image=photo, text="")
+        self.image_preview.image = photo  # Keep a reference
+    
+    def image_failed(self, error):
+        messagebox.showerror("Error", f"Failed to load image: {error}")
+        self.image_preview.config(image="", text="Failed to load image")
     
     def save_product(self):
         """Save product to database"""
@@ -370,6 +364,7 @@ class ProductManagement:
         stock_str = self.stock_var.get().strip()
         description = self.description_text.get(1.0, tk.END).strip()
         image_path = self.image_path_var.get()
+        image_name = self.image_name_var.get() or None
         
         # Basic validation
         if not name:
@@ -392,40 +387,67 @@ class ProductManagement:
             messagebox.showerror("Error", "Invalid stock quantity")
             return
         
-        # Get category ID
-        category_id = None
-        if category:
-            self.db.connect()
-            self.db.cursor.execute("SELECT id FROM categories WHERE name = %s", (category,))
-            category_result = self.db.cursor.fetchone()
-            self.db.disconnect()
-            
-            if category_result:
-                category_id = category_result['id']
-        
         # Save to database
         product_id = self.product_id_var.get()
+        future = self.db.submit(
+            self.write_product, product_id, name, description, price, stock, category, image_path, image_name,
+            self.loaded_stock
+        )
         
-        try:
-            if product_id:  # Update existing product
-                self.db.update_product(
-                    product_id, name, description, price, stock, category_id, image_path
-                )
-                messagebox.showinfo("Success", "Product updated successfully")
-            else:  # Add new product
-                self.db.add_product(
-                    name, description, price, stock, category_id, image_path
-                )
-                messagebox.showinfo("Success", "Product added successfully")
-            
-            # Refresh product list
-            self.load_products()
-            
-            # Clear form
-            self.add_new_product()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save product: {e}")
+        self.save_button.config(state=tk.DISABLED)
+        run_async(self.save_button, future, self.product_saved, self.product_save_failed)
+    
+    def write_product(self, product_id, name, description, price, stock, category, image_path, image_name,
+                      loaded_stock):
+        """Insert or update a product (runs on a database worker thread)"""
+        # Get category ID
+        category_id = self.db.get_category_id(category) if category else None
+        
+        if product_id:  # Update existing product
+            # The stock edit is applied as a change to the stock the form loaded,
+            # and rejected if a sale or adjustment has changed it since
+            loaded_quantity, loaded_version = loaded_stock
+            if stock != loaded_quantity:
+                self.db.adjust_stock(product_id, stock - loaded_quantity, loaded_version, note="Product edit")
+            self.db.update_product(
+                product_id, name, description, price, category_id, image_path, image_name
+            )
+            return "Product updated successfully"
+        
+        # Add new product
+        self.db.add_product(
+            name, description, price, stock, category_id, image_path, image_name
+        )
+        return "Product added successfully"
+    
+    def product_saved(self, message):
+        """Refresh the list and clear the form after a save"""
+        self.save_button.config(state=tk.NORMAL)
+        messagebox.showinfo("Success", message)
+        
+        # Refresh product list
+        self.load_products()
+        
+        # Clear form
+        self.add_new_product()
+    
+    def product_save_failed(self, error):
+        self.save_button.config(state=tk.NORMAL)
+        conflicts = error.conflicts if isinstance(error, StockConflictError) else {}
+        conflict = next(iter(conflicts.values()), None)
+        if conflict is None or conflict[0] != "changed":
+            messagebox.showerror("Error", f"Failed to save product: {error}")
+            return
+        
+        # Nothing was saved; show the current stock so the edit can be checked and saved again
+        _, stock, version = conflict
+        self.stock_var.set(stock)
+        self.loaded_stock = (stock, version)
+        messagebox.showerror(
+            "Stock Changed",
+            f"The stock of this product has changed to {stock} since it was opened. "
+            f"Check the stock and save again."
+        )
     
     def delete_product(self):
         """Delete selected product"""
@@ -446,10 +468,13 @@ class ProductManagement:
         )
         
         if confirm:
-            try:
-                self.db.delete_product(product_id)
-                messagebox.showinfo("Success", "Product deleted successfully")
-                self.load_products()
-                self.add_new_product()  # Clear form
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to delete product: {e}")
+            run_async(self.product_tree, self.db.delete_product_async(product_id),
+                      self.product_deleted, self.product_delete_failed)
+    
+    def product_deleted(self, _):
+        messagebox.showinfo("Success", "Product deleted successfully")
+        self.load_products()
+        self.add_new_product()  # Clear form
+    
+    def product_delete_failed(self, error):
+        messagebox.showerror("Error", f"Failed to delete product: {error}")
@@ -0,0 +1,73 @@
+from functools import lru_cache
+
+
+class Query:
+    """Composable, parameterised SELECT.
+
+    Start from the SELECT ... FROM ... text, then add filters, ordering and a
+    limit; compile() returns (sql, params). Values only ever travel as
+    parameters, and queries of the same shape compile to the same cached
+    statement text. fetch_all() runs that text as a server-side prepared
+    statement from the connection's statement cache, so a refresh with
+    different filter values reuses the statement MySQL has already parsed.
+    """
+
+    def __init__(self, select):
+        self.select = select
+        self.conditions = []
+        self.params = []
+        self.ordering = ()
+        self.row_limit = None
+
+    def where(self, condition, *params):
+        """Add a condition, ANDed with the others, and the values for its placeholders"""
+        self.conditions.append(condition)
+        self.params.extend(params)
+        return self
+
+    def where_any(self, conditions, *params):
+        """Add a group of conditions ORed together"""
+        return self.where("(" + " OR ".join(conditions) + ")", *params)
+
+    def order_by(self, *columns):
+        """Sort by columns, e.g. order_by("p.stock_quantity", "p.name DESC")"""
+        self.ordering = columns
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def compile(self):
+        """Return (sql, params)"""
+        sql = _compile(self.select, tuple(self.conditions), tuple(self.ordering), self.row_limit is not None)
+        params = list(self.params)
+        if self.row_limit is not None:
+            params.append(self.row_limit)
+        return sql, params
+
+    def fetch_all(self, db, replica=False):
+        return db.fetch_prepared(*self.compile(), replica=replica)
+
+    def fetch_all_async(self, db, replica=False):
+        return db.fetch_prepared_async(*self.compile(), replica=replica)
+
+
+# Returns the same string object for the same shape, which is also the key
+# of the per-connection prepared statement cache
+@lru_cache(maxsize=512)
+def _compile(select, conditions, ordering, limited):
+    sql = " ".join(select.split())
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    if ordering:
+        sql += " ORDER BY " + ", ".join(ordering)
+    if limited:
+        sql += " LIMIT %s"
+    return sql
+
+
+def compile_cache_stats():
+    """Return hit/miss counts of the compiled statement cache"""
+    info = _compile.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "statements": info.currsize}
@@ -0,0 +1,75 @@
+"""Check that the application's hot queries are served by indexes.
+
+Run with ``python -m src.query_plans``. Every query below is EXPLAINed and the
+check fails if any table in the plan is read with a full table scan
+(``type = ALL``). Run it against a realistically sized database: on a handful
+of rows MySQL may legitimately prefer a scan over an index.
+
+Unfiltered listings and ``LIKE '%term%'`` searches read every row by design
+and are not listed here, and neither are the low-stock lists: they are served
+from the in-process LowStockIndex, whose only query is a full load.
+"""
+import sys
+from datetime import date, timedelta
+from src.database import Database
+
+_START = date.today() - timedelta(days=30)
+_END = date.today() + timedelta(days=1)
+
+# (name, sql, params) for each query that should be index-driven, taken from
+# the Database's own statements and query builders so they can't drift
+HOT_QUERIES = [
+    ("Database.get_product", Database._PRODUCT_BY_ID_QUERY, (1,)),
+    ("Database.get_all_products(category_id)", *Database._all_products_query(1)),
+    ("Database.get_order_details (order)", Database._ORDER_BY_ID_QUERY, (1,)),
+    ("Database.get_order_details (items)", Database._ORDER_ITEMS_QUERY, (1,)),
+    ("Database.get_all_orders(status)", *Database._all_orders_query("Completed")),
+    ("Database.get_sales_report", Database._SALES_REPORT_QUERY, (_START, _END)),
+    ("Database.get_product_sales_report", Database._PRODUCT_SALES_REPORT_QUERY, (_START, _END)),
+    ("Database.get_orders_between", Database._ORDERS_BETWEEN_QUERY, (_START, _END)),
+    ("Database.get_product_revenue", Database._PRODUCT_REVENUE_QUERY, (_START, _END)),
+    ("Database.get_product_revenue(category_id)", Database._PRODUCT_REVENUE_BY_CATEGORY_QUERY,
+     (_START, _END, 1)),
+    ("Database.get_inventory_report (out of stock)",
+     *Database._inventory_report_query(stock_status="Out of Stock").compile()),
+    ("Database.get_stock_levels(category_id)", *Database._stock_levels_query(1).compile()),
+    ("Database.get_orders_page (seek)", *Database._orders_page_query(after=(_START, 1)).compile()),
+    ("Database.get_orders_page(status) (seek)",
+     *Database._orders_page_query("Completed", after=(_START, 1)).compile()),
+    ("Database.get_products_page (seek)", *Database._products_page_query(after=("M", 1)).compile()),
+    ("Database.get_customers_page (seek)", *Database._customers_page_query(after=("M", 1)).compile()),
+    ("Database.count_customer_orders", Database._CUSTOMER_ORDER_COUNT_QUERY, (1,)),
+]
+
+
+def explain(db, sql, params=None):
+    """Return the EXPLAIN rows for a query"""
+    return db.fetch_all("EXPLAIN " + sql, params)
+
+
+def find_full_scans(db, queries=None):
+    """Return (query name, table, estimated rows) for every full table scan in the plans"""
+    full_scans = []
+    for name, sql, params in queries or HOT_QUERIES:
+        for row in explain(db, sql, params):
+            if row['type'] == 'ALL':
+                full_scans.append((name, row['table'], row['rows']))
+    return full_scans
+
+
+def main():
+    db = Database()
+    full_scans = find_full_scans(db)
+    db.close()
+
+    if not full_scans:
+        print(f"OK: {len(HOT_QUERIES)} queries checked, no full table scans")
+        return 0
+
+    for name, table, rows in full_scans:
+        print(f"FULL SCAN: {name} reads table '{table}' (~{rows} rows)")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
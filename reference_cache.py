@@ -0,0 +1,77 @@
+import threading
+import time
+
+
+class ReferenceCache:
+    """Read-through cache for small, rarely changing reference tables.
+
+    Each entry is loaded by its loader on first use and served from memory
+    until it is older than ttl seconds or explicitly invalidated. Writers
+    must call invalidate() after changing the underlying rows.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        # One lock per name, held while that entry loads
+        self._load_locks = {}
+        # Bumped by invalidate() (per name, or for all), so a load that
+        # started before the invalidation isn't stored
+        self._generation = 0
+        self._name_generations = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, loader):
+        """Return the cached value for name, calling loader() if it is missing or stale"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and not self._expired(entry):
+                self.hits += 1
+                return entry[1]
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Loaded under the entry's own lock, so concurrent readers of this name
+        # wait for one query instead of each running it, and a slow loader
+        # doesn't hold up any other name
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None and not self._expired(entry):
+                    self.hits += 1
+                    return entry[1]
+                self.misses += 1
+                generation = self._generation_of(name)
+
+            value = loader()
+            with self._lock:
+                if generation == self._generation_of(name):
+                    self._entries[name] = (time.monotonic(), value)
+            return value
+
+    def invalidate(self, name=None):
+        """Drop one entry, or every entry when name is None"""
+        with self._lock:
+            if name is None:
+                self._generation += 1
+                self._entries.clear()
+            else:
+                self._name_generations[name] = self._name_generations.get(name, 0) + 1
+                self._entries.pop(name, None)
+
+    def stats(self):
+        """Return hit/miss counters and the cached entry names"""
+        with self._lock:
+            return {
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": sorted(self._entries)
+            }
+
+    def _generation_of(self, name):
+        return self._generation, self._name_generations.get(name, 0)
+
+    def _expired(self, entry):
+        return self.ttl is not None and time.monotonic() - entry[0] > self.ttl
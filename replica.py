@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaRouter:
+    """Decides whether a read may be served by the read replica.
+
+    A read goes to the replica only when it is reachable, replicating, no
+    more than max_lag seconds behind, and has applied this process's last
+    write (read-your-writes). Otherwise it goes to the primary. The lag is
+    checked at most every lag_check_interval seconds, and after a failure
+    the replica is skipped for retry_interval seconds.
+
+    Read-your-writes uses GTIDs: after each write the primary's executed GTID
+    set is noted, and caught_up() checks it against the replica's with
+    GTID_SUBSET before a read is served there. Seconds_Behind_Source can't be
+    used for this, as it is whole seconds and reads 0 while the replica is
+    still applying the last event. Without GTIDs on the primary, reads stay
+    on the primary for write_window seconds after every write.
+    """
+
+    def __init__(self, pool, max_lag=30, lag_check_interval=5, retry_interval=30, write_window=5):
+        self.pool = pool
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self.retry_interval = retry_interval
+        self.write_window = write_window
+        self._lock = threading.Lock()
+        self._last_write = float("-inf")
+        # Primary's gtid_executed after our latest write, and the write it belongs to
+        self._write_gtids = None
+        self._write_count = 0
+        self._gtids_write = 0
+        self._lag = None
+        self._lag_checked_at = float("-inf")
+        self._down_until = float("-inf")
+        self._stats = {"replica_reads": 0, "primary_reads": 0, "failures": 0, "behind_writes": 0}
+
+    def note_write(self, conn):
+        """Record that the primary just committed a write on conn"""
+        with self._lock:
+            self._write_count += 1
+            write = self._write_count
+            self._last_write = time.monotonic()
+
+        try:
+            gtids = self._executed_gtids(conn)
+        except Exception as e:
+            logger.warning("Couldn't read the primary's GTIDs, keeping reads on the primary: %s", e)
+            gtids = None
+
+        with self._lock:
+            # A later write's GTID set includes this one; never go back to an older set
+            if write > self._gtids_write:
+                self._gtids_write = write
+                self._write_gtids = gtids or None
+
+    def usable(self):
+        """Return True if a read may go to the replica right now (then check caught_up())"""
+        now = time.monotonic()
+        if now < self._down_until:
+            return False
+
+        lag = self.lag()
+        if lag is None or lag > self.max_lag:
+            return False
+
+        with self._lock:
+            if self._write_gtids is None:
+                # No GTIDs to check against: wait out a fixed window instead
+                return now - self._last_write > self.write_window
+        return True
+
+    def caught_up(self, cursor):
+        """Return True if the replica behind cursor has applied our latest write"""
+        with self._lock:
+            gtids = self._write_gtids
+        if gtids is None:
+            return True
+
+        cursor.execute("SELECT GTID_SUBSET(%s, @@GLOBAL.gtid_executed) AS caught_up", (gtids,))
+        row = cursor.fetchone()
+        caught_up = bool(row["caught_up"] if isinstance(row, dict) else row[0])
+        if not caught_up:
+            with self._lock:
+                self._stats["behind_writes"] += 1
+        return caught_up
+
+    def lag(self):
+        """Return the replica's lag in seconds, or None if it is not replicating"""
+        with self._lock:
+            if time.monotonic() - self._lag_checked_at < self.lag_check_interval:
+                return self._lag
+            self._lag_checked_at = time.monotonic()
+
+        try:
+            lag = self._query_lag()
+        except Exception as e:
+            self.mark_down(e)
+            return None
+
+        with self._lock:
+            self._lag = lag
+        return lag
+
+    def mark_down(self, error):
+        """Skip the replica for retry_interval seconds after a failure"""
+        logger.warning("Read replica unavailable, using the primary: %s", error)
+        with self._lock:
+            self._down_until = time.monotonic() + self.retry_interval
+            self._lag = None
+            self._stats["failures"] += 1
+
+    def record_read(self, on_replica):
+        with self._lock:
+            self._stats["replica_reads" if on_replica else "primary_reads"] += 1
+
+    def stats(self):
+        """Return routing counters and the last known lag"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["lag"] = self._lag
+            stats["down"] = time.monotonic() < self._down_until
+        stats["pool"] = self.pool.stats()
+        return stats
+
+    def _query_lag(self):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(dictionary=True, buffered=True)
+            try:
+                try:
+                    cursor.execute("SHOW REPLICA STATUS")
+                except Exception:
+                    # MySQL before 8.0.22 only knows the old name
+                    cursor.execute("SHOW SLAVE STATUS")
+                row = cursor.fetchone()
+            finally:
+                cursor.close()
+
+        if not row:
+            return None
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        # NULL while the replication threads are stopped
+        return float(lag) if lag is not None else None
+
+    @staticmethod
+    def _executed_gtids(conn):
+        cursor = conn.cursor(buffered=True)
+        try:
+            cursor.execute("SELECT @@GLOBAL.gtid_executed")
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        conn.commit()
+        # An empty set when gtid_mode is OFF
+        return row[0] if row else None
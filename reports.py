@@ -110,7 +110,7 @@
         
         # Low stock threshold
         ttk.Label(filter_frame, text="Low Stock Threshold:").grid(row=1, column=0, sticky="w", pady=5)
-        self.inv_threshold_var = tk.StringVar(value="10")
+        self.inv_threshold_var = tk.StringVar(value=str(self.db.low_stock.threshold))
         threshold_entry = ttk.Entry(filter_frame, textvariable=self.inv_threshold_var, width=10)
         threshold_entry.grid(row=1, column=1, sticky="w", pady=5)
         
@@ -173,12 +173,8 @@
     
     def load_categories_for_report(self):
         """Load categories for report filters"""
-        self.db.connect()
-        self.db.cursor.execute("SELECT id, name FROM categories ORDER BY name")
-        categories = self.db.cursor.fetchall()
-        self.db.disconnect()
-        
-        self.categories = {c['name']: c['id'] for c in categories}
+        # Served from the Database's reference cache after the first screen has loaded it
+        self.categories = self.db.get_category_ids()
         category_names = ["All Categories"] + list(self.categories.keys())
         
         self.prod_category_combobox['values'] = category_names
@@ -262,10 +258,6 @@
     
     def generate_sales_report(self):
         """Generate sales report based on date range"""
-        # Clear existing items
-        for item in self.sales_tree.get_children():
-            self.sales_tree.delete(item)
-        
         # Validate date range
         try:
             start_date = datetime.strptime(self.start_date_var.get(), "%Y-%m-%d").date()
@@ -277,17 +269,17 @@
             messagebox.showerror("Error", f"Invalid date format: {e}")
             return
         
-        # Get orders within date range
-        self.db.connect()
-        self.db.cursor.execute('''
-        SELECT o.id, o.order_date, o.total_amount, o.status, c.name as customer_name
-        FROM orders o
-        LEFT JOIN customers c ON o.customer_id = c.id
-        WHERE DATE(o.order_date) BETWEEN %s AND %s
-        ORDER BY o.order_date DESC
-        ''', (start_date, end_date))
-        orders = self.db.cursor.fetchall()
-        self.db.disconnect()
+        # Get orders within date range (half-open range so the order_date index is usable);
+        # reports read from the replica when one is configured and up to date
+        future = self.db.get_orders_between_async(start_date, end_date + timedelta(days=1))
+        show_loading(self.sales_tree)
+        run_async(self.sales_tree, future, self.display_sales_report, key="sales_report")
+    
+    def display_sales_report(self, orders):
+        """Show sales report results and summary"""
+        # Clear existing items
+        for item in self.sales_tree.get_children():
+            self.sales_tree.delete(item)
         
         # Insert orders into treeview
         total_sales = 0
@@ -314,10 +306,6 @@
     
     def generate_product_sales_report(self):
         """Generate product sales report based on date range and category"""
-        # Clear existing items
-        for item in self.product_sales_tree.get_children():
-            self.product_sales_tree.delete(item)
-        
         # Validate date range
         try:
             start_date = datetime.strptime(self.prod_start_date_var.get(), "%Y-%m-%d").date()
@@ -334,40 +322,16 @@
         category_id = self.categories.get(category) if category != "All Categories" else None
         
         # Get product sales within date range
-        self.db.connect()
-        
-        if category_id:
-            self.db.cursor.execute('''
-            SELECT p.id, p.name, c.name as category_name, 
-                   SUM(oi.quantity) as total_quantity,
-                   SUM(oi.quantity * oi.price) as total_revenue
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.id
-            JOIN products p ON oi.product_id = p.id
-            LEFT JOIN categories c ON p.category_id = c.id
-            WHERE DATE(o.order_date) BETWEEN %s AND %s
-            AND p.category_id = %s
-            AND o.status = 'Completed'
-            GROUP BY p.id
-            ORDER BY total_revenue DESC
-            ''', (start_date, end_date, category_id))
-        else:
-            self.db.cursor.execute('''
-            SELECT p.id, p.name, c.name as category_name, 
-                   SUM(oi.quantity) as total_quantity,
-                   SUM(oi.quantity * oi.price) as total_revenue
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.id
-            JOIN products p ON oi.product_id = p.id
-            LEFT JOIN categories c ON p.category_id = c.id
-            WHERE DATE(o.order_date) BETWEEN %s AND %s
-            AND o.status = 'Completed'
-            GROUP BY p.id
-            ORDER BY total_revenue DESC
-            ''', (start_date, end_date))
-        
-        products = self.db.cursor.fetchall()
-        self.db.disconnect()
+        future = self.db.get_product_revenue_async(start_date, end_date + timedelta(days=1), category_id)
+        
+        show_loading(self.product_sales_tree)
+        run_async(self.product_sales_tree, future, self.display_product_sales_report, key="product_sales")
+    
+    def display_product_sales_report(self, products):
+        """Show product sales report results"""
+        # Clear existing items
+        for item in self.product_sales_tree.get_children():
+            self.product_sales_tree.delete(item)
         
         # Insert products into treeview
         for product in products:
@@ -381,10 +345,6 @@
     
     def generate_inventory_report(self):
         """Generate inventory report based on filters"""
-        # Clear existing items
-        for item in self.inventory_tree.get_children():
-            self.inventory_tree.delete(item)
-        
         # Get filters
         category = self.inv_category_var.get()
         category_id = self.categories.get(category) if category != "All Categories" else None
@@ -399,38 +359,20 @@
             messagebox.showerror("Error", "Invalid threshold")
             return
         
-        # Get inventory data
-        self.db.connect()
-        
-        query = '''
-        SELECT p.id, p.name, p.price, p.stock_quantity, c.name as category_name
-        FROM products p
-        LEFT JOIN categories c ON p.category_id = c.id
-        '''
-        
-        params = []
-        where_clauses = []
-        
-        if category_id:
-            where_clauses.append("p.category_id = %s")
-            params.append(category_id)
-        
-        if stock_status == "In Stock":
-            where_clauses.append("p.stock_quantity > 0")
-        elif stock_status == "Low Stock":
-            where_clauses.append("p.stock_quantity > 0 AND p.stock_quantity <= %s")
-            params.append(threshold)
-        elif stock_status == "Out of Stock":
-            where_clauses.append("p.stock_quantity = 0")
-        
-        if where_clauses:
-            query += " WHERE " + " AND ".join(where_clauses)
-        
-        query += " ORDER BY p.name"
+        if stock_status == "Low Stock":
+            # Served by the low-stock index rather than a scan of products
+            future = self.db.get_low_stock_products_async(threshold, min_stock=1, category_id=category_id)
+        else:
+            future = self.db.get_inventory_report_async(category_id, stock_status)
         
-        self.db.cursor.execute(query, params)
-        products = self.db.cursor.fetchall()
-        self.db.disconnect()
+        show_loading(self.inventory_tree)
+        run_async(self.inventory_tree, future, self.display_inventory_report, key="inventory_report")
+    
+    def display_inventory_report(self, products):
+        """Show inventory report results and summary"""
+        # Clear existing items
+        for item in self.inventory_tree.get_children():
+            self.inventory_tree.delete(item)
         
         # Insert products into treeview
         total_value = 0
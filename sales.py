@@ -1,6 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
+from src.background import run_async
+from src.database import InsufficientStockError
+from src.order_journal import LOCK_WAIT_TIMEOUT
+from src.paging import InfiniteScroll
 from src.utils import format_currency, format_date
 
 class Sales:
@@ -8,6 +12,14 @@ class Sales:
         self.parent = parent
         self.db = db
         
+        # Lookup tables, filled in when their background loads complete
+        self.customers = {}
+        self.categories = {}
+        self.products = {}
+        
+        # Status the orders list is filtered by while it pages
+        self.status_filter = None
+        
         # Create main frame
         self.frame = ttk.Frame(parent)
         self.frame.pack(fill=tk.BOTH, expand=True)
@@ -149,8 +161,8 @@ class Sales:
         ttk.Label(total_frame, textvariable=self.total_var, font=("Arial", 11, "bold")).pack(side=tk.RIGHT)
         
         # Complete order button
-        complete_button = ttk.Button(order_frame, text="Complete Order", command=self.complete_order)
-        complete_button.pack(fill=tk.X)
+        self.complete_button = ttk.Button(order_frame, text="Complete Order", command=self.complete_order)
+        self.complete_button.pack(fill=tk.X)
         
         # Initialize order items list and total
         self.order_items = []
@@ -209,6 +221,13 @@ class Sales:
         self.orders_tree.pack(fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.orders_tree.yview)
         
+        # Orders are loaded a page at a time as the list is scrolled
+        self.orders_pager = InfiniteScroll(
+            self.orders_tree, scrollbar,
+            lambda after: self.db.get_orders_page_async(self.status_filter, after),
+            self.insert_order, key="orders"
+        )
+        
         # Bind double-click event
         self.orders_tree.bind("<Double-1>", self.view_order_details)
         
@@ -229,45 +248,47 @@ class Sales:
     
     def load_customers(self):
         """Load customers for combobox"""
-        self.db.connect()
-        self.db.cursor.execute("SELECT id, name FROM customers ORDER BY name")
-        customers = self.db.cursor.fetchall()
-        self.db.disconnect()
-        
+        run_async(self.customer_combobox,
+                  self.db.fetch_all_async("SELECT id, name FROM customers ORDER BY name"),
+                  self.display_customers, key="customers")
+    
+    def display_customers(self, customers):
+        """Fill the customer combobox"""
         self.customers = {f"{c['name']} (ID: {c['id']})": c['id'] for c in customers}
         self.customer_combobox['values'] = list(self.customers.keys())
     
     def load_categories(self):
         """Load categories for combobox"""
-        self.db.connect()
-        self.db.cursor.execute("SELECT id, name FROM categories ORDER BY name")
-        categories = self.db.cursor.fetchall()
-        self.db.disconnect()
-        
-        self.categories = {c['name']: c['id'] for c in categories}
+        run_async(self.category_combobox,
+                  self.db.get_category_ids_async(), self.display_categories, key="categories")
+    
+    def display_categories(self, categories):
+        """Fill the category combobox"""
+        self.categories = categories
         category_names = [""] + list(self.categories.keys())
         self.category_combobox['values'] = category_names
     
     def load_products(self, category_id=None):
         """Load products for combobox, optionally filtered by category"""
-        self.db.connect()
         if category_id:
-            self.db.cursor.execute('''
+            future = self.db.fetch_all_async('''
             SELECT id, name, price, stock_quantity
             FROM products
             WHERE category_id = %s AND stock_quantity > 0
             ORDER BY name
             ''', (category_id,))
         else:
-            self.db.cursor.execute('''
+            future = self.db.fetch_all_async('''
             SELECT id, name, price, stock_quantity
             FROM products
             WHERE stock_quantity > 0
             ORDER BY name
             ''')
-        products = self.db.cursor.fetchall()
-        self.db.disconnect()
         
+        run_async(self.product_combobox, future, self.display_products, key="products")
+    
+    def display_products(self, products):
+        """Fill the product combobox"""
         self.products = {p['name']: (p['id'], p['price'], p['stock_quantity']) for p in products}
         self.product_combobox['values'] = list(self.products.keys())
     
@@ -413,86 +434,88 @@ class Sales:
         # Get customer ID
         customer_id = self.customers[customer_selection]
         
-        # Calculate total
-        total_amount = sum(item[4] for item in self.order_items)
+        # Order, items and stock updates are written in one transaction, or
+        # journaled for later if the database can't be reached
+        future = self.db.checkout_async(customer_id, [
+            (product_id, quantity, price) for product_id, _, quantity, price, _ in self.order_items
+        ])
         
-        try:
-            # Create order
-            self.db.connect()
-            
-            # Insert order
-            self.db.cursor.execute('''
-            INSERT INTO orders (customer_id, total_amount, status)
-            VALUES (%s, %s, %s)
-            ''', (customer_id, total_amount, "Pending"))
-            
-            order_id = self.db.cursor.lastrowid
-            
-            # Insert order items
-            for product_id, _, quantity, price, _ in self.order_items:
-                self.db.cursor.execute('''
-                INSERT INTO order_items (order_id, product_id, quantity, price)
-                VALUES (%s, %s, %s, %s)
-                ''', (order_id, product_id, quantity, price))
-                
-                # Update product stock
-                self.db.cursor.execute('''
-                UPDATE products
-                SET stock_quantity = stock_quantity - %s
-                WHERE id = %s
-                ''', (quantity, product_id))
-            
-            self.db.conn.commit()
-            self.db.disconnect()
-            
+        # Block double submission while the order is being saved
+        self.complete_button.config(state=tk.DISABLED, text="Saving order...")
+        run_async(self.complete_button, future, self.order_completed, self.order_failed)
+    
+    def order_completed(self, order_id):
+        """Reset the new order form after an order was saved"""
+        self.complete_button.config(state=tk.NORMAL, text="Complete Order")
+        if order_id is None:
+            messagebox.showwarning(
+                "Saved Offline",
+                "The database is unavailable. The order was saved locally and will be "
+                "submitted automatically once the connection is back."
+            )
+        else:
             messagebox.showinfo("Success", f"Order #{order_id} created successfully")
-            
-            # Clear form
-            self.customer_var.set("")
-            self.product_var.set("")
-            self.category_var.set("")
-            self.price_var.set("")
-            self.quantity_var.set("1")
-            self.stock_label.config(text="Available Stock: 0")
-            
-            # Clear order items
-            for item in self.order_tree.get_children():
-                self.order_tree.delete(item)
-            
-            self.order_items = []
-            self.update_total()
-            
-            # Reload products (stock has changed)
+        
+        # Clear form
+        self.customer_var.set("")
+        self.product_var.set("")
+        self.category_var.set("")
+        self.price_var.set("")
+        self.quantity_var.set("1")
+        self.stock_label.config(text="Available Stock: 0")
+        
+        # Clear order items
+        for item in self.order_tree.get_children():
+            self.order_tree.delete(item)
+        
+        self.order_items = []
+        self.update_total()
+        
+        # Reload products (stock has changed)
+        self.load_products()
+        
+        # Switch to orders tab
+        self.notebook.select(1)  # Select the second tab (Orders List)
+        self.load_orders()
+    
+    def order_failed(self, error):
+        """Re-enable checkout after a failed order"""
+        self.complete_button.config(state=tk.NORMAL, text="Complete Order")
+        if isinstance(error, InsufficientStockError):
+            # Another till sold the stock since the product list was loaded
+            names = {product_id: name for product_id, name, _, _, _ in self.order_items}
+            lines = "\n".join(
+                f"{names.get(product_id, product_id)}: {requested} requested, {available} available"
+                for product_id, (requested, available) in error.shortages.items()
+            )
+            messagebox.showerror("Not Enough Stock", f"The order was not saved. Not enough stock for:\n{lines}")
             self.load_products()
-            
-            # Switch to orders tab
-            self.notebook.select(1)  # Select the second tab (Orders List)
-            self.load_orders()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to create order: {e}")
+            return
+        if getattr(error, "errno", None) == LOCK_WAIT_TIMEOUT:
+            # Other tills are holding the same products; nothing was saved
+            messagebox.showerror("Products Busy", "The order was not saved because other tills are updating "
+                                                  "the same products. Please try again.")
+            return
+        messagebox.showerror("Error", f"Failed to create order: {error}")
     
     def load_orders(self):
         """Load orders into the treeview"""
-        # Clear existing items
-        for item in self.orders_tree.get_children():
-            self.orders_tree.delete(item)
-        
         # Get status filter
         status = self.status_var.get()
         
-        # Get orders from database
-        orders = self.db.get_all_orders(status if status else None)
-        
-        # Insert orders into treeview
-        for order in orders:
-            self.orders_tree.insert("", "end", values=(
-                order['id'],
-                format_date(order['order_date']),
-                order['customer_name'] or "Unknown",
-                format_currency(order['total_amount']),
-                order['status']
-            ))
+        # Get the first page of orders from database
+        self.status_filter = status if status else None
+        self.orders_pager.reset()
+    
+    def insert_order(self, order):
+        """Add one loaded order to the treeview"""
+        self.orders_tree.insert("", "end", values=(
+            order['id'],
+            format_date(order['order_date']),
+            order['customer_name'] or "Unknown",
+            format_currency(order['total_amount']),
+            order['status']
+        ))
     
     def reset_filters(self):
         """Reset filters and reload orders"""
@@ -510,9 +533,12 @@ class Sales:
         item = self.orders_tree.item(selected_items[0])
         order_id = item['values'][0]
         
-        # Get order details
-        order, order_items = self.db.get_order_details(order_id)
-        
+        # Get order details, then open the window
+        run_async(self.orders_tree, self.db.get_order_details_async(order_id),
+                  lambda details: self.show_order_details(order_id, *details))
+    
+    def show_order_details(self, order_id, order, order_items):
+        """Open a window with the details of an order"""
         if not order:
             messagebox.showerror("Error", "Order not found")
             return
@@ -631,16 +657,21 @@ class Sales:
         def update_status():
             new_status = status_var.get()
             if new_status != current_status:
-                try:
-                    self.db.update_order_status(order_id, new_status)
-                    messagebox.showinfo("Success", f"Order status updated to {new_status}")
-                    status_window.destroy()
-                    self.load_orders()
-                except Exception as e:
-                    messagebox.showerror("Error", f"Failed to update status: {e}")
+                update_button.config(state=tk.DISABLED)
+                run_async(status_window, self.db.update_order_status_async(order_id, new_status),
+                          lambda _: status_updated(new_status), status_failed)
             else:
                 status_window.destroy()
         
+        def status_updated(new_status):
+            messagebox.showinfo("Success", f"Order status updated to {new_status}")
+            status_window.destroy()
+            self.load_orders()
+        
+        def status_failed(error):
+            update_button.config(state=tk.NORMAL)
+            messagebox.showerror("Error", f"Failed to update status: {error}")
+        
         update_button = ttk.Button(status_frame, text="Update", command=update_status)
         update_button.grid(row=1, column=0, pady=10)
         
@@ -19,7 +19,9 @@ class Settings:
             "tax_rate": 0.0,
             "currency": "USD",
             "low_stock_threshold": 10,
-            "backup_path": ""
+            "backup_path": "",
+            "database_backend": "mysql",
+            "sqlite_path": ""
         }
         
         # Load settings
@@ -248,6 +250,8 @@ class Settings:
         self.settings["tax_rate"] = tax_rate
         self.settings["currency"] = self.currency_var.get()
         self.settings["low_stock_threshold"] = threshold
+        # Alerts use the new threshold from the next sale on
+        self.db.low_stock.threshold = threshold
         
         # Save settings
         if self.save_settings():
@@ -0,0 +1,114 @@
+"""Stocktake: import a counted-quantities CSV and correct stock to match.
+
+The CSV needs a header row with a product ID column (``product_id`` or
+``id``) and a count column (``counted``, ``quantity`` or ``count``); other
+columns, such as the name on the count sheet, are ignored. Rows with a blank
+count were not counted and are left alone, and a product listed more than
+once (counted in several places) gets the sum of its counts.
+
+The file is streamed row by row. The diff against the stock on record is
+read in bulk by Database.get_stocktake_variances, and the corrections are
+applied by Database.apply_stocktake as chunked set-based updates in one
+transaction, logged in the inventory ledger with reason 'stocktake'. A
+variance report CSV lists every counted product with its system and counted
+quantities and the variance in units and value.
+"""
+import csv
+from decimal import Decimal
+
+ID_COLUMNS = ("product_id", "id")
+COUNT_COLUMNS = ("counted", "counted_quantity", "quantity", "count")
+
+# Blank count sheet for the counters: no system stock, so the count is blind
+COUNT_SHEET_QUERY = '''
+SELECT p.id AS product_id, p.name, c.name AS category, '' AS counted
+FROM products p
+LEFT JOIN categories c ON p.category_id = c.id
+ORDER BY c.name, p.name
+'''
+
+REPORT_HEADERS = ["product_id", "name", "system_quantity", "counted_quantity", "variance", "variance_value",
+                  "status"]
+
+
+class StocktakeFileError(Exception):
+    """Raised when the CSV can't be read as a stocktake"""
+
+
+def _column(fieldnames, candidates):
+    names = {name.strip().lower(): name for name in fieldnames or []}
+    for candidate in candidates:
+        if candidate in names:
+            return names[candidate]
+    return None
+
+
+def read_counts(path):
+    """Read a counted-quantities CSV; returns ({product_id: counted}, [(line, error)])"""
+    counts = {}
+    errors = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        id_column = _column(reader.fieldnames, ID_COLUMNS)
+        count_column = _column(reader.fieldnames, COUNT_COLUMNS)
+        if id_column is None or count_column is None:
+            raise StocktakeFileError(
+                f"The file needs a product ID column ({', '.join(ID_COLUMNS)}) "
+                f"and a count column ({', '.join(COUNT_COLUMNS)})"
+            )
+
+        for row in reader:
+            counted = (row.get(count_column) or "").strip()
+            if not counted:
+                continue
+            try:
+                product_id = int(row.get(id_column))
+                counted = int(counted)
+                if counted < 0:
+                    raise ValueError("negative count")
+            except (TypeError, ValueError):
+                errors.append((reader.line_num, f"invalid product ID or count: {row.get(id_column)!r}, "
+                                                f"{row.get(count_column)!r}"))
+                continue
+            counts[product_id] = counts.get(product_id, 0) + counted
+    return counts, errors
+
+
+def write_variance_report(path, variances):
+    """Write the variance rows to a CSV file"""
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_HEADERS)
+        for row in variances:
+            writer.writerow([row[name] for name in REPORT_HEADERS])
+
+
+def summarize(variances, errors=()):
+    """Totals for a stocktake, for the confirmation and result messages"""
+    known = [row for row in variances if row['status'] == "ok"]
+    changed = [row for row in known if row['variance']]
+    return {
+        "counted": len(known),
+        "changed": len(changed),
+        "units_over": sum(row['variance'] for row in changed if row['variance'] > 0),
+        "units_short": -sum(row['variance'] for row in changed if row['variance'] < 0),
+        "variance_value": sum((row['variance_value'] for row in changed), Decimal(0)),
+        "unknown_products": len(variances) - len(known),
+        "errors": list(errors),
+    }
+
+
+def import_stocktake(db, path, report_path=None, note=None, dry_run=False):
+    """Read the CSV at path and correct stock to it (or only compare, with dry_run).
+
+    Writes the variance report to report_path when given and returns the
+    summarize() totals.
+    """
+    counts, errors = read_counts(path)
+    if dry_run:
+        variances = db.get_stocktake_variances(counts)
+    else:
+        variances = db.apply_stocktake(counts, note=note)
+    if report_path:
+        write_variance_report(report_path, variances)
+    return summarize(variances, errors)
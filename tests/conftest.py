@@ -0,0 +1,39 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# The repository root is the "src" package the modules import from
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "src" not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        "src", os.path.join(ROOT, "__init__.py"), submodule_search_locations=[ROOT]
+    )
+    sys.modules["src"] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules["src"])
+
+from src.backends import SQLiteBackend  # noqa: E402
+from src.database import Database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A Database on a fresh SQLite file, run from tmp_path with its image store there"""
+    monkeypatch.chdir(tmp_path)
+    database = Database(backend=SQLiteBackend(str(tmp_path / "shop.db")),
+                        image_directory=str(tmp_path / "images" / "store"))
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def product(db):
+    """A product with 5 in stock, priced 10.00"""
+    category_id = db.add_category("Test products")
+    return db.add_product("Moisturiser", "", 10, 5, category_id)
+
+
+@pytest.fixture
+def customer(db):
+    return db.add_customer("Ada", "ada@example.com", "555-0100", "1 Main St")
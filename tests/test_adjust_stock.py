@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+import pytest
+
+from src.database import StockConflictError
+
+
+def stock_and_version(db, product_id):
+    row = db.fetch_one("SELECT stock_quantity, stock_version FROM products WHERE id = %s", (product_id,))
+    return row["stock_quantity"], row["stock_version"]
+
+
+def movements(db, product_id):
+    rows = db.fetch_all("SELECT quantity, reason FROM inventory_movements WHERE product_id = %s ORDER BY id",
+                        (product_id,))
+    return [(row["quantity"], row["reason"]) for row in rows]
+
+
+def test_adjustment_is_applied_and_logged(db, product):
+    _, version = stock_and_version(db, product)
+    assert db.adjust_stock(product, 3, version, note="Delivery") == (8, version + 1)
+    assert movements(db, product) == [(5, "opening"), (3, "adjustment")]
+
+
+def test_stale_version_is_rejected_and_keeps_the_sale(db, product, customer):
+    _, version = stock_and_version(db, product)
+    # A sale lands after the stock was read
+    db.place_order(customer, [(product, 1, Decimal("10.00"))])
+
+    with pytest.raises(StockConflictError) as excinfo:
+        db.adjust_stock(product, 3, version)
+    assert excinfo.value.conflicts == {product: ("changed", 4, version + 1)}
+    assert stock_and_version(db, product) == (4, version + 1)
+    assert movements(db, product) == [(5, "opening"), (-1, "sale")]
+
+
+def test_adjustment_without_version_applies_to_current_stock(db, product, customer):
+    db.place_order(customer, [(product, 1, Decimal("10.00"))])
+    assert db.adjust_stock(product, 3)[0] == 7
+
+
+def test_stock_cannot_go_negative(db, product):
+    with pytest.raises(StockConflictError) as excinfo:
+        db.adjust_stock(product, -6)
+    assert excinfo.value.conflicts[product][0] == "insufficient"
+    assert stock_and_version(db, product)[0] == 5
+
+
+def test_batch_is_all_or_nothing(db, product):
+    category_id = db.get_product(product)["category_id"]
+    other = db.add_product("Shampoo", "", 5, 10, category_id)
+
+    with pytest.raises(StockConflictError) as excinfo:
+        db.adjust_stock_batch([(other, -2, None), (product, -6, None), (product + other, 1, None)])
+    assert excinfo.value.conflicts == {product: ("insufficient", 5, 0), product + other: ("missing", None, None)}
+    assert stock_and_version(db, product)[0] == 5
+    assert stock_and_version(db, other)[0] == 10
+
+    # Deltas for the same product are added together
+    assert db.adjust_stock_batch([(other, -2, None), (other, -3, None), (product, 1, None)]) == 2
+    assert stock_and_version(db, other)[0] == 5
+    assert movements(db, other) == [(10, "opening"), (-5, "adjustment")]
+
+
+def test_product_edit_does_not_overwrite_stock(db, product, customer):
+    row = db.get_product(product)
+    db.place_order(customer, [(product, 1, Decimal("10.00"))])
+
+    db.update_product(product, "Night cream", row["description"], 12, row["category_id"])
+    assert db.get_product(product)["name"] == "Night cream"
+    assert stock_and_version(db, product)[0] == 4
+    assert db.check_stock_ledger() == []
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from src.connection_pool import ConnectionPool, PoolExhaustedError
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.healthy = True
+        self.closed_holding_lock = None
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**kwargs):
+    created = []
+
+    def factory():
+        created.append(FakeConnection())
+        return created[-1]
+
+    checks = []
+
+    def health_check(conn):
+        checks.append(conn)
+        return conn.healthy
+
+    return ConnectionPool(factory, health_check=health_check, **kwargs), created, checks
+
+
+def test_connections_are_reused():
+    pool, created, _ = make_pool()
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert second is first
+    assert len(created) == 1
+    assert pool.stats()["reused"] == 1
+
+
+def test_pool_is_bounded():
+    pool, _, _ = make_pool(max_size=2, acquire_timeout=0.05)
+    held = [pool.acquire(), pool.acquire()]
+    with pytest.raises(PoolExhaustedError):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+    # A release wakes a waiting acquire
+    threading.Timer(0.02, pool.release, (held[0],)).start()
+    assert pool.acquire(timeout=1) is held[0]
+
+
+def test_recently_used_connections_skip_the_health_check():
+    pool, _, checks = make_pool(health_check_idle_time=0.05)
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert checks == []
+
+    pool.release(conn)
+    time.sleep(0.06)
+    assert pool.acquire() is conn
+    assert checks == [conn]
+
+
+def test_unhealthy_connection_is_replaced():
+    pool, created, _ = make_pool(health_check_idle_time=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.healthy = False
+
+    replacement = pool.acquire()
+    assert replacement is not conn
+    assert conn.closed
+    assert len(created) == 2
+    assert pool.stats()["health_check_failures"] == 1
+    assert pool.stats()["size"] == 1
+
+
+def test_idle_connections_are_closed_outside_the_lock():
+    pool, _, _ = make_pool(max_idle_time=0.01)
+    conn = pool.acquire()
+    pool.release(conn)
+    time.sleep(0.02)
+
+    def close():
+        conn.closed_holding_lock = pool._cond._is_owned()
+        conn.closed = True
+
+    conn.close = close
+    assert pool.acquire() is not conn
+    assert conn.closed
+    assert conn.closed_holding_lock is False
+    assert pool.stats()["evicted"] == 1
+
+
+def test_connection_is_discarded_after_an_error_if_broken():
+    pool, _, _ = make_pool()
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            conn.healthy = False
+            raise RuntimeError("query failed")
+    assert conn.closed
+    assert pool.stats()["discarded"] == 1
+    assert pool.stats()["size"] == 0
@@ -0,0 +1,87 @@
+import os
+from datetime import datetime, timedelta
+
+from src.image_store import LEGACY_DIRECTORY, dedupe_product_images
+
+
+def write_file(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+def ref_counts(db):
+    return {row["path"]: row["ref_count"] for row in db.fetch_all("SELECT path, ref_count FROM image_blobs")}
+
+
+def test_same_content_is_stored_once(db, tmp_path):
+    first = db.import_image(write_file(tmp_path / "a" / "shade1.png", b"vendor photo"))
+    second = db.import_image(write_file(tmp_path / "b" / "shade2.png", b"vendor photo"))
+    other = db.import_image(write_file(tmp_path / "c" / "shade3.png", b"another photo"))
+
+    assert second == first != other
+    assert db.images.owns(first)
+    assert db.image_store_stats()["files"] == 2
+
+
+def test_reference_counts_follow_products(db, tmp_path):
+    category_id = db.add_category("Test products")
+    photo = db.import_image(write_file(tmp_path / "photo.png", b"vendor photo"))
+    other = db.import_image(write_file(tmp_path / "other.png", b"another photo"))
+
+    first = db.add_product("Lipstick 01", "", 10, 1, category_id, photo, "photo.png")
+    second = db.add_product("Lipstick 02", "", 10, 1, category_id, photo, "photo.png")
+    assert ref_counts(db) == {photo: 2, other: 0}
+
+    db.update_product(second, "Lipstick 02", "", 10, category_id, other, "other.png")
+    assert ref_counts(db) == {photo: 1, other: 1}
+    db.delete_product(first)
+    assert ref_counts(db) == {photo: 0, other: 1}
+    assert db.get_product(second)["image_name"] == "other.png"
+
+
+def test_unused_images_are_purged_after_a_while(db, tmp_path):
+    category_id = db.add_category("Test products")
+    unused = db.import_image(write_file(tmp_path / "unused.png", b"unused photo"))
+    used = db.import_image(write_file(tmp_path / "used.png", b"used photo"))
+    db.add_product("Lipstick", "", 10, 1, category_id, used)
+
+    # Just imported, so kept until min_age has passed
+    assert db.purge_unused_images() == 0
+    db.execute("UPDATE image_blobs SET imported_at = %s", (datetime.now() - timedelta(days=2),))
+    assert db.purge_unused_images() == 1
+
+    assert not os.path.exists(unused)
+    assert os.path.exists(used)
+    assert list(ref_counts(db)) == [used]
+
+
+def test_dedupe_moves_legacy_images_into_the_store(db, tmp_path):
+    category_id = db.add_category("Test products")
+    legacy = tmp_path / LEGACY_DIRECTORY
+    shade1 = write_file(legacy / "shade1.png", b"vendor photo")
+    shade2 = write_file(legacy / "shade2.png", b"vendor photo")
+    other = write_file(legacy / "other.png", b"another photo")
+    outside = write_file(tmp_path / "elsewhere" / "outside.png", b"another photo")
+    for name, path in (("01", shade1), ("02", shade2), ("03", other), ("04", outside), ("05", "missing.png")):
+        # As products were saved before the store existed
+        db.execute("INSERT INTO products (name, price, stock_quantity, category_id, image_path) "
+                   "VALUES (%s, 10, 1, %s, %s)", (f"Lipstick {name}", category_id, path))
+
+    assert dedupe_product_images(db) == (5, 2)
+
+    products = db.fetch_all("SELECT name, image_path, image_name FROM products ORDER BY name")
+    paths = [row["image_path"] for row in products]
+    assert paths[0] == paths[1] != paths[2] == paths[3]
+    assert all(db.images.owns(path) for path in paths[:4])
+    assert paths[4] == "missing.png"
+    assert [row["image_name"] for row in products] == ["shade1.png", "shade2.png", "other.png", "outside.png", None]
+    assert sorted(ref_counts(db).values()) == [2, 2]
+    # Old copies in the legacy folder are deleted, files elsewhere are left alone
+    assert os.listdir(legacy) == []
+    assert os.path.exists(outside)
+
+    # Safe to run again
+    assert dedupe_product_images(db) == (3, 2)
+    assert sorted(ref_counts(db).values()) == [2, 2]
@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from src.low_stock import LowStockIndex
+
+
+def row(product_id, stock, version=0):
+    return {"id": product_id, "name": f"Product {product_id}", "price": Decimal("1.00"), "category_id": None,
+            "stock_quantity": stock, "stock_version": version}
+
+
+def ids(rows):
+    return [r["id"] for r in rows]
+
+
+def make_index(rows, threshold=10):
+    index = LowStockIndex(lambda: [dict(r) for r in rows], threshold=threshold, refresh_interval=None)
+    alerts = []
+    index.subscribe(alerts.append)
+    return index, alerts
+
+
+def test_in_range_lists_lowest_stock_first():
+    index, _ = make_index([row(1, 12), row(2, 3), row(3, 0), row(4, 10)])
+    assert ids(index.in_range(high=10)) == [3, 2, 4]
+    assert ids(index.in_range(low=1, high=10)) == [2, 4]
+    assert index.loads == 1
+
+
+def test_crossing_the_threshold_alerts_once():
+    index, alerts = make_index([row(1, 12)])
+    index.in_range()
+
+    index.update([row(1, 11, 1)])
+    assert alerts == []
+    index.update([row(1, 10, 2)])
+    assert ids(alerts) == [1]
+    # Already at or below the threshold
+    index.update([row(1, 4, 3)])
+    assert ids(alerts) == [1]
+
+    # Back above it, then down again
+    index.update([row(1, 20, 4)])
+    index.update([row(1, 9, 5)])
+    assert ids(alerts) == [1, 1]
+    assert ids(index.in_range(high=10)) == [1]
+
+
+def test_older_rows_are_ignored():
+    index, alerts = make_index([row(1, 12, 5)])
+    index.in_range()
+    index.update([row(1, 2, 4)])
+    assert alerts == []
+    assert index.in_range()[0]["stock_quantity"] == 12
+
+
+def test_updates_before_the_first_load_are_dropped():
+    index, alerts = make_index([row(1, 12)])
+    index.update([row(1, 2, 1)])
+    assert alerts == []
+    assert index.in_range()[0]["stock_quantity"] == 12
+
+
+def test_sales_keep_the_database_index_current(db, product, customer):
+    category_id = db.get_product(product)["category_id"]
+    other = db.add_product("Shampoo", "", 5, 12, category_id)
+    alerts = []
+    db.low_stock.subscribe(alerts.append)
+    assert other not in ids(db.get_low_stock_products())
+    loads = db.low_stock.loads
+
+    db.place_order(customer, [(other, 3, Decimal("5.00"))])
+    assert ids(alerts) == [other]
+    assert ids(db.get_low_stock_products()) == [product, other]
+    db.delete_product(product)
+    assert ids(db.get_low_stock_products()) == [other]
+    assert db.low_stock.loads == loads
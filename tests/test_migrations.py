@@ -0,0 +1,29 @@
+from src import migrations
+
+
+def applied_versions(db):
+    return [row["version"] for row in db.fetch_all("SELECT version FROM schema_migrations ORDER BY version")]
+
+
+def test_new_database_is_fully_migrated(db):
+    assert applied_versions(db) == [migration.version for migration in migrations.MIGRATIONS]
+    assert migrations.migrate(db) == []
+
+
+def test_interrupted_migrations_are_re_applied(db, product):
+    # As if the run stopped after the schema changes of the last two
+    # migrations but before they were recorded
+    db.execute("DELETE FROM schema_migrations WHERE version >= %s", (migrations.LATEST_VERSION - 1,))
+
+    assert migrations.migrate(db) == [migrations.LATEST_VERSION - 1, migrations.LATEST_VERSION]
+    assert applied_versions(db)[-1] == migrations.LATEST_VERSION
+    assert db.get_product(product)["name"] == "Moisturiser"
+
+
+def test_unversioned_database_is_adopted(db, product):
+    # A database created before versioning: the tables exist, the bookkeeping doesn't
+    db.execute("DROP TABLE schema_migrations")
+    migrations.migrate(db)
+    assert applied_versions(db)[-1] == migrations.LATEST_VERSION
+    assert db.get_product(product)["stock_quantity"] == 5
+    assert db.check_stock_ledger() == []
@@ -0,0 +1,138 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from src.order_journal import JournalReplayer, OrderJournal, is_unavailable_error, new_order_ref
+
+
+class Unavailable(Exception):
+    errno = 2013  # CR_SERVER_LOST
+
+
+class LockWaitTimeout(Exception):
+    errno = 1205  # ER_LOCK_WAIT_TIMEOUT
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return OrderJournal(str(tmp_path / "journal" / "orders.jsonl"))
+
+
+def journal_order(journal, customer_id, product_id, quantity=1):
+    ref = new_order_ref()
+    journal.append_order(ref, customer_id, [(product_id, quantity, Decimal("10.00"))], "Completed",
+                         datetime(2024, 3, 1, 12, 30))
+    return ref
+
+
+def stock_of(db, product_id):
+    return db.get_product(product_id)["stock_quantity"]
+
+
+def order_count(db):
+    return db.fetch_one("SELECT COUNT(*) AS n FROM orders")["n"]
+
+
+def test_pending_orders_round_trip(journal):
+    ref = journal_order(journal, 1, 2, quantity=3)
+    [order] = journal.pending()
+    assert order["ref"] == ref
+    assert order["items"] == [(2, 3, Decimal("10.00"))]
+    assert order["order_date"] == datetime(2024, 3, 1, 12, 30)
+
+
+def test_torn_last_line_is_ignored(journal):
+    ref = journal_order(journal, 1, 2)
+    with open(journal.path, "a") as f:
+        f.write('{"type": "order", "ref": "torn')
+    assert [order["ref"] for order in journal.pending()] == [ref]
+
+    # The next record starts on a line of its own
+    other = journal_order(journal, 1, 2)
+    assert [order["ref"] for order in journal.pending()] == [ref, other]
+
+
+def test_compact_keeps_only_failed_orders(journal):
+    done = journal_order(journal, 1, 2)
+    failed = journal_order(journal, 1, 2)
+    assert not journal.compact()
+
+    journal.mark_done([(done, 7)])
+    journal.mark_failed(failed, "no such customer")
+    assert journal.compact()
+
+    orders, closed = journal._read()
+    assert list(orders) == [failed]
+    assert closed[failed]["type"] == "failed"
+    assert journal.pending() == []
+
+
+def test_replay_places_orders_without_stock_check(db, journal, product, customer):
+    # Sold offline, so the sale stands even though it oversells
+    journal_order(journal, customer, product, quantity=8)
+    assert JournalReplayer(db, journal).replay_pending() == 1
+
+    assert journal.pending() == []
+    assert order_count(db) == 1
+    assert stock_of(db, product) == -3
+
+
+def test_replay_is_idempotent(db, journal, product, customer):
+    ref = journal_order(journal, customer, product, quantity=2)
+    # Committed before the connection dropped, but never marked done
+    db.place_order(customer, [(product, 2, Decimal("10.00"))], "Completed", client_ref=ref)
+
+    assert JournalReplayer(db, journal).replay_pending() == 1
+    assert order_count(db) == 1
+    assert stock_of(db, product) == 3
+
+
+def test_rejected_order_is_marked_failed(db, journal, product, customer):
+    journal_order(journal, customer, product)
+    rejected = new_order_ref()
+    journal.append_order(rejected, customer, [], "Completed", datetime(2024, 3, 1))
+
+    assert JournalReplayer(db, journal).replay_pending() == 1
+    assert journal.pending() == []
+    assert order_count(db) == 1
+    # Compacted down to the failed order, kept for manual review
+    _, closed = journal._read()
+    assert list(closed) == [rejected]
+    assert closed[rejected]["type"] == "failed"
+
+
+def test_replay_stops_while_unavailable(db, journal, product, customer, monkeypatch):
+    journal_order(journal, customer, product)
+
+    def place_order(*args, **kwargs):
+        raise Unavailable()
+
+    monkeypatch.setattr(db, "place_order", place_order)
+    with pytest.raises(Unavailable):
+        JournalReplayer(db, journal).replay_pending()
+    assert len(journal.pending()) == 1
+
+
+def test_lock_wait_timeout_is_not_unavailable():
+    assert is_unavailable_error(Unavailable())
+    assert not is_unavailable_error(LockWaitTimeout())
+
+
+def test_checkout_journals_only_when_unavailable(db, journal, product, customer, monkeypatch):
+    db.journal = journal
+    db.replayer = JournalReplayer(db, journal)
+    items = [(product, 1, Decimal("10.00"))]
+
+    def place_order(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(db, "place_order", place_order)
+    error = LockWaitTimeout()
+    with pytest.raises(LockWaitTimeout):
+        db.checkout(customer, items)
+    assert journal.pending() == []
+
+    error = Unavailable()
+    assert db.checkout(customer, items) is None
+    assert len(journal.pending()) == 1
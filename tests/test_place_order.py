@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+
+from src.database import InsufficientStockError
+
+
+def stock_of(db, product_id):
+    return db.get_product(product_id)["stock_quantity"]
+
+
+def row_count(db, table):
+    return db.fetch_one(f"SELECT COUNT(*) AS n FROM {table}")["n"]
+
+
+def test_order_is_written_with_its_items(db, product, customer):
+    category_id = db.get_product(product)["category_id"]
+    other = db.add_product("Shampoo", "", 5, 10, category_id)
+
+    order_id = db.place_order(customer, [(product, 2, Decimal("10.00")), (other, 3, Decimal("5.00"))], "Completed")
+
+    order = db.fetch_one("SELECT customer_id, total_amount, status FROM orders WHERE id = %s", (order_id,))
+    assert (order["customer_id"], order["total_amount"], order["status"]) == (customer, 35, "Completed")
+    items = db.fetch_all("SELECT product_id, quantity FROM order_items WHERE order_id = %s ORDER BY product_id",
+                         (order_id,))
+    assert [(item["product_id"], item["quantity"]) for item in items] == [(product, 2), (other, 3)]
+    assert stock_of(db, product) == 3
+    assert stock_of(db, other) == 7
+
+
+def test_retried_order_is_placed_once(db, product, customer):
+    items = [(product, 1, Decimal("10.00"))]
+    order_id = db.place_order(customer, items, client_ref="till-1-0001")
+    assert db.place_order(customer, items, client_ref="till-1-0001") == order_id
+    assert row_count(db, "orders") == 1
+    assert stock_of(db, product) == 4
+
+
+def test_order_needs_items(db, customer):
+    with pytest.raises(ValueError):
+        db.place_order(customer, [])
+    assert row_count(db, "orders") == 0
+
+
+def test_oversell_is_rejected_and_writes_nothing(db, product, customer):
+    category_id = db.get_product(product)["category_id"]
+    other = db.add_product("Shampoo", "", 5, 10, category_id)
+    movements = row_count(db, "inventory_movements")
+
+    with pytest.raises(InsufficientStockError) as excinfo:
+        db.place_order(customer, [(other, 1, Decimal("5.00")), (product, 6, Decimal("10.00"))])
+    assert excinfo.value.shortages == {product: (6, 5)}
+
+    assert stock_of(db, product) == 5
+    assert stock_of(db, other) == 10
+    assert row_count(db, "orders") == 0
+    assert row_count(db, "order_items") == 0
+    assert row_count(db, "inventory_movements") == movements
+
+
+def test_lines_for_the_same_product_are_added_up(db, product, customer):
+    with pytest.raises(InsufficientStockError) as excinfo:
+        db.place_order(customer, [(product, 3, Decimal("10.00")), (product, 3, Decimal("10.00"))])
+    assert excinfo.value.shortages == {product: (6, 5)}
+    assert stock_of(db, product) == 5
+
+
+def test_concurrent_checkouts_never_oversell(db, product, customer):
+    def buy(_):
+        try:
+            return db.place_order(customer, [(product, 1, Decimal("10.00"))])
+        except InsufficientStockError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        orders = [order_id for order_id in executor.map(buy, range(12)) if order_id is not None]
+
+    assert len(orders) == 5
+    assert stock_of(db, product) == 0
+    assert row_count(db, "orders") == 5
@@ -0,0 +1,83 @@
+import threading
+import time
+
+from src.reference_cache import ReferenceCache
+
+
+def test_value_is_loaded_once_until_invalidated():
+    cache = ReferenceCache(ttl=None)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get("categories", loader) == 1
+    assert cache.get("categories", loader) == 1
+    cache.invalidate("categories")
+    assert cache.get("categories", loader) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_entries_expire_after_ttl():
+    cache = ReferenceCache(ttl=0.01)
+    assert cache.get("categories", lambda: "old") == "old"
+    time.sleep(0.02)
+    assert cache.get("categories", lambda: "new") == "new"
+
+
+def test_slow_loader_does_not_block_other_names():
+    cache = ReferenceCache()
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_loader():
+        started.set()
+        release.wait(5)
+        return "forecast"
+
+    thread = threading.Thread(target=cache.get, args=("forecast", slow_loader))
+    thread.start()
+    started.wait(5)
+    try:
+        # Served while the forecast is still loading
+        assert cache.get("categories", lambda: "categories") == "categories"
+    finally:
+        release.set()
+        thread.join()
+    assert cache.get("forecast", lambda: "reloaded") == "forecast"
+
+
+def test_concurrent_readers_share_one_load():
+    cache = ReferenceCache()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.05)
+        return "categories"
+
+    threads = [threading.Thread(target=cache.get, args=("categories", loader)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+
+
+def test_load_raced_by_invalidate_is_not_stored():
+    cache = ReferenceCache()
+
+    def loader():
+        # The rows change while they are being read
+        cache.invalidate("categories")
+        return "stale"
+
+    assert cache.get("categories", loader) == "stale"
+    assert cache.get("categories", lambda: "fresh") == "fresh"
+
+
+def test_category_writes_invalidate_the_cache(db):
+    names = {row["name"] for row in db.get_all_categories()}
+    db.add_category("Test products")
+    assert {row["name"] for row in db.get_all_categories()} == names | {"Test products"}
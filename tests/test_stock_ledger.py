@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+
+def backdate(db, table, row_id, when, column="created_at"):
+    db.execute(f"UPDATE {table} SET {column} = %s WHERE id = %s", (when, row_id))
+
+
+def movement_ids(db, product_id):
+    return [row["id"] for row in db.fetch_all(
+        "SELECT id FROM inventory_movements WHERE product_id = %s ORDER BY id", (product_id,)
+    )]
+
+
+def test_stock_as_of_replays_the_ledger(db, product, customer):
+    now = datetime.now()
+    # Opened with 5 ten days ago, snapshot nine days ago, sold 3 eight days
+    # ago and 4 delivered yesterday
+    snapshot_id = db.take_stock_snapshot()
+    db.place_order(customer, [(product, 3, Decimal("10.00"))])
+    db.adjust_stock(product, 4)
+    opening, sale, delivery = movement_ids(db, product)
+    backdate(db, "inventory_movements", opening, now - timedelta(days=10))
+    backdate(db, "stock_snapshots", snapshot_id, now - timedelta(days=9), column="taken_at")
+    backdate(db, "inventory_movements", sale, now - timedelta(days=8))
+    backdate(db, "inventory_movements", delivery, now - timedelta(days=1))
+
+    # Forward from the snapshot
+    assert db.stock_as_of(now - timedelta(days=8, hours=12), product) == 5
+    assert db.stock_as_of(now - timedelta(days=7), product) == 2
+    # Back from the current stock
+    assert db.stock_as_of(now - timedelta(days=2), product) == 2
+    assert db.stock_as_of(now - timedelta(hours=12), product) == 6
+    # Before the snapshot
+    assert db.stock_as_of(now - timedelta(days=9, hours=12), product) == 5
+    assert db.stock_as_of(now - timedelta(days=11)) == {product: 0}
+
+
+def test_snapshot_is_only_taken_when_due(db, product):
+    snapshot_id = db.ensure_stock_snapshot()
+    assert snapshot_id is not None
+    assert db.ensure_stock_snapshot() is None
+
+    backdate(db, "stock_snapshots", snapshot_id, datetime.now() - timedelta(days=2), column="taken_at")
+    assert db.ensure_stock_snapshot() not in (None, snapshot_id)
+    items = db.fetch_all("SELECT product_id, stock_quantity FROM stock_snapshot_items WHERE snapshot_id = %s",
+                         (snapshot_id,))
+    assert [(row["product_id"], row["stock_quantity"]) for row in items] == [(product, 5)]
+
+
+def test_every_stock_write_is_in_the_ledger(db, product, customer):
+    db.place_order(customer, [(product, 2, Decimal("10.00"))])
+    db.adjust_stock(product, 4)
+    db.update_stock(product, 1, note="Recount")
+    db.apply_stocktake({product: 3})
+    assert db.check_stock_ledger() == []
+    reasons = db.fetch_all("SELECT reason FROM inventory_movements WHERE product_id = %s ORDER BY id", (product,))
+    assert [row["reason"] for row in reasons] == ["opening", "sale", "adjustment", "correction", "stocktake"]
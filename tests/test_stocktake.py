@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+import pytest
+
+from src import stocktake
+from src.database import StockConflictError
+
+
+def write_csv(path, text):
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_read_counts_accepts_column_aliases_and_reports_bad_lines(tmp_path):
+    path = write_csv(tmp_path / "count.csv", "ID,Name,Quantity\n1,Cream,4\n2,Soap,x\n1,Cream,2\n3,Oil,\n4,Gel,-1\n")
+    counts, errors = stocktake.read_counts(path)
+    assert counts == {1: 6}
+    assert [line for line, _ in errors] == [3, 6]
+
+
+def test_read_counts_needs_id_and_count_columns(tmp_path):
+    with pytest.raises(stocktake.StocktakeFileError):
+        stocktake.read_counts(write_csv(tmp_path / "count.csv", "sku,name\n1,Cream\n"))
+
+
+def test_import_sets_stock_to_the_counts(db, product, tmp_path):
+    category_id = db.get_product(product)["category_id"]
+    other = db.add_product("Shampoo", "", 5, 10, category_id)
+    path = write_csv(tmp_path / "count.csv", f"product_id,counted\n{product},7\n{other},10\n999,1\n")
+    report = tmp_path / "variances.csv"
+
+    dry_run = stocktake.import_stocktake(db, path, dry_run=True)
+    assert db.get_product(product)["stock_quantity"] == 5
+    summary = stocktake.import_stocktake(db, path, report_path=str(report), note="March count")
+
+    assert summary == dry_run
+    assert (summary["counted"], summary["changed"], summary["units_over"]) == (2, 1, 2)
+    assert summary["variance_value"] == Decimal("20.00")
+    assert summary["unknown_products"] == 1
+    assert db.get_product(product)["stock_quantity"] == 7
+    assert db.get_product(other)["stock_quantity"] == 10
+    assert report.read_text().splitlines()[0] == ",".join(stocktake.REPORT_HEADERS)
+    assert db.check_stock_ledger() == []
+
+
+def test_sale_during_a_stocktake_is_not_overwritten(db, product, customer):
+    variances = db.get_stocktake_variances({product: 7})
+    db.place_order(customer, [(product, 1, Decimal("10.00"))])
+
+    # The diff taken before the sale no longer applies
+    stale = [(row["product_id"], row["variance"], row["stock_version"]) for row in variances]
+    with pytest.raises(StockConflictError):
+        db.adjust_stock_batch(stale, reason="stocktake")
+
+    # apply_stocktake takes the diff again, against the stock after the sale
+    applied = db.apply_stocktake({product: 7})
+    assert applied[0]["system_quantity"] == 4
+    assert db.get_product(product)["stock_quantity"] == 7
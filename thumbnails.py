@@ -0,0 +1,184 @@
+"""Pre-rendered product image thumbnails, on disk and in memory.
+
+Resizing a full-size vendor photo takes long enough to make the product
+list lag when it runs on every click, so each image is resized once per
+target size and the result kept:
+
+- on disk, under images/thumbnails, named by the SHA-256 of the source
+  file's content and the size. Replacing or editing the source changes the
+  hash, so a stale thumbnail is never served. Files in the image store are
+  named by that hash already; for any other file it is remembered by path,
+  modification time and size so it is only re-read when the file changes.
+- in memory, as Tk PhotoImages in an LRU with a byte budget, so going back
+  to a recently viewed product costs nothing at all.
+
+ThumbnailStore.prune() removes thumbnails of images that have left the image
+store, so the folder doesn't keep every picture ever replaced or deleted.
+
+ThumbnailStore only uses PIL and is safe to call from worker threads;
+PhotoCache creates Tk images and must stay on the Tk thread.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from PIL import Image, ImageTk
+from src.image_store import file_digest, stored_digest, write_atomically
+
+PREVIEW_SIZE = (150, 150)
+LIST_SIZE = (100, 100)
+# Rendered as soon as an image is imported
+IMPORT_SIZES = (PREVIEW_SIZE, LIST_SIZE)
+# Thumbnails of images no longer in the store are deleted once this old (seconds)
+PRUNE_AGE = 7 * 24 * 3600
+
+
+def thumbnail_digest(path):
+    """The source digest a thumbnail file is named by"""
+    return os.path.basename(path).split("_", 1)[0]
+
+
+class ThumbnailStore:
+    """Thumbnail files keyed by source content hash and size"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # {source path: (mtime_ns, size, digest)}
+        self._digests = {}
+
+    def known_digest(self, source):
+        """The hash of source if it is known without reading the file, else None"""
+        digest = stored_digest(source)
+        if digest is not None:
+            return digest
+        stat = os.stat(source)
+        with self._lock:
+            known = self._digests.get(source)
+        if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+            return known[2]
+        return None
+
+    def digest(self, source):
+        """SHA-256 of the source file, read only when it isn't known from the name, mtime and size"""
+        known = self.known_digest(source)
+        if known is not None:
+            return known
+
+        stat = os.stat(source)
+        digest, _ = file_digest(source)
+        with self._lock:
+            self._digests[source] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def path(self, digest, size):
+        return os.path.join(self.directory, digest[:2], f"{digest}_{size[0]}x{size[1]}.png")
+
+    def render(self, source, size):
+        """Return the thumbnail file for source at size, rendering it if there isn't one yet"""
+        path = self.path(self.digest(source), size)
+        if os.path.exists(path):
+            return path
+
+        with Image.open(source) as img:
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA")
+            thumbnail = img.resize(size, Image.LANCZOS)
+        write_atomically(path, lambda tmp_path: thumbnail.save(tmp_path, "PNG"))
+        return path
+
+    def prepare(self, source, sizes=IMPORT_SIZES):
+        """Render every size of a newly imported image"""
+        return [self.render(source, size) for size in sizes]
+
+    def prune(self, keep_digests, min_age=PRUNE_AGE):
+        """Delete thumbnails whose source digest isn't in keep_digests; returns the number deleted.
+
+        Files written in the last min_age seconds are kept whatever their
+        digest: an image being imported, or one outside the image store
+        (which has no digest on record), is simply rendered again if needed.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        cutoff = time.time() - min_age
+        pruned = 0
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                digest = thumbnail_digest(entry.name)
+                if digest in keep_digests and not entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                        pruned += 1
+                except FileNotFoundError:
+                    pass
+        return pruned
+
+
+class PhotoCache:
+    """LRU of Tk PhotoImages for thumbnails, bounded by their decoded size"""
+
+    def __init__(self, store, max_bytes=16 * 1024 * 1024):
+        self.store = store
+        self.max_bytes = max_bytes
+        # {(digest, size): (photo, bytes)}, least recently used first
+        self._photos = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def cached(self, source, size):
+        """Return the PhotoImage if it is in memory, or None; never reads the source file"""
+        digest = self.store.known_digest(source)
+        entry = self._photos.get((digest, tuple(size))) if digest else None
+        if entry is None:
+            return None
+        self._photos.move_to_end((digest, tuple(size)))
+        self.hits += 1
+        return entry[0]
+
+    def load(self, thumbnail_path, size):
+        """Open a thumbnail file rendered on a worker thread as a PhotoImage and cache it"""
+        # Keyed by the digest in the file name; the source is never hashed on the Tk thread
+        key = (thumbnail_digest(thumbnail_path), tuple(size))
+        self.misses += 1
+        with Image.open(thumbnail_path) as img:
+            photo = ImageTk.PhotoImage(img)
+            cost = img.width * img.height * 4
+
+        previous = self._photos.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous[1]
+        self._photos[key] = (photo, cost)
+        self._bytes += cost
+        while self._bytes > self.max_bytes and len(self._photos) > 1:
+            _, (_, evicted) = self._photos.popitem(last=False)
+            self._bytes -= evicted
+        return photo
+
+    def stats(self):
+        return {"photos": len(self._photos), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses}
+
+
+_store = None
+_photo_cache = None
+
+
+def thumbnail_store():
+    """The application's thumbnail store, under images/thumbnails"""
+    global _store
+    if _store is None:
+        _store = ThumbnailStore(os.path.join(os.getcwd(), "images", "thumbnails"))
+    return _store
+
+
+def photo_cache():
+    """The application's PhotoImage cache (Tk thread only)"""
+    global _photo_cache
+    if _photo_cache is None:
+        _photo_cache = PhotoCache(thumbnail_store())
+    return _photo_cache
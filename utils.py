@@ -1,7 +1,6 @@
 import os
 import re
 from datetime import datetime
-from PIL import Image, ImageTk
 
 def validate_email(email):
     """Validate email format"""
@@ -26,20 +25,6 @@ def format_date(date_obj):
             return date_obj
     return date_obj.strftime('%Y-%m-%d %H:%M:%S')
 
-def load_image(path, size=(100, 100)):
-    """Load image from path and resize"""
-    if not path or not os.path.exists(path):
-        # Return a default image or None
-        return None
-    
-    try:
-        img = Image.open(path)
-        img = img.resize(size, Image.LANCZOS)
-        return ImageTk.PhotoImage(img)
-    except Exception as e:
-        print(f"Error loading image: {e}")
-        return None
-
 def create_directory_if_not_exists(directory):
     """Create directory if it doesn't exist"""
     if not os.path.exists(directory):